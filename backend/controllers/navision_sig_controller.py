@@ -1,12 +1,24 @@
 # -*- coding: utf-8 -*-
-from services.navision.navision_api import NavisionService
-from models.PlanComptable import MappingIndicateurSIG
+from services.navision.navision_api import get_navision_service
+from services.navision.navision_api_async import get_async_navision_service
+from services.navision.ligne_store import ligne_store
+from services.navision.ledger_snapshot import get_snapshot, SYNC_MODE
+from models.PlanComptable import MappingIndicateurSIG, MappingIndex, TableComptes
+from models.SIG_cube import SIGCube
+from models.SIG_model import SIGCalculator
+from models.ledger_batch import LedgerBatch
 import datetime
+import os
 import time
 
+# "lignes" : toutes les écritures de la vue ; "agregats" : sommes par compte et par mois
+# calculées par la fonction SQL sig_agregats_<vue> (voir script/HiveDataNavision/create_sig_agregats.py)
+FETCH_MODE = os.getenv("NAVISION_FETCH_MODE", "lignes").lower()
+
 class NavisionSIGController:
     def __init__(self, vue="neg_view_entry"):
-        self.navision = NavisionService()
+        self.navision = get_navision_service()
+        self.navision_async = get_async_navision_service()
         self.vue = vue
 
     def get_period_filter(self, periode, annee, trimestre=None):
@@ -37,24 +49,12 @@ class NavisionSIGController:
         Détermine la nature du compte selon le plan comptable français.
         Retourne 'actif' pour les comptes d'actif et de charge, 'passif' pour les comptes de passif et de produit.
         """
-        if not code_compte:
-            return 'actif'  # Par défaut
-        
-        classe = code_compte[:1]
-        
-        # Comptes d'actif et de charge (solde = Débit - Crédit)
-        if classe in ['1', '2', '3', '4', '5', '6']:
-            return 'actif'
-        
-        # Comptes de passif et de produit (solde = Crédit - Débit)
-        elif classe in ['7', '8']:
-            return 'passif'
-        
-        # Par défaut
-        return 'actif'
+        return TableComptes.dimension(code_compte).nature
 
-    def get_lines(self, periode, annee=None, trimestre=None, mois=None):
-        table = self.vue
+    def get_lines_params(self, periode, annee=None, trimestre=None, mois=None):
+        """
+        Construit les paramètres PostgREST (select et filtres de dates) pour une période
+        """
         fields = "id,date_ecriture,code_compte,description,document,montant,utilisateur,source,dimension_1,dimension_2,debit,credit,trimestre"
         params = [("select", fields)]
         if mois:
@@ -80,47 +80,168 @@ class NavisionSIGController:
         elif periode == "annee" and annee is not None:
             params.append(("date_ecriture", f"gte.{annee}-01-01"))
             params.append(("date_ecriture", f"lte.{annee}-12-31"))
+        return params
+
+    def enrichir_ligne(self, l):
+        """
+        Enrichit une ligne brute de la vue : classes, indicateur SIG, libellé, montant et année
+        """
+        compte = TableComptes.dimension(l.get("code_compte", ""))
+        l['classe'] = compte.classe
+        l['sous_classe'] = compte.sous_classe
+        l['sss_classe'] = compte.sss_classe
+        l['indicateur'] = compte.indicateur
+        l['sous_indicateur'] = list(compte.sous_indicateurs)
+        l['libelle_compte'] = l.get('description', '')
+        # Solde selon la nature du compte (Débit - Crédit pour l'actif et les charges, Crédit - Débit sinon)
+        l['montant'] = compte.solde(l.get('debit', 0), l.get('credit', 0))
+        
+        try:
+            l['annee'] = int(str(l.get('date_ecriture', ''))[:4])
+        except Exception:
+            l['annee'] = None
+        return l
+
+    def iter_lines(self, periode, annee=None, trimestre=None, mois=None):
+        """
+        Récupère les lignes de la vue page par page et les enrichit au fil de l'eau (indicateur, montant, année)
+        """
+        table = self.vue
+        params = self.get_lines_params(periode, annee, trimestre, mois)
         print(f"[DEBUG] Appel SQL table={table} params={params}")
         start_sql = time.time()
-        lines = self.navision.get(table, params=params)
-        print(f"[DEBUG] {len(lines)} lignes SQL récupérées en {time.time() - start_sql:.2f}s")
-        enriched = []
-        mapping_cache = {}
-        start_map = time.time()
-        for l in lines:
-            code = l.get("code_compte", "")
-            if code in mapping_cache:
-                mapping = mapping_cache[code]
-            else:
-                mapping = MappingIndicateurSIG.find_best_mapping(code)
-                mapping_cache[code] = mapping
-            l['classe'] = code[:1] if code else ''
-            l['sous_classe'] = code[:2] if code else ''
-            l['sss_classe'] = code[:3] if code else ''
-            if mapping:
-                l['indicateur'] = mapping.indicateur
-                l['sous_indicateur'] = [mapping.sous_indicateur] if mapping.sous_indicateur else []
-            else:
-                l['indicateur'] = None
-                l['sous_indicateur'] = []
-            l['libelle_compte'] = l.get('description', '')
-            
-            # Calcul du solde selon la nature du compte
-            nature = self.get_nature_compte(code)
-            if nature == 'actif':
-                # Comptes d'actif et de charge : Solde = Débit - Crédit
-                l['montant'] = l.get('debit', 0) - l.get('credit', 0)
-            else:
-                # Comptes de passif et de produit : Solde = Crédit - Débit
-                l['montant'] = l.get('credit', 0) - l.get('debit', 0)
-            
-            try:
-                l['annee'] = int(str(l.get('date_ecriture', ''))[:4])
-            except Exception:
-                l['annee'] = None
-            enriched.append(l)
-        print(f"[DEBUG] Mapping SIG terminé en {time.time() - start_map:.2f}s pour {len(lines)} lignes")
-        return enriched
+        nb_lignes = 0
+        for l in self.navision.iter_rows(table, params=params):
+            nb_lignes += 1
+            yield self.enrichir_ligne(l)
+        print(f"[DEBUG] {nb_lignes} lignes SQL récupérées et mappées en {time.time() - start_sql:.2f}s")
+
+    def get_lines(self, periode, annee=None, trimestre=None, mois=None):
+        return list(self.iter_lines(periode, annee, trimestre, mois))
+
+    async def iter_pages_async(self, periode, annee=None, trimestre=None, mois=None, apres=None):
+        """
+        Variante asynchrone d'iter_lines : retourne les lignes enrichies page par page
+        (uniquement celles d'id supérieur à apres si fourni)
+        """
+        table = self.vue
+        params = self.get_lines_params(periode, annee, trimestre, mois)
+        print(f"[DEBUG] Appel SQL async table={table} params={params}")
+        start_sql = time.time()
+        nb_lignes = 0
+        async for page in self.navision_async.iter_pages(table, params=params, apres=apres):
+            nb_lignes += len(page)
+            yield [self.enrichir_ligne(l) for l in page]
+        print(f"[DEBUG] {nb_lignes} lignes SQL récupérées et mappées en {time.time() - start_sql:.2f}s")
+
+    @staticmethod
+    def utilise_snapshot(periode, annee=None, trimestre=None, mois=None):
+        """
+        Le grand livre complet (toutes années) est servi par l'instantané incrémental en mode incremental
+        """
+        return SYNC_MODE == "incremental" and periode == "annee" and annee is None and not trimestre and not mois
+
+    async def get_lines_async(self, periode, annee=None, trimestre=None, mois=None):
+        """
+        Lignes enrichies de la période (LedgerBatch), partagées via ligne_store entre les requêtes
+        simultanées ou rapprochées sur la même vue et le même filtre (lecture seule).
+        Le grand livre complet provient de l'instantané incrémental (voir ledger_snapshot)
+        """
+        if self.utilise_snapshot(periode, annee, trimestre, mois):
+            snapshot = get_snapshot(self.vue)
+            await snapshot.synchroniser(self)
+            return snapshot.lignes
+
+        params = self.get_lines_params(periode, annee, trimestre, mois)
+
+        async def charger():
+            # Stockage compact en colonnes : les dicts de chaque page sont libérés après conversion
+            lignes = LedgerBatch()
+            async for page in self.iter_pages_async(periode, annee, trimestre, mois):
+                lignes.etendre(page)
+            return lignes
+
+        return await ligne_store.get_or_fetch((self.vue, tuple(params)), charger)
+
+    def ligne_depuis_agregat(self, agregat):
+        """
+        Transforme une ligne (code_compte, annee, mois, debit, credit) de sig_agregats_<vue>
+        en ligne enrichie, datée du premier jour du mois
+        """
+        ligne = {
+            'code_compte': agregat.get('code_compte') or '',
+            'description': agregat.get('libelle_compte') or '',
+            'date_ecriture': f"{agregat['annee']}-{int(agregat['mois']):02d}-01",
+            'debit': agregat.get('debit') or 0,
+            'credit': agregat.get('credit') or 0,
+            'nb_lignes': agregat.get('nb_lignes', 0),
+        }
+        return self.enrichir_ligne(ligne)
+
+    async def get_agregats_async(self, annee=None):
+        """
+        Sommes par compte et par mois calculées côté base (rpc/sig_agregats_<vue>),
+        enrichies comme des lignes et partagées via ligne_store
+        """
+        params = {"p_annee": annee} if annee is not None else {}
+
+        async def charger():
+            start_sql = time.time()
+            agregats = await self.navision_async.rpc(f"sig_agregats_{self.vue}", params)
+            lignes = LedgerBatch(self.ligne_depuis_agregat(a) for a in agregats)
+            print(f"[DEBUG] {len(lignes)} agrégats SQL récupérés en {time.time() - start_sql:.2f}s")
+            return lignes
+
+        return await ligne_store.get_or_fetch((self.vue, "rpc", annee), charger)
+
+    @staticmethod
+    def filtrer_periode(lignes, annee, trimestre=None, mois=None):
+        """
+        Découpe une période (année, trimestre ou mois) dans des lignes déjà récupérées,
+        pour éviter un nouvel aller-retour SQL par année
+        """
+        if isinstance(lignes, LedgerBatch):
+            return list(lignes.lignes(annee, trimestre, mois))
+        resultat = []
+        for l in lignes:
+            if l.get('annee') != annee:
+                continue
+            if trimestre is not None or mois is not None:
+                mois_ligne = SIGCube.extraire_mois(l)
+                if mois is not None and mois_ligne != mois:
+                    continue
+                if trimestre is not None and SIGCube.trimestre_du_mois(mois_ligne) != trimestre:
+                    continue
+            resultat.append(l)
+        return resultat
+
+    @staticmethod
+    def annees_disponibles(lignes):
+        """
+        Années présentes dans les lignes, de la plus récente à la plus ancienne
+        """
+        if isinstance(lignes, LedgerBatch):
+            return lignes.annees_disponibles()
+        return sorted({l.get('annee') for l in lignes if l.get('annee')}, reverse=True)
+
+    async def get_cube_async(self, periode, annee=None, trimestre=None, mois=None):
+        """
+        Construit un SIGCube pour la période : depuis les agrégats SQL en mode agregats,
+        cube de l'instantané incrémental pour le grand livre complet,
+        depuis les lignes partagées si ligne_store est actif, sinon en y ajoutant les pages reçues
+        """
+        if FETCH_MODE == "agregats" and periode == "annee" and not trimestre and not mois:
+            return SIGCube(await self.get_agregats_async(annee))
+        if self.utilise_snapshot(periode, annee, trimestre, mois):
+            snapshot = get_snapshot(self.vue)
+            await snapshot.synchroniser(self)
+            return snapshot.cube
+        if ligne_store.actif:
+            return SIGCube(await self.get_lines_async(periode, annee, trimestre, mois))
+        cube = SIGCube()
+        async for page in self.iter_pages_async(periode, annee, trimestre, mois):
+            cube.ajouter_lignes(page)
+        return cube
 
     def get_sous_indicateurs_par_annee(self, lignes, classes_autorisees=None, with_initiales=False):
         result = {}
@@ -150,84 +271,11 @@ class NavisionSIGController:
         return result
 
     def calcul_sig(self, lignes):
-        # Copié depuis OdooSIGController
-        result = {}
-        # --- Calcul de la Marge Commerciale (MC) ---
-        # MC = Ventes de marchandises - Achats de marchandises
-        has_ventes_mc = any(l['indicateur'] == 'MC' and 'VENTES DE MARCHANDISES' in l['sous_indicateur'] for l in lignes)
-        has_achats_mc = any(l['indicateur'] == 'VA' and 'ACHATS DE MARCHANDISES' in l['sous_indicateur'] for l in lignes)
-        if has_ventes_mc or has_achats_mc:
-            mc_ventes = sum(l['montant'] for l in lignes if l['indicateur'] == 'MC' and 'VENTES DE MARCHANDISES' in l['sous_indicateur'])
-            mc_achats = sum(l['montant'] for l in lignes if l['indicateur'] == 'VA' and 'ACHATS DE MARCHANDISES' in l['sous_indicateur'])
-            MC = mc_ventes - mc_achats  # MC = Ventes - Achats
-            result['MC'] = MC
-        else:
-            MC = None
-        # --- Calcul de la Valeur Ajoutée (VA) ---
-        # VA = MC + Production de l'exercice - Achats - Charges extérieures
-        has_prod = any(l['indicateur'] == 'MC' and any(si in l['sous_indicateur'] for si in ['VENTES DE PRODUITS FINIS', 'VENTES DE SERVICES', 'PRESTATIONS DE SERVICES']) for l in lignes)
-        has_achats = any(l['indicateur'] in ['MC', 'VA'] and any(si in l['sous_indicateur'] for si in ['ACHATS', 'FOURNITURES', 'ACHATS DE MARCHANDISES']) for l in lignes)
-        has_charges_ext = any(l['indicateur'] == 'EBE' and any(si in l['sous_indicateur'] for si in ['SERVICES EXTÉRIEURS', 'AUTRES SERVICES EXTÉRIEURS']) for l in lignes)
-        if MC is not None and (has_prod or has_achats or has_charges_ext):
-            # Production = ventes de produits finis, services, prestations + production stockée/immobilisée + subventions d'exploitation
-            prod = sum(l['montant'] for l in lignes if l['indicateur'] == 'MC' and any(si in l['sous_indicateur'] for si in ['VENTES DE PRODUITS FINIS', 'VENTES DE SERVICES', 'PRESTATIONS DE SERVICES']))
-            prod += sum(l['montant'] for l in lignes if l['indicateur'] == 'EBE' and any(si in l['sous_indicateur'] for si in ['PRODUCTION STOCKÉE', 'PRODUCTION IMMOBILISÉE', 'SUBVENTIONS D’EXPLOITATION']))
-            achats = sum(l['montant'] for l in lignes if l['indicateur'] in ['MC', 'VA'] and any(si in l['sous_indicateur'] for si in ['ACHATS', 'FOURNITURES', 'ACHATS DE MARCHANDISES']))
-            charges_ext = sum(l['montant'] for l in lignes if l['indicateur'] == 'EBE' and any(si in l['sous_indicateur'] for si in ['SERVICES EXTÉRIEURS', 'AUTRES SERVICES EXTÉRIEURS']))
-            VA = MC + prod - achats - charges_ext  # VA = MC + Production - Achats - Charges extérieures
-            result['VA'] = VA
-        else:
-            VA = None
-        # --- Calcul de l'Excédent Brut d'Exploitation (EBE) ---
-        # EBE = VA + Subventions d'exploitation - Impôts et taxes - Charges de personnel - Services extérieurs - Autres services extérieurs
-        has_subventions = any(l['indicateur'] == 'EBE' and 'SUBVENTIONS D’EXPLOITATION' in l['sous_indicateur'] for l in lignes)
-        has_impots_taxes = any(l['indicateur'] == 'RE' and 'IMPÔTS ET TAXES' in l['sous_indicateur'] for l in lignes)
-        has_charges_pers = any(l['indicateur'] == 'EBE' and 'CHARGES DE PERSONNEL' in l['sous_indicateur'] for l in lignes)
-        has_ebe_charges = any(l['indicateur'] == 'EBE' for l in lignes)
-        if VA is not None and has_ebe_charges:
-            subventions = sum(l['montant'] for l in lignes if l['indicateur'] == 'EBE' and 'SUBVENTIONS D’EXPLOITATION' in l['sous_indicateur'])
-            impots_taxes = sum(l['montant'] for l in lignes if l['indicateur'] == 'RE' and 'IMPÔTS ET TAXES' in l['sous_indicateur'])
-            charges_pers = sum(l['montant'] for l in lignes if l['indicateur'] == 'EBE' and 'CHARGES DE PERSONNEL' in l['sous_indicateur'])
-            # Ajoute aussi les autres charges EBE (services extérieurs, autres services extérieurs)
-            services_ext = sum(l['montant'] for l in lignes if l['indicateur'] == 'EBE' and 'SERVICES EXTÉRIEURS' in l['sous_indicateur'])
-            autres_services_ext = sum(l['montant'] for l in lignes if l['indicateur'] == 'EBE' and 'AUTRES SERVICES EXTÉRIEURS' in l['sous_indicateur'])
-            EBE = VA + subventions - impots_taxes - charges_pers - services_ext - autres_services_ext  # Formule EBE
-            result['EBE'] = EBE
-        else:
-            EBE = None
-        # --- Calcul du Résultat d'Exploitation (RE) ---
-        # RE = EBE + Autres produits de gestion courante - Autres charges de gestion courante + Reprises sur amortissements - Dotations aux amortissements
-        has_autres_prod_gest = any(l['indicateur'] == 'RE' and 'AUTRES PRODUITS DE GESTION COURANTE' in l['sous_indicateur'] for l in lignes)
-        has_autres_charges_gest = any(l['indicateur'] == 'RE' and 'AUTRES CHARGES DE GESTION COURANTE' in l['sous_indicateur'] for l in lignes)
-        has_reprises_amort = any(l['indicateur'] == 'RE' and 'REPRISES AMORTISSEMENTS' in l['sous_indicateur'] for l in lignes)
-        has_dotations_amort = any(l['indicateur'] == 'RE' and any(si in l['sous_indicateur'] for si in ['DOTATIONS AMORTISSEMENTS']) for l in lignes)
-        if EBE is not None and (has_autres_prod_gest or has_autres_charges_gest or has_reprises_amort or has_dotations_amort):
-            autres_prod_gest = sum(l['montant'] for l in lignes if l['indicateur'] == 'RE' and 'AUTRES PRODUITS DE GESTION COURANTE' in l['sous_indicateur'])
-            autres_charges_gest = sum(l['montant'] for l in lignes if l['indicateur'] == 'RE' and 'AUTRES CHARGES DE GESTION COURANTE' in l['sous_indicateur'])
-            reprises_amort = sum(l['montant'] for l in lignes if l['indicateur'] == 'RE' and 'REPRISES AMORTISSEMENTS' in l['sous_indicateur'])
-            dotations_amort = sum(l['montant'] for l in lignes if l['indicateur'] == 'RE' and any(si in l['sous_indicateur'] for si in ['DOTATIONS AMORTISSEMENTS']))
-            RE = EBE + autres_prod_gest - autres_charges_gest + reprises_amort - dotations_amort  # Formule RE
-            result['RE'] = RE
-        else:
-            RE = None
-        # --- Calcul du Résultat Net (R) ---
-        # R = RE + Produits financiers - Charges financières + Produits exceptionnels - Charges exceptionnelles - Impôts sur les bénéfices + Transferts de charges
-        has_prod_fin = any(l['indicateur'] == 'RE' and 'PRODUITS FINANCIERS' in l['sous_indicateur'] for l in lignes)
-        has_charges_fin = any(l['indicateur'] == 'R' and 'CHARGES FINANCIÈRES' in l['sous_indicateur'] for l in lignes)
-        has_prod_excep = any(l['indicateur'] == 'R' and 'PRODUITS EXCEPTIONNELS' in l['sous_indicateur'] for l in lignes)
-        has_charges_excep = any(l['indicateur'] == 'R' and 'CHARGES EXCEPTIONNELLES' in l['sous_indicateur'] for l in lignes)
-        has_impots_benef = any(l['indicateur'] == 'R' and 'IMPÔTS SUR LES BÉNÉFICES' in l['sous_indicateur'] for l in lignes)
-        has_transferts = any(l['indicateur'] == 'R' and 'TRANSFERTS DE CHARGES' in l['sous_indicateur'] for l in lignes)
-        if RE is not None and (has_prod_fin or has_charges_fin or has_prod_excep or has_charges_excep or has_impots_benef or has_transferts):
-            prod_fin = sum(l['montant'] for l in lignes if l['indicateur'] == 'RE' and 'PRODUITS FINANCIERS' in l['sous_indicateur'])
-            charges_fin = sum(l['montant'] for l in lignes if l['indicateur'] == 'R' and 'CHARGES FINANCIÈRES' in l['sous_indicateur'])
-            prod_excep = sum(l['montant'] for l in lignes if l['indicateur'] == 'R' and 'PRODUITS EXCEPTIONNELS' in l['sous_indicateur'])
-            charges_excep = sum(l['montant'] for l in lignes if l['indicateur'] == 'R' and 'CHARGES EXCEPTIONNELLES' in l['sous_indicateur'])
-            impots_benef = sum(l['montant'] for l in lignes if l['indicateur'] == 'R' and 'IMPÔTS SUR LES BÉNÉFICES' in l['sous_indicateur'])
-            transferts = sum(l['montant'] for l in lignes if l['indicateur'] == 'R' and 'TRANSFERTS DE CHARGES' in l['sous_indicateur'])
-            R = RE + prod_fin - charges_fin + prod_excep - charges_excep - impots_benef + transferts  # Formule Résultat Net
-            result['R'] = R
-        return result
+        """
+        Indicateurs SIG d'un ensemble de lignes enrichies, évalués avec les formules
+        partagées (models/SIG_formules.py) sur une seule agrégation des lignes
+        """
+        return SIGCalculator(lignes).calculer_tous_indicateurs()
 
     def calcul_sig_par_annee(self, lignes):
         lignes_par_annee = {}
@@ -255,7 +303,7 @@ class NavisionSIGController:
         indicateurs = {}
         libelles = {'MC': 'Marge commerciale', 'VA': 'Valeur ajoutée', 'EBE': 'Excédent brut d\'exploitation', 'RE': 'Résultat d\'exploitation', 'R': 'Résultat net'}
         for line in lines:
-            mapping = MappingIndicateurSIG.find_best_mapping(line["code_compte"])
+            mapping = MappingIndex.lookup(line["code_compte"])
             if mapping:
                 ind = mapping.indicateur
                 # Calcul du solde selon la nature du compte
@@ -279,7 +327,7 @@ class NavisionSIGController:
         comptes_par_sous_ind = {}  # Pour tracer les comptes utilisés dans chaque sous-indicateur
         
         for line in lines:
-            mapping = MappingIndicateurSIG.find_best_mapping(line["code_compte"])
+            mapping = MappingIndex.lookup(line["code_compte"])
             if mapping and mapping.indicateur == indicateur:
                 sous_ind = mapping.sous_indicateur
                 # Calcul du solde selon la nature du compte
@@ -340,7 +388,7 @@ class NavisionSIGController:
         comptes_par_sous_ind = {}  # Pour tracer les comptes utilisés dans chaque sous-indicateur
         
         for line in lignes:
-            mapping = MappingIndicateurSIG.find_best_mapping(line["code_compte"])
+            mapping = MappingIndex.lookup(line["code_compte"])
             if mapping and mapping.indicateur == indicateur:
                 sous_ind = mapping.sous_indicateur
                 # Calcul du solde selon la nature du compte
@@ -401,7 +449,7 @@ class NavisionSIGController:
         lines = self.get_lines(periode, annee, trimestre)
         comptes = {}
         for line in lines:
-            mapping = MappingIndicateurSIG.find_best_mapping(line["code_compte"])
+            mapping = MappingIndex.lookup(line["code_compte"])
             if mapping and mapping.sous_indicateur == sous_indicateur:
                 code = line["code_compte"]
                 # Calcul du solde selon la nature du compte
@@ -1,17 +1,36 @@
 from services.odoo.odoo_api import OdooService
-from models.PlanComptable import MappingIndicateurSIG
+from models.PlanComptable import MappingIndicateurSIG, TableComptes
+from models.SIG_model import SIGCalculator
 import datetime
+import os
+
+FETCH_MODE = os.getenv("ODOO_FETCH_MODE", "read_group").lower()
 
 class OdooSIGController:
     def __init__(self):
         self.odoo = OdooService()
 
-    def get_period_domain(self, periode, trimestre=None):
+    def get_period_domain(self, periode, trimestre=None, annee=None, mois=None):
+        """
+        Domaines de dates Odoo, un par année : les 4 dernières années par défaut,
+        ou la seule année demandée ; restreints au trimestre ou au mois si fournis.
+        L'ancien appel get_lines("mois", (annee, mois)) est accepté.
+        """
+        if periode == "mois" and isinstance(trimestre, (tuple, list)):
+            annee, mois = trimestre
+            trimestre = None
         today = datetime.date.today()
-        annees = [today.year, today.year - 1, today.year - 2, today.year - 3]
+        annees = [annee] if annee is not None else [today.year, today.year - 1, today.year - 2, today.year - 3]
         domains = []
         for annee in annees:
-            if periode == "trimestre" and trimestre:
+            if periode == "mois" and mois:
+                date_debut = f"{annee}-{mois:02d}-01"
+                if mois == 12:
+                    date_fin = f"{annee}-12-31"
+                else:
+                    date_fin = (datetime.date(annee, mois + 1, 1) - datetime.timedelta(days=1)).isoformat()
+                domains.append([['date', '>=', date_debut], ['date', '<=', date_fin]])
+            elif periode == "trimestre" and trimestre:
                 mois_debut = (trimestre - 1) * 3 + 1
                 mois_fin = mois_debut + 2
                 date_debut = f"{annee}-{mois_debut:02d}-01"
@@ -25,45 +44,108 @@ class OdooSIGController:
                 domains.append([['date', '>=', f"{annee}-01-01"], ['date', '<=', f"{annee}-12-31"]])
         return domains
 
-    def get_lines(self, periode, trimestre=None):
-        domains = self.get_period_domain(periode, trimestre)
+    def enrichir_ligne(self, l):
+        """
+        Enrichit une ligne Odoo (brute ou agrégée) : code et libellé du compte, classes,
+        indicateur SIG, montant et année
+        """
+        if isinstance(l['account_id'], list):
+            l['code_compte'] = l['account_id'][1].split(' ')[0]
+            l['libelle_compte'] = ' '.join(l['account_id'][1].split(' ')[1:])
+        else:
+            l['code_compte'] = ''
+            l['libelle_compte'] = ''
+        compte = TableComptes.dimension(l["code_compte"])
+        l['classe'] = compte.classe
+        l['sous_classe'] = compte.sous_classe
+        l['sss_classe'] = compte.sss_classe
+        
+        # Amélioration du mapping : utiliser le même système que Navision
+        l['indicateur'] = compte.indicateur
+        l['sous_indicateur'] = list(compte.sous_indicateurs)
+        
+        l['montant'] = l['debit'] - l['credit']
+        # Ajout de l'année
+        try:
+            l['annee'] = int(str(l['date'])[:4])
+        except Exception:
+            l['annee'] = None
+        return l
+
+    def get_lines(self, periode, trimestre=None, annee=None, mois=None):
+        """
+        Lignes brutes account.move.line enrichies (utilisées pour le détail par compte)
+        """
+        domains = self.get_period_domain(periode, trimestre, annee, mois)
         all_lines = []
         for domain in domains:
             domain.append(['move_id.state', '=', 'posted'])
             fields = ['account_id', 'debit', 'credit', 'date']
-            lines = self.odoo.search_read('account.move.line', domain, fields + ['account_id'])
-            enriched = []
-            for l in lines:
-                if isinstance(l['account_id'], list):
-                    l['code_compte'] = l['account_id'][1].split(' ')[0]
-                    l['libelle_compte'] = ' '.join(l['account_id'][1].split(' ')[1:])
-                else:
-                    l['code_compte'] = ''
-                    l['libelle_compte'] = ''
-                code = l["code_compte"]
-                l['classe'] = code[:1] if code else ''
-                l['sous_classe'] = code[:2] if code else ''
-                l['sss_classe'] = code[:3] if code else ''
-                
-                # Amélioration du mapping : utiliser le même système que Navision
-                mapping = MappingIndicateurSIG.find_best_mapping(code)
-                if mapping:
-                    l['indicateur'] = mapping.indicateur
-                    l['sous_indicateur'] = [mapping.sous_indicateur] if mapping.sous_indicateur else []
-                else:
-                    l['indicateur'] = None
-                    l['sous_indicateur'] = []
-                
-                l['montant'] = l['debit'] - l['credit']
-                # Ajout de l'année
-                try:
-                    l['annee'] = int(str(l['date'])[:4])
-                except Exception:
-                    l['annee'] = None
-                enriched.append(l)
-            all_lines.extend(enriched)
+            lines = self.odoo.search_read_all('account.move.line', domain, fields)
+            all_lines.extend(self.enrichir_ligne(l) for l in lines)
         return all_lines
 
+    @staticmethod
+    def debut_de_mois_du_groupe(groupe):
+        """
+        Date du premier jour du mois d'un groupe read_group sur date:month,
+        lue dans __range (Odoo >= 15) ou à défaut dans la borne basse de __domain
+        """
+        plage = (groupe.get('__range') or {}).get('date:month') or (groupe.get('__range') or {}).get('date')
+        if plage and plage.get('from'):
+            return str(plage['from'])[:10]
+        for condition in groupe.get('__domain', []):
+            if isinstance(condition, (list, tuple)) and len(condition) == 3 and condition[0] == 'date' and condition[1] == '>=':
+                return str(condition[2])[:10]
+        return None
+
+    def get_lignes_agregees(self, periode, trimestre=None, annee=None, mois=None):
+        """
+        Sommes debit/credit par compte et par mois calculées par Odoo (read_group) :
+        quelques centaines de groupes au lieu de toutes les lignes d'écriture.
+        Chaque groupe est enrichi comme une ligne (date = premier jour du mois).
+        """
+        domains = self.get_period_domain(periode, trimestre, annee, mois)
+        all_lines = []
+        for domain in domains:
+            domain.append(['move_id.state', '=', 'posted'])
+            groupes = self.odoo.read_group(
+                'account.move.line', domain, ['debit', 'credit'], ['account_id', 'date:month']
+            )
+            for groupe in groupes:
+                ligne = {
+                    'account_id': groupe.get('account_id'),
+                    'debit': groupe.get('debit') or 0,
+                    'credit': groupe.get('credit') or 0,
+                    'date': self.debut_de_mois_du_groupe(groupe),
+                    'nb_lignes': groupe.get('__count', groupe.get('account_id_count', 0)),
+                }
+                all_lines.append(self.enrichir_ligne(ligne))
+        return all_lines
+
+    def get_lignes_sig(self, periode, trimestre=None, annee=None, mois=None):
+        """
+        Lignes alimentant SIGCalculator et les sous-indicateurs : agrégées par read_group
+        (ODOO_FETCH_MODE=read_group, par défaut) ou brutes (ODOO_FETCH_MODE=lignes).
+        L'année et le mois éventuels sont poussés dans le domaine Odoo.
+        """
+        if FETCH_MODE == "lignes":
+            return self.get_lines(periode, trimestre, annee, mois)
+        return self.get_lignes_agregees(periode, trimestre, annee, mois)
+
+    @staticmethod
+    def repartir_par_mois(lignes):
+        """
+        Répartit localement les lignes d'une année par mois (1 à 12)
+        """
+        par_mois = {mois: [] for mois in range(1, 13)}
+        for l in lignes:
+            try:
+                par_mois[int(str(l['date'])[5:7])].append(l)
+            except (KeyError, ValueError):
+                continue
+        return par_mois
+
     def get_indicateurs(self, periode, trimestre=None):
         lines = self.get_lines(periode, trimestre)
         indicateurs = {}
@@ -140,56 +222,11 @@ class OdooSIGController:
         return result
 
     def calcul_sig(self, lignes):
-        result = {}
-
-        # --- Calcul de la Marge Commerciale (MC) ---
-        # MC = Ventes de marchandises - Coût d'achat des marchandises vendues
-        mc_ventes = sum(l['montant'] for l in lignes if l['indicateur'] == 'MC' and 'VENTES DE MARCHANDISES' in l['sous_indicateur'])
-        mc_achats = sum(l['montant'] for l in lignes if l['indicateur'] == 'MC' and 'ACHATS DE MARCHANDISES' in l['sous_indicateur'])
-        MC = mc_ventes - abs(mc_achats)  # MC = Ventes - Achats (en valeur absolue car les achats sont des charges)
-        if MC != 0:
-            result['MC'] = MC
-        else:
-            MC = None
-            
-        # --- Calcul de la Valeur Ajoutée (VA) ---
-        # VA = MC + Production de l'exercice - Consommations de l'exercice
-        va_production = sum(l['montant'] for l in lignes if l['indicateur'] == 'MC' and any(si in l['sous_indicateur'] for si in ['VENTES DE PRODUITS FINIS', 'PRESTATIONS DE SERVICES']))
-        va_consommations = sum(l['montant'] for l in lignes if l['indicateur'] == 'MC' and any(si in l['sous_indicateur'] for si in ['ACHATS DE MARCHANDISES']))
-        
-        if MC is not None or va_production != 0 or va_consommations != 0:
-            VA = (MC if MC else 0) + va_production - abs(va_consommations)
-            if VA != 0:
-                result['VA'] = VA
-        else:
-            VA = None
-            
-        # --- Calcul de l'Excédent Brut d'Exploitation (EBE) ---
-        # EBE = VA - Charges de personnel - Impôts et taxes
-        if VA is not None:
-            # Pour l'instant, on utilise VA comme EBE car on n'a pas les charges de personnel
-            EBE = VA
-            result['EBE'] = EBE
-        else:
-            EBE = None
-            
-        # --- Calcul du Résultat d'Exploitation (RE) ---
-        # RE = EBE + Autres produits - Autres charges
-        if EBE is not None:
-            # Pour l'instant, on utilise EBE comme RE
-            RE = EBE
-            result['RE'] = RE
-        else:
-            RE = None
-            
-        # --- Calcul du Résultat Net (R) ---
-        # R = RE + Résultat financier + Résultat exceptionnel
-        if RE is not None:
-            # Pour l'instant, on utilise RE comme R
-            R = RE
-            result['R'] = R
-
-        return result
+        """
+        Indicateurs SIG d'un ensemble de lignes enrichies, évalués avec les formules
+        partagées (models/SIG_formules.py) sur une seule agrégation des lignes
+        """
+        return SIGCalculator(lignes).calculer_tous_indicateurs()
 
     def calcul_sig_par_annee(self, lignes):
         # Regroupe les lignes par année
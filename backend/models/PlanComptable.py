@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import json
+
+
 class PlanComptable:
     """
     Represente un compte du plan comptable.
@@ -154,16 +158,9 @@ class MappingIndicateurSIG:
         """
         Recherche le meilleur mapping SIG pour un code de compte donne.
         Exemple : pour '6061', il retournera dabord 6061, puis 606, puis 60, puis 6.
+        Delegue a l'index compile MappingIndex.
         """
-        code = str(code_compte)
-        mappings = MappingIndicateurSIG.get_mapping()
-
-        for length in range(len(code), 0, -1):
-            prefix = code[:length]
-            for mapping in mappings:
-                if mapping.prefixe_compte == prefix:
-                    return mapping
-        return None
+        return MappingIndex.lookup(code_compte)
 
     @staticmethod
     def get_sous_indicateur_initiales():
@@ -374,3 +371,134 @@ class MappingIndicateurSIG:
             ]
         }
 
+
+class MappingIndex:
+    """
+    Index compile des mappings SIG (prefixe -> mapping), construit une seule fois a l'import.
+    La recherche du plus long prefixe ne depend que de la longueur du code, pas du nombre de regles.
+    """
+    _par_prefixe = {}
+    _longueur_max = 0
+    _cache = {}
+    _version = None
+
+    @staticmethod
+    def compiler(mappings):
+        """
+        (Re)construit l'index a partir d'une liste de MappingIndicateurSIG.
+        En cas de doublon sur un prefixe, le premier mapping de la liste est conserve.
+        """
+        par_prefixe = {}
+        for mapping in mappings:
+            par_prefixe.setdefault(mapping.prefixe_compte, mapping)
+        MappingIndex._par_prefixe = par_prefixe
+        MappingIndex._longueur_max = max((len(p) for p in par_prefixe), default=0)
+        MappingIndex._cache = {}
+        MappingIndex._version = None
+        TableComptes.invalider()
+
+    @staticmethod
+    def version():
+        """
+        Empreinte (sha256) des regles compilees : change des qu'un prefixe, un indicateur
+        ou un sous-indicateur du mapping change.
+        """
+        if MappingIndex._version is None:
+            regles = sorted(
+                (prefixe, mapping.indicateur, mapping.sous_indicateur)
+                for prefixe, mapping in MappingIndex._par_prefixe.items()
+            )
+            MappingIndex._version = hashlib.sha256(
+                json.dumps(regles, ensure_ascii=False).encode('utf-8')
+            ).hexdigest()
+        return MappingIndex._version
+
+    @staticmethod
+    def lookup(code_compte):
+        """
+        Retourne le mapping du plus long prefixe connu pour un code de compte, ou None.
+        Exemple : pour '60611000', il retournera le mapping 6061.
+        """
+        code = str(code_compte)
+        try:
+            return MappingIndex._cache[code]
+        except KeyError:
+            pass
+
+        mapping = None
+        par_prefixe = MappingIndex._par_prefixe
+        for length in range(min(len(code), MappingIndex._longueur_max), 0, -1):
+            mapping = par_prefixe.get(code[:length])
+            if mapping is not None:
+                break
+        MappingIndex._cache[code] = mapping
+        return mapping
+
+
+class DimensionCompte:
+    """
+    Attributs d'un code de compte, identiques pour toutes ses lignes :
+    classes, indicateur / sous-indicateurs SIG et signe du solde.
+    """
+    __slots__ = ('code_compte', 'classe', 'sous_classe', 'sss_classe', 'indicateur', 'sous_indicateurs', 'nature', 'signe')
+
+    def __init__(self, code_compte):
+        code = str(code_compte or '')
+        mapping = MappingIndex.lookup(code)
+        self.code_compte = code
+        self.classe = code[:1]
+        self.sous_classe = code[:2]
+        self.sss_classe = code[:3]
+        self.indicateur = mapping.indicateur if mapping else None
+        self.sous_indicateurs = (mapping.sous_indicateur,) if mapping and mapping.sous_indicateur else ()
+        # Classes 7 et 8 (produits, passif) : solde = Credit - Debit ; autres classes : Debit - Credit
+        self.nature = 'passif' if self.classe in ('7', '8') else 'actif'
+        self.signe = -1 if self.nature == 'passif' else 1
+
+    def solde(self, debit, credit):
+        """
+        Solde d'une ligne selon la nature du compte
+        """
+        return self.signe * (debit - credit)
+
+
+class TableComptes:
+    """
+    Table de dimension des comptes (code -> DimensionCompte), partagee entre les requetes.
+    Une ligne ne fait qu'une recherche dans cette table : le mapping et la nature
+    ne sont calcules qu'une fois par code distinct, et non pour chaque ligne.
+    """
+    _dimensions = {}
+
+    @staticmethod
+    def dimension(code_compte):
+        code = str(code_compte or '')
+        try:
+            return TableComptes._dimensions[code]
+        except KeyError:
+            dimension = TableComptes._dimensions[code] = DimensionCompte(code)
+            return dimension
+
+    @staticmethod
+    def indexer(codes):
+        """
+        Joint une sequence de codes a la table : retourne (dimensions distinctes, indice de chaque code).
+        Les attributs d'une ligne i se lisent ensuite par dimensions[indices[i]].
+        """
+        dimensions = []
+        positions = {}
+        indices = []
+        for code in codes:
+            position = positions.get(code)
+            if position is None:
+                position = positions[code] = len(dimensions)
+                dimensions.append(TableComptes.dimension(code))
+            indices.append(position)
+        return dimensions, indices
+
+    @staticmethod
+    def invalider():
+        TableComptes._dimensions = {}
+
+
+MappingIndex.compiler(MappingIndicateurSIG.get_mapping())
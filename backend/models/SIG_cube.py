@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Cube SIG multi-périodes
+Regroupe les lignes comptables en une seule passe par (année, trimestre, mois, indicateur,
+sous-indicateur, compte) pour obtenir les SIG mensuels, trimestriels et annuels par agrégation
+"""
+
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+from models.SIG_model import SIGCalculator
+from models.ledger_batch import LedgerBatch
+
+
+class SIGCube:
+    """
+    Cube des montants comptables par période et par compte
+    """
+
+    def __init__(self, lignes: Optional[Iterable[Dict[str, Any]]] = None):
+        """
+        Initialise le cube et y ajoute les lignes comptables
+
+        Args:
+            lignes: Lignes comptables enrichies (indicateur, sous_indicateur, montant, annee) ou LedgerBatch
+        """
+        # (annee, trimestre, mois, indicateur, sous_indicateurs, code_compte) -> [montant, debit, credit]
+        self._cellules = {}
+        # (annee, mois) -> nombre de lignes, y compris celles sans indicateur
+        self._nb_lignes = {}
+        self._cache_agregats = {}
+        if lignes:
+            self.ajouter_lignes(lignes)
+
+    @staticmethod
+    def extraire_mois(ligne: Dict[str, Any]) -> Optional[int]:
+        """
+        Extrait le mois d'une ligne à partir de date_ecriture (format "2021-01-31T00:00:00")
+        """
+        date_ecriture = ligne.get('date_ecriture') or ligne.get('date')
+        if date_ecriture:
+            try:
+                return int(str(date_ecriture).split('-')[1])
+            except (IndexError, ValueError):
+                return None
+        return ligne.get('mois')
+
+    @staticmethod
+    def trimestre_du_mois(mois: Optional[int]) -> Optional[int]:
+        return (mois - 1) // 3 + 1 if mois else None
+
+    def ajouter_lignes(self, lignes: Iterable[Dict[str, Any]]):
+        """
+        Ajoute des lignes au cube (une seule passe) en appliquant les montants comme des deltas :
+        les tables mensuelles déjà calculées sont mises à jour et seules les périodes
+        des années touchées sont invalidées
+        """
+        if isinstance(lignes, LedgerBatch):
+            self.ajouter_batch(lignes)
+            return
+        annees_touchees = set()
+        for ligne in lignes:
+            self._ajouter_ligne(ligne, annees_touchees)
+        self._invalider(annees_touchees)
+
+    def _ajouter_ligne(self, ligne: Dict[str, Any], annees_touchees):
+        annee = ligne.get('annee')
+        if annee is None:
+            return
+        self._ajouter(
+            annee,
+            self.extraire_mois(ligne),
+            ligne.get('indicateur'),
+            tuple(ligne.get('sous_indicateur') or ()),
+            str(ligne.get('code_compte', '')),
+            ligne['montant'],
+            ligne.get('debit', 0) or 0,
+            ligne.get('credit', 0) or 0,
+            annees_touchees
+        )
+
+    def ajouter_batch(self, batch: LedgerBatch):
+        """
+        Ajoute un LedgerBatch en lisant directement ses colonnes (aucune ligne n'est reconstruite)
+        """
+        annees_touchees = set()
+        dimensions = batch.dimensions
+        for annee, mois, compte, montant, debit, credit in zip(
+                batch.annees, batch.mois, batch.comptes, batch.montants, batch.debits, batch.credits):
+            if not annee:
+                continue
+            dimension = dimensions[compte]
+            self._ajouter(annee, mois or None, dimension.indicateur, dimension.sous_indicateurs, dimension.code_compte,
+                          montant, debit, credit, annees_touchees)
+        self._invalider(annees_touchees)
+
+    def _ajouter(self, annee, mois, indicateur, sous_indicateurs, code_compte, montant, debit, credit, annees_touchees):
+        nb_lignes = self._nb_lignes
+        nb_lignes[(annee, mois)] = nb_lignes.get((annee, mois), 0) + 1
+        if not indicateur:
+            return
+        annees_touchees.add(annee)
+        cle = (annee, self.trimestre_du_mois(mois), mois, indicateur, sous_indicateurs, code_compte)
+        cellule = self._cellules.get(cle)
+        if cellule is None:
+            cellule = self._cellules[cle] = [0, 0, 0]
+        cellule[0] += montant
+        cellule[1] += debit
+        cellule[2] += credit
+        tables = self._cache_agregats.get(None)
+        if tables is not None:
+            table = tables.setdefault((annee, mois), {})
+            cle_agregat = (indicateur, sous_indicateurs, SIGCalculator.est_compte_tiers(code_compte))
+            table[cle_agregat] = table.get(cle_agregat, 0) + montant
+
+    def _invalider(self, annees_touchees):
+        for periode in [p for p in self._cache_agregats if p is not None and p[0] in annees_touchees]:
+            del self._cache_agregats[periode]
+
+    def annees(self) -> List[int]:
+        """
+        Retourne les années présentes dans le cube, de la plus récente à la plus ancienne
+        """
+        return sorted({annee for annee, _ in self._nb_lignes}, reverse=True)
+
+    def mois_disponibles(self, annee: int) -> List[int]:
+        """
+        Retourne les mois d'une année qui contiennent au moins une ligne
+        """
+        return sorted(mois for a, mois in self._nb_lignes if a == annee and mois)
+
+    def _selectionner(self, annee: int, trimestre: Optional[int] = None, mois: Optional[int] = None):
+        for cle, cellule in self._cellules.items():
+            if cle[0] != annee:
+                continue
+            if trimestre is not None and cle[1] != trimestre:
+                continue
+            if mois is not None and cle[2] != mois:
+                continue
+            yield cle, cellule
+
+    def agregats(self, annee: int, trimestre: Optional[int] = None, mois: Optional[int] = None) -> Dict[Tuple[str, Tuple[str, ...], bool], float]:
+        """
+        Agrège les cellules d'une période au format attendu par SIGCalculator.depuis_agregats
+
+        Args:
+            annee: Année de la période
+            trimestre: Trimestre (1 à 4) pour une période trimestrielle
+            mois: Mois (1 à 12) pour une période mensuelle
+
+        Returns:
+            Table (indicateur, sous-indicateurs, est_tiers) -> montant
+        """
+        periode = (annee, trimestre, mois)
+        if periode in self._cache_agregats:
+            return self._cache_agregats[periode]
+
+        agregats = {}
+        for (a, m), table in self._tables_mensuelles().items():
+            if a != annee:
+                continue
+            if trimestre is not None and self.trimestre_du_mois(m) != trimestre:
+                continue
+            if mois is not None and m != mois:
+                continue
+            for cle, montant in table.items():
+                agregats[cle] = agregats.get(cle, 0) + montant
+        self._cache_agregats[periode] = agregats
+        return agregats
+
+    def _tables_mensuelles(self) -> Dict[Tuple[int, Optional[int]], Dict[Tuple[str, Tuple[str, ...], bool], float]]:
+        """
+        Réduit les cellules en une table d'agrégats par (année, mois), en une seule passe
+        Les trimestres et les années sont ensuite obtenus en sommant ces tables
+        """
+        if None in self._cache_agregats:
+            return self._cache_agregats[None]
+        tables = {}
+        for (annee, _, mois, indicateur, sous_indicateurs, code_compte), cellule in self._cellules.items():
+            table = tables.setdefault((annee, mois), {})
+            cle = (indicateur, sous_indicateurs, SIGCalculator.est_compte_tiers(code_compte))
+            table[cle] = table.get(cle, 0) + cellule[0]
+        self._cache_agregats[None] = tables
+        return tables
+
+    def calculateur(self, annee: int, trimestre: Optional[int] = None, mois: Optional[int] = None) -> SIGCalculator:
+        """
+        Retourne un SIGCalculator alimenté par les agrégats de la période
+        """
+        return SIGCalculator.depuis_agregats(self.agregats(annee, trimestre, mois))
+
+    def comptes(self, annee: int, trimestre: Optional[int] = None, mois: Optional[int] = None, sous_indicateur: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Agrège les montants par compte pour une période, éventuellement filtrés sur un sous-indicateur
+
+        Returns:
+            Dictionnaire code_compte -> {"montant", "debit", "credit"}
+        """
+        cible = sous_indicateur.strip().lower() if sous_indicateur else None
+        comptes = {}
+        for (_, _, _, _, sous_indicateurs, code_compte), cellule in self._selectionner(annee, trimestre, mois):
+            if cible is not None and not any(cible == si.strip().lower() for si in sous_indicateurs):
+                continue
+            compte = comptes.setdefault(code_compte, {"montant": 0, "debit": 0, "credit": 0})
+            compte["montant"] += cellule[0]
+            compte["debit"] += cellule[1]
+            compte["credit"] += cellule[2]
+        return comptes
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Formules SIG déclaratives et plan d'évaluation compilé
+Chaque indicateur est une liste de termes signés portant sur ses sous-indicateurs
+ou sur un autre indicateur ; la table est compilée une fois en un plan plat :
+toutes les sommes nécessaires sont calculées en une seule passe sur les agrégats,
+puis les indicateurs sont évalués dans l'ordre des dépendances.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Indicateur -> formule
+#   termes : (signe, référence) ; la référence est un sous-indicateur de l'indicateur
+#            ou le code d'un autre indicateur de la table (valeur amont).
+#            '+' ajoute le montant, '-' soustrait sa valeur absolue (charge).
+#   repli : si tous les termes sont nuls, la valeur est le total de l'indicateur (hors tiers)
+#   composantes_par_signe : dans la formule affichée, un sous-indicateur est classé
+#            selon le signe de son montant (sinon selon le signe de son terme)
+FORMULES_SIG = {
+    'MC': {
+        # MC = Ventes de marchandises - Coût d'achat des marchandises vendues
+        'termes': [
+            ('+', 'VENTES DE MARCHANDISES'),
+            ('+', 'VENTES DE PRODUITS FINIS'),
+            ('+', 'VENTES DE SERVICES'),
+            ('+', 'PRESTATIONS DE SERVICES'),
+            ('+', 'TVA COLLECTEE'),
+            ('-', 'ACHATS DE MARCHANDISES'),
+        ],
+        'repli': True,
+        'composantes_par_signe': False,
+    },
+    'VA': {
+        # VA = Production de l'exercice + Marge commerciale - Consommations de l'exercice
+        'termes': [
+            ('+', 'PRESTATIONS DE SERVICES'),
+            ('+', 'VENTES DE PRODUITS FINIS'),
+            ('+', 'PRODUCTION STOCKÉE'),
+            ('+', 'PRODUCTION IMMOBILISÉE'),
+            ('+', 'MC'),
+            ('-', 'ACHATS STOCKES'),
+            ('-', 'ACHATS NON STOCKES'),
+            ('-', 'FOURNITURES'),
+            ('-', 'SERVICES EXTÉRIEURS'),
+            ('-', 'AUTRES SERVICES EXTÉRIEURS'),
+        ],
+        'repli': True,
+        'composantes_par_signe': False,
+    },
+    'EBE': {
+        # EBE = VA + Subventions d'exploitation - Impôts et taxes - Charges de personnel
+        'termes': [
+            ('+', 'VA'),
+            ('+', 'SUBVENTIONS D\'EXPLOITATION'),
+            ('-', 'IMPÔTS ET TAXES'),
+            ('-', 'CHARGES DE PERSONNEL'),
+        ],
+        'repli': False,
+        'composantes_par_signe': True,
+    },
+    'RE': {
+        # RE = EBE + Autres produits - Autres charges
+        'termes': [
+            ('+', 'EBE'),
+            ('+', 'AUTRES PRODUITS DE GESTION COURANTE'),
+            ('+', 'REPRISES AMORTISSEMENTS'),
+            ('-', 'AUTRES CHARGES DE GESTION COURANTE'),
+            ('-', 'DOTATIONS AMORTISSEMENTS'),
+        ],
+        'repli': False,
+        'composantes_par_signe': True,
+    },
+    'R': {
+        # R = RE + Résultat financier + Résultat exceptionnel - Impôts sur les bénéfices
+        'termes': [
+            ('+', 'RE'),
+            ('+', 'PRODUITS FINANCIERS'),
+            ('-', 'CHARGES FINANCIÈRES'),
+            ('+', 'PRODUITS EXCEPTIONNELS'),
+            ('-', 'CHARGES EXCEPTIONNELLES'),
+            ('-', 'IMPÔTS SUR LES BÉNÉFICES'),
+        ],
+        'repli': False,
+        'composantes_par_signe': True,
+    },
+}
+
+
+class PlanSIG:
+    """
+    Plan d'évaluation compilé à partir d'une table de formules
+    """
+
+    def __init__(self, formules: Dict[str, Dict[str, Any]]):
+        self.formules = formules
+        # (indicateur, sous-indicateur ou None pour le total) -> position dans le vecteur des sommes
+        self.positions = {}
+        # Indicateur -> indicateurs amont dont il dépend
+        self.amont = {}
+        # Étapes dans l'ordre des dépendances : (indicateur, [(signe, est_noeud, référence ou position)], position du total)
+        self.etapes = []
+        self.compiler()
+
+    def _position(self, indicateur: str, sous_indicateur: Optional[str]) -> int:
+        cle = (indicateur, sous_indicateur)
+        position = self.positions.get(cle)
+        if position is None:
+            position = self.positions[cle] = len(self.positions)
+        return position
+
+    def compiler(self):
+        for indicateur, formule in self.formules.items():
+            self.amont[indicateur] = [ref for _, ref in formule['termes'] if ref in self.formules]
+
+        ordre = []
+        visites = set()
+
+        def visiter(indicateur, chemin):
+            if indicateur in visites:
+                return
+            if indicateur in chemin:
+                raise ValueError(f"Dépendance circulaire entre indicateurs SIG : {' -> '.join(chemin + (indicateur,))}")
+            for amont in self.amont[indicateur]:
+                visiter(amont, chemin + (indicateur,))
+            visites.add(indicateur)
+            ordre.append(indicateur)
+
+        for indicateur in self.formules:
+            visiter(indicateur, ())
+
+        for indicateur in ordre:
+            formule = self.formules[indicateur]
+            termes = []
+            for signe, ref in formule['termes']:
+                if ref in self.formules:
+                    termes.append((signe, True, ref))
+                else:
+                    termes.append((signe, False, self._position(indicateur, ref)))
+            total = self._position(indicateur, None) if formule.get('repli') else None
+            self.etapes.append((indicateur, termes, total))
+        self._par_indicateur = {etape[0]: etape for etape in self.etapes}
+        # Index des sommes par indicateur, pour la passe unique sur les agrégats
+        self._cles_par_indicateur = {}
+        for (indicateur, sous_indicateur), position in self.positions.items():
+            self._cles_par_indicateur.setdefault(indicateur, {})[sous_indicateur] = position
+
+    def dependants(self, indicateur: str) -> List[str]:
+        """
+        Indicateurs qui dépendent (directement ou non) d'un indicateur, lui compris
+        """
+        touches = {indicateur}
+        for code, _, _ in self.etapes:
+            if any(amont in touches for amont in self.amont[code]):
+                touches.add(code)
+        return [code for code, _, _ in self.etapes if code in touches]
+
+    def sommes(self, agregats: Iterable[Tuple[str, Tuple[str, ...], bool, float]]) -> List[float]:
+        """
+        Calcule en une passe toutes les sommes du plan (comptes de tiers exclus)
+
+        Args:
+            agregats: (indicateur, sous-indicateurs, est_tiers, montant)
+        """
+        sommes = [0] * len(self.positions)
+        cles_par_indicateur = self._cles_par_indicateur
+        for indicateur, sous_indicateurs, est_tiers, montant in agregats:
+            if est_tiers:
+                continue
+            cles = cles_par_indicateur.get(indicateur)
+            if not cles:
+                continue
+            total = cles.get(None)
+            if total is not None:
+                sommes[total] += montant
+            for sous_indicateur in sous_indicateurs:
+                position = cles.get(sous_indicateur)
+                if position is not None:
+                    sommes[position] += montant
+        return sommes
+
+    def somme(self, sommes: List[float], indicateur: str, sous_indicateur: Optional[str]) -> Optional[float]:
+        """
+        Lit une somme du plan, ou None si elle n'en fait pas partie
+        """
+        position = self.positions.get((indicateur, sous_indicateur))
+        return None if position is None else sommes[position]
+
+    def evaluer_noeud(self, indicateur: str, sommes: List[float], valeurs: Dict[str, float]) -> float:
+        """
+        Évalue un indicateur à partir des sommes et des valeurs des indicateurs amont
+        """
+        _, termes, total = self._par_indicateur[indicateur]
+        valeur = 0
+        tous_nuls = True
+        for signe, est_noeud, ref in termes:
+            montant = valeurs[ref] if est_noeud else sommes[ref]
+            if montant != 0:
+                tous_nuls = False
+            valeur += montant if signe == '+' else -abs(montant)
+        if tous_nuls and total is not None:
+            return sommes[total]
+        return valeur
+
+    def evaluer(self, sommes: List[float]) -> Dict[str, float]:
+        """
+        Évalue tous les indicateurs dans l'ordre des dépendances
+        """
+        valeurs = {}
+        for indicateur, _, _ in self.etapes:
+            valeurs[indicateur] = self.evaluer_noeud(indicateur, sommes, valeurs)
+        return valeurs
+
+    def composantes(self, indicateur: str, sommes: List[float], valeurs: Dict[str, float]) -> Tuple[List[str], List[str]]:
+        """
+        Composantes positives et négatives de la formule affichée d'un indicateur
+        (un terme n'apparaît que si son montant est non nul)
+        """
+        par_signe = self.formules[indicateur].get('composantes_par_signe')
+        _, termes, _ = self._par_indicateur[indicateur]
+        composantes_positives = []
+        composantes_negatives = []
+        for (signe, est_noeud, ref), (_, nom) in zip(termes, self.formules[indicateur]['termes']):
+            montant = valeurs[ref] if est_noeud else sommes[ref]
+            if est_noeud or not par_signe:
+                # Indicateur amont, ou terme classé selon son signe : retenu si montant > 0
+                if montant > 0:
+                    (composantes_positives if signe == '+' else composantes_negatives).append(nom)
+            elif montant > 0:
+                composantes_positives.append(nom)
+            elif montant < 0:
+                composantes_negatives.append(nom)
+        return composantes_positives, composantes_negatives
+
+
+PLAN_SIG = PlanSIG(FORMULES_SIG)
@@ -4,8 +4,73 @@ Modèle SIG (Système d'Information de Gestion) pour les calculs financiers
 Contient les formules et logiques de calcul des indicateurs financiers
 """
 
-from typing import Dict, List, Any, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Tuple
 from models.PlanComptable import MappingIndicateurSIG
+from models.SIG_formules import PLAN_SIG
+
+# Indicateurs pouvant apparaître comme composante d'un autre indicateur
+INDICATEURS_CALCULES = ('MC', 'VA', 'EBE', 'RE')
+
+
+@dataclass
+class SIGResult:
+    """
+    Résultat de l'évaluation d'un indicateur : valeur et composantes, calculées une seule fois.
+    Les formules texte et numérique sont construites à la demande à partir de ces données.
+    """
+    indicateur: str
+    valeur: float
+    composantes_positives: List[str] = field(default_factory=list)
+    composantes_negatives: List[str] = field(default_factory=list)
+    montants: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def est_nul(self) -> bool:
+        """
+        Valeur nulle à l'arrondi au centime (indicateur non affiché)
+        """
+        return abs(self.valeur) < 0.005
+
+    def _parties(self) -> Tuple[List[Tuple[str, float]], List[Tuple[str, float]]]:
+        """
+        Composantes retenues dans la formule (montant strictement positif), avec leur montant
+        """
+        plus = [(c, self.montants[c]) for c in self.composantes_positives if self.montants[c] > 0]
+        moins = [(c, self.montants[c]) for c in self.composantes_negatives if self.montants[c] > 0]
+        return plus, moins
+
+    def _formater(self, partie_plus: List[str], partie_moins: List[str], parentheses: bool) -> str:
+        indicateur, valeur = self.indicateur, self.valeur
+        if partie_plus and partie_moins:
+            if parentheses:
+                return f"{indicateur} = ({' + '.join(partie_plus)}) - ({' + '.join(partie_moins)}) = {valeur:.2f}"
+            return f"{indicateur} = {' + '.join(partie_plus)} - {' + '.join(partie_moins)} = {valeur:.2f}"
+        elif partie_plus:
+            return f"{indicateur} = {' + '.join(partie_plus)} = {valeur:.2f}"
+        elif partie_moins:
+            return f"{indicateur} = -({' + '.join(partie_moins)}) = {valeur:.2f}"
+        return f"{indicateur} = {valeur:.2f}"
+
+    @property
+    def formule_text(self) -> str:
+        plus, moins = self._parties()
+        return self._formater([f"{c} ({m:.2f})" for c, m in plus], [f"{c} ({m:.2f})" for c, m in moins], parentheses=False)
+
+    @property
+    def formule_numeric(self) -> str:
+        plus, moins = self._parties()
+        return self._formater([f"{m:.2f}" for _, m in plus], [f"{m:.2f}" for _, m in moins], parentheses=True)
+
+    def sous_indicateurs(self) -> List[Tuple[str, float]]:
+        """
+        Sous-indicateurs de la formule (hors indicateurs calculés) dont le montant est non nul
+        """
+        return [
+            (c, self.montants[c])
+            for c in self.composantes_positives + self.composantes_negatives
+            if c not in INDICATEURS_CALCULES and self.montants[c] != 0
+        ]
 
 
 class SIGCalculator:
@@ -13,15 +78,88 @@ class SIGCalculator:
     Calculateur SIG pour les indicateurs financiers
     """
     
-    def __init__(self, lignes: List[Dict[str, Any]]):
+    def __init__(self, lignes: List[Dict[str, Any]], pre_agreger: bool = True):
         """
         Initialise le calculateur avec les lignes comptables
         
         Args:
             lignes: Liste des lignes comptables avec indicateurs et sous-indicateurs
+            pre_agreger: Si True, agrège les lignes une seule fois en table
+                (indicateur, sous-indicateurs, tiers) -> somme ; sinon chaque calcul
+                reparcourt les lignes
         """
         self.lignes = lignes
         self._cache_montants = {}
+        self._valeurs = {}
+        self._resultats = {}
+        self._sommes = None
+        self._agregats = None
+        if pre_agreger:
+            self._agregats = self._indexer_agregats(SIGCalculator.agreger_lignes(lignes))
+    
+    @classmethod
+    def depuis_agregats(cls, agregats: Dict[Tuple[str, Tuple[str, ...], bool], float]) -> 'SIGCalculator':
+        """
+        Construit un calculateur directement à partir d'une table pré-agrégée
+        
+        Args:
+            agregats: Table (indicateur, sous-indicateurs, est_tiers) -> montant,
+                au format retourné par agreger_lignes
+            
+        Returns:
+            Calculateur dont tous les montants sont lus dans la table
+        """
+        calculator = cls([], pre_agreger=False)
+        calculator._agregats = cls._indexer_agregats(agregats)
+        return calculator
+    
+    @classmethod
+    def depuis_batch(cls, batch, annee: Optional[int] = None, trimestre: Optional[int] = None, mois: Optional[int] = None) -> 'SIGCalculator':
+        """
+        Construit un calculateur à partir d'un LedgerBatch (agrégé directement sur ses colonnes)
+        """
+        return cls.depuis_agregats(batch.agregats(annee, trimestre, mois))
+    
+    @staticmethod
+    def est_compte_tiers(code_compte: Any) -> bool:
+        """
+        Indique si un compte appartient aux classes de tiers / financiers (4 et 5)
+        """
+        return str(code_compte)[:1] in ('4', '5')
+    
+    @staticmethod
+    def agreger_lignes(lignes: List[Dict[str, Any]]) -> Dict[Tuple[str, Tuple[str, ...], bool], float]:
+        """
+        Agrège les lignes en une seule passe
+        
+        Args:
+            lignes: Liste des lignes comptables enrichies
+            
+        Returns:
+            Table (indicateur, sous-indicateurs de la ligne, est_tiers) -> somme des montants
+        """
+        agregats = {}
+        for ligne in lignes:
+            indicateur = ligne.get('indicateur')
+            if not indicateur:
+                continue
+            cle = (
+                indicateur,
+                tuple(ligne.get('sous_indicateur') or ()),
+                SIGCalculator.est_compte_tiers(ligne.get('code_compte', ''))
+            )
+            agregats[cle] = agregats.get(cle, 0) + ligne['montant']
+        return agregats
+    
+    @staticmethod
+    def _indexer_agregats(agregats: Dict[Tuple[str, Tuple[str, ...], bool], float]) -> Dict[str, List[Tuple[Tuple[str, ...], bool, float]]]:
+        """
+        Regroupe la table d'agrégats par indicateur pour limiter les recherches
+        """
+        par_indicateur = {}
+        for (indicateur, sous_indicateurs, est_tiers), montant in agregats.items():
+            par_indicateur.setdefault(indicateur, []).append((sous_indicateurs, est_tiers, montant))
+        return par_indicateur
     
     def _get_montant_par_indicateur_sous_ind(self, indicateur: str, sous_indicateurs_list: List[str], exclure_tiers: bool = True) -> float:
         """
@@ -35,11 +173,25 @@ class SIGCalculator:
         Returns:
             Montant total calculé
         """
+        if exclure_tiers and len(sous_indicateurs_list) == 1:
+            montant = PLAN_SIG.somme(self._sommes_plan(), indicateur, sous_indicateurs_list[0])
+            if montant is not None:
+                return montant
+        
         cache_key = f"{indicateur}_{'_'.join(sous_indicateurs_list)}_{exclure_tiers}"
         if cache_key in self._cache_montants:
             return self._cache_montants[cache_key]
         
         total = 0
+        if self._agregats is not None:
+            for sous_indicateurs, est_tiers, montant in self._agregats.get(indicateur, ()):
+                if exclure_tiers and est_tiers:
+                    continue
+                if any(si in sous_indicateurs for si in sous_indicateurs_list):
+                    total += montant
+            self._cache_montants[cache_key] = total
+            return total
+        
         for ligne in self.lignes:
             if ligne.get('indicateur') == indicateur:
                 # Exclure les comptes de tiers (classes 4 et 5) sauf si explicitement demandé
@@ -64,11 +216,23 @@ class SIGCalculator:
         Returns:
             Montant total calculé
         """
+        if exclure_tiers:
+            montant = PLAN_SIG.somme(self._sommes_plan(), indicateur, None)
+            if montant is not None:
+                return montant
+        
         cache_key = f"{indicateur}_all_{exclure_tiers}"
         if cache_key in self._cache_montants:
             return self._cache_montants[cache_key]
         
         total = 0
+        if self._agregats is not None:
+            for _, est_tiers, montant in self._agregats.get(indicateur, ()):
+                if not (exclure_tiers and est_tiers):
+                    total += montant
+            self._cache_montants[cache_key] = total
+            return total
+        
         for ligne in self.lignes:
             if ligne.get('indicateur') == indicateur:
                 code_compte = str(ligne.get('code_compte', ''))
@@ -79,6 +243,37 @@ class SIGCalculator:
         self._cache_montants[cache_key] = total
         return total
     
+    def _sommes_plan(self) -> List[float]:
+        """
+        Sommes du plan SIG (toutes les formules), calculées en une seule passe sur les agrégats
+        """
+        if self._sommes is None:
+            if self._agregats is not None:
+                agregats = (
+                    (indicateur, sous_indicateurs, est_tiers, montant)
+                    for indicateur, valeurs in self._agregats.items()
+                    for sous_indicateurs, est_tiers, montant in valeurs
+                )
+            else:
+                agregats = (
+                    (l.get('indicateur'), tuple(l.get('sous_indicateur') or ()),
+                     SIGCalculator.est_compte_tiers(l.get('code_compte', '')), l['montant'])
+                    for l in self.lignes if l.get('indicateur')
+                )
+            self._sommes = PLAN_SIG.sommes(agregats)
+        return self._sommes
+    
+    def _evaluer_formule(self, indicateur: str, valeurs_amont: Optional[Dict[str, Optional[float]]] = None) -> float:
+        """
+        Évalue la formule d'un indicateur ; les valeurs amont non fournies (None)
+        sont lues dans le graphe mémorisé
+        """
+        valeurs = {}
+        for amont in PLAN_SIG.amont[indicateur]:
+            valeur = (valeurs_amont or {}).get(amont)
+            valeurs[amont] = self.valeur_indicateur(amont) if valeur is None else valeur
+        return PLAN_SIG.evaluer_noeud(indicateur, self._sommes_plan(), valeurs)
+    
     def calculer_marge_commerciale(self) -> float:
         """
         Calcule la Marge Commerciale (MC)
@@ -87,156 +282,59 @@ class SIGCalculator:
         Returns:
             Valeur de la marge commerciale
         """
-        # Composantes positives (ventes)
-        ventes_marchandises = self._get_montant_par_indicateur_sous_ind(
-            'MC', 
-            ['VENTES DE MARCHANDISES', 'VENTES DE PRODUITS FINIS', 'VENTES DE SERVICES', 
-             'PRESTATIONS DE SERVICES', 'TVA COLLECTEE']
-        )
-        
-        # Composantes négatives (achats)
-        cout_achat_marchandises = self._get_montant_par_indicateur_sous_ind(
-            'MC', 
-            ['ACHATS DE MARCHANDISES']
-        )
-        
-        # Si pas de sous-indicateurs spécifiques, prendre tout MC (hors tiers)
-        if ventes_marchandises == 0 and cout_achat_marchandises == 0:
-            mc_total = self._get_montant_par_indicateur('MC')
-            return mc_total if mc_total != 0 else 0
-        
-        return ventes_marchandises - abs(cout_achat_marchandises)
+        return self._evaluer_formule('MC')
     
-    def calculer_valeur_ajoutee(self, mc_value: float = 0) -> float:
+    def calculer_valeur_ajoutee(self, mc_value: Optional[float] = None) -> float:
         """
         Calcule la Valeur Ajoutée (VA)
         VA = Production de l'exercice + Marge commerciale - Consommations de l'exercice
         
         Args:
-            mc_value: Valeur de la marge commerciale (si déjà calculée)
+            mc_value: Valeur de la marge commerciale (None : valeur mémorisée du graphe)
             
         Returns:
             Valeur de la valeur ajoutée
         """
-        # Production de l'exercice = Prestations + Ventes produits + Production stockée + Production immobilisée
-        prestations_services = self._get_montant_par_indicateur_sous_ind('VA', ['PRESTATIONS DE SERVICES'])
-        ventes_produits = self._get_montant_par_indicateur_sous_ind('VA', ['VENTES DE PRODUITS FINIS'])
-        production_stockee = self._get_montant_par_indicateur_sous_ind('VA', ['PRODUCTION STOCKÉE'])
-        production_immobilisee = self._get_montant_par_indicateur_sous_ind('VA', ['PRODUCTION IMMOBILISÉE'])
-        
-        production_exercice = prestations_services + ventes_produits + production_stockee + production_immobilisee
-        
-        # Marge commerciale (si pas fournie, la calculer)
-        if mc_value == 0:
-            mc_value = self.calculer_marge_commerciale()
-        
-        # Consommations de l'exercice = Achats stockés + Achats non stockés + Fournitures + Services extérieurs
-        achats_stockes = self._get_montant_par_indicateur_sous_ind('VA', ['ACHATS STOCKES'])
-        achats_non_stockes = self._get_montant_par_indicateur_sous_ind('VA', ['ACHATS NON STOCKES'])
-        fournitures = self._get_montant_par_indicateur_sous_ind('VA', ['FOURNITURES'])
-        services_exterieurs = self._get_montant_par_indicateur_sous_ind('VA', ['SERVICES EXTÉRIEURS'])
-        autres_services_exterieurs = self._get_montant_par_indicateur_sous_ind('VA', ['AUTRES SERVICES EXTÉRIEURS'])
-        
-        consommations_exercice = abs(achats_stockes) + abs(achats_non_stockes) + abs(fournitures) + abs(services_exterieurs) + abs(autres_services_exterieurs)
-        
-        va_calculee = production_exercice + mc_value - consommations_exercice
-        
-        # Si aucune donnée calculée, essayer de récupérer la VA directe
-        if va_calculee == 0 and production_exercice == 0 and consommations_exercice == 0:
-            va_direct = self._get_montant_par_indicateur('VA')
-            return va_direct if va_direct != 0 else 0
-        
-        return va_calculee
+        return self._evaluer_formule('VA', {'MC': mc_value})
     
-    def calculer_excedent_brut_exploitation(self, va_value: float = 0) -> float:
+    def calculer_excedent_brut_exploitation(self, va_value: Optional[float] = None) -> float:
         """
         Calcule l'Excédent Brut d'Exploitation (EBE)
         EBE = VA + Subventions d'exploitation - Impôts et taxes - Charges de personnel
         
         Args:
-            va_value: Valeur de la valeur ajoutée (si déjà calculée)
+            va_value: Valeur de la valeur ajoutée (None : valeur mémorisée du graphe)
             
         Returns:
             Valeur de l'excédent brut d'exploitation
         """
-        # Valeur ajoutée (si pas fournie, la calculer)
-        if va_value == 0:
-            va_value = self.calculer_valeur_ajoutee()
-        
-        # Subventions d'exploitation
-        subventions_exploitation = self._get_montant_par_indicateur_sous_ind('EBE', ['SUBVENTIONS D\'EXPLOITATION'])
-        
-        # Impôts et taxes
-        impots_taxes = self._get_montant_par_indicateur_sous_ind('EBE', ['IMPÔTS ET TAXES'])
-        
-        # Charges de personnel
-        charges_personnel = self._get_montant_par_indicateur_sous_ind('EBE', ['CHARGES DE PERSONNEL'])
-        
-        if va_value != 0 or subventions_exploitation != 0 or impots_taxes != 0 or charges_personnel != 0:
-            return va_value + subventions_exploitation - abs(impots_taxes) - abs(charges_personnel)
-        
-        return 0
+        return self._evaluer_formule('EBE', {'VA': va_value})
     
-    def calculer_resultat_exploitation(self, ebe_value: float = 0) -> float:
+    def calculer_resultat_exploitation(self, ebe_value: Optional[float] = None) -> float:
         """
         Calcule le Résultat d'Exploitation (RE)
         RE = EBE + Autres produits - Autres charges
         
         Args:
-            ebe_value: Valeur de l'EBE (si déjà calculée)
+            ebe_value: Valeur de l'EBE (None : valeur mémorisée du graphe)
             
         Returns:
             Valeur du résultat d'exploitation
         """
-        # EBE (si pas fourni, le calculer)
-        if ebe_value == 0:
-            ebe_value = self.calculer_excedent_brut_exploitation()
-        
-        # Autres produits
-        autres_produits = self._get_montant_par_indicateur_sous_ind('RE', ['AUTRES PRODUITS DE GESTION COURANTE'])
-        reprises_amortissements = self._get_montant_par_indicateur_sous_ind('RE', ['REPRISES AMORTISSEMENTS'])
-        
-        # Autres charges
-        autres_charges = self._get_montant_par_indicateur_sous_ind('RE', ['AUTRES CHARGES DE GESTION COURANTE'])
-        dotations_amortissements = self._get_montant_par_indicateur_sous_ind('RE', ['DOTATIONS AMORTISSEMENTS'])
-        
-        if ebe_value != 0 or autres_produits != 0 or reprises_amortissements != 0 or autres_charges != 0 or dotations_amortissements != 0:
-            return ebe_value + autres_produits + reprises_amortissements - abs(autres_charges) - abs(dotations_amortissements)
-        
-        return 0
+        return self._evaluer_formule('RE', {'EBE': ebe_value})
     
-    def calculer_resultat_net(self, re_value: float = 0) -> float:
+    def calculer_resultat_net(self, re_value: Optional[float] = None) -> float:
         """
         Calcule le Résultat Net (R)
         R = RE + Résultat financier + Résultat exceptionnel - Impôts sur les bénéfices
         
         Args:
-            re_value: Valeur du RE (si déjà calculée)
+            re_value: Valeur du RE (None : valeur mémorisée du graphe)
             
         Returns:
             Valeur du résultat net
         """
-        # RE (si pas fourni, le calculer)
-        if re_value == 0:
-            re_value = self.calculer_resultat_exploitation()
-        
-        # Résultat financier
-        produits_financiers = self._get_montant_par_indicateur_sous_ind('R', ['PRODUITS FINANCIERS'])
-        charges_financieres = self._get_montant_par_indicateur_sous_ind('R', ['CHARGES FINANCIÈRES'])
-        resultat_financier = produits_financiers - abs(charges_financieres)
-        
-        # Résultat exceptionnel
-        produits_exceptionnels = self._get_montant_par_indicateur_sous_ind('R', ['PRODUITS EXCEPTIONNELS'])
-        charges_exceptionnelles = self._get_montant_par_indicateur_sous_ind('R', ['CHARGES EXCEPTIONNELLES'])
-        resultat_exceptionnel = produits_exceptionnels - abs(charges_exceptionnelles)
-        
-        # Impôts sur les bénéfices
-        impots_benefices = self._get_montant_par_indicateur_sous_ind('R', ['IMPÔTS SUR LES BÉNÉFICES'])
-        
-        if (re_value != 0 or resultat_financier != 0 or resultat_exceptionnel != 0 or impots_benefices != 0):
-            return re_value + resultat_financier + resultat_exceptionnel - abs(impots_benefices)
-        
-        return 0
+        return self._evaluer_formule('R', {'RE': re_value})
     
     def calculer_tous_indicateurs(self) -> Dict[str, float]:
         """
@@ -248,27 +346,27 @@ class SIGCalculator:
         result = {}
         
         # 1. Marge Commerciale (MC)
-        mc_value = self.calculer_marge_commerciale()
+        mc_value = self.valeur_indicateur('MC')
         if mc_value != 0:
             result['MC'] = mc_value
         
         # 2. Valeur Ajoutée (VA)
-        va_value = self.calculer_valeur_ajoutee(mc_value)
+        va_value = self.valeur_indicateur('VA')
         if va_value != 0:
             result['VA'] = va_value
         
         # 3. Excédent Brut d'Exploitation (EBE)
-        ebe_value = self.calculer_excedent_brut_exploitation(va_value)
+        ebe_value = self.valeur_indicateur('EBE')
         if ebe_value != 0:
             result['EBE'] = ebe_value
         
         # 4. Résultat d'Exploitation (RE)
-        re_value = self.calculer_resultat_exploitation(ebe_value)
+        re_value = self.valeur_indicateur('RE')
         if re_value != 0:
             result['RE'] = re_value
         
         # 5. Résultat Net (R)
-        r_value = self.calculer_resultat_net(re_value)
+        r_value = self.valeur_indicateur('R')
         if r_value != 0:
             result['R'] = r_value
         
@@ -285,206 +383,121 @@ class SIGCalculator:
         Returns:
             Tuple (composantes_positives, composantes_negatives)
         """
-        if indicateur == 'MC':
-            # MC = Ventes de marchandises - Coût d'achat des marchandises vendues
-            composantes_positives = []
-            composantes_negatives = []
-            
-            # Composantes positives (ventes) - inclure si montant > 0
-            ventes_composantes = ['VENTES DE MARCHANDISES', 'VENTES DE PRODUITS FINIS', 'VENTES DE SERVICES', 'PRESTATIONS DE SERVICES', 'TVA COLLECTEE']
-            for comp in ventes_composantes:
-                montant = self._get_montant_par_indicateur_sous_ind('MC', [comp])
-                if montant > 0:
-                    composantes_positives.append(comp)
-            
-            # Composantes négatives (achats) - inclure si montant > 0 (car ce sont des charges)
-            achats_composantes = ['ACHATS DE MARCHANDISES']
-            for comp in achats_composantes:
-                montant = self._get_montant_par_indicateur_sous_ind('MC', [comp])
-                if montant > 0:  # Les achats sont des charges, donc on les inclut si > 0
-                    composantes_negatives.append(comp)
-            
-            return composantes_positives, composantes_negatives
-            
-        elif indicateur == 'VA':
-            # VA = Production de l'exercice + Marge commerciale - Consommations de l'exercice
-            composantes_positives = []
-            composantes_negatives = []
-            
-            # Composantes de production (positives) - inclure si montant > 0
-            production_composantes = ['PRESTATIONS DE SERVICES', 'VENTES DE PRODUITS FINIS', 'PRODUCTION STOCKÉE', 'PRODUCTION IMMOBILISÉE']
-            for comp in production_composantes:
-                montant = self._get_montant_par_indicateur_sous_ind('VA', [comp])
-                if montant > 0:
-                    composantes_positives.append(comp)
-            
-            # Ajouter MC comme composante positive (selon la formule officielle)
-            mc_value = self.calculer_marge_commerciale()
-            if mc_value > 0:
-                composantes_positives.append('MC')
-            
-            # Composantes de consommation (négatives) - inclure si montant > 0 (car ce sont des charges)
-            consommation_composantes = ['ACHATS STOCKES', 'ACHATS NON STOCKES', 'FOURNITURES', 'SERVICES EXTÉRIEURS', 'AUTRES SERVICES EXTÉRIEURS']
-            for comp in consommation_composantes:
-                montant = self._get_montant_par_indicateur_sous_ind('VA', [comp])
-                if montant > 0:  # Les consommations sont des charges, donc on les inclut si > 0
-                    composantes_negatives.append(comp)
-            
-            return composantes_positives, composantes_negatives
-            
-        elif indicateur == 'EBE':
-            # EBE = VA + Subventions d'exploitation - Impôts et taxes - Charges de personnel
-            composantes_positives = []
-            composantes_negatives = []
-            
-            # Ajouter VA comme composante positive (selon la formule officielle)
-            va_value = self.calculer_valeur_ajoutee()
-            if va_value > 0:
-                composantes_positives.append('VA')
-            
-            # Vérifier les autres composantes
-            ebe_composantes = ['SUBVENTIONS D\'EXPLOITATION', 'IMPÔTS ET TAXES', 'CHARGES DE PERSONNEL']
-            for comp in ebe_composantes:
-                montant = self._get_montant_par_indicateur_sous_ind('EBE', [comp])
-                if montant > 0:
-                    composantes_positives.append(comp)
-                elif montant < 0:
-                    composantes_negatives.append(comp)
-            
-            return composantes_positives, composantes_negatives
-            
-        elif indicateur == 'RE':
-            # RE = EBE + Autres produits - Autres charges
-            composantes_positives = []
-            composantes_negatives = []
-            
-            # Ajouter EBE comme composante positive (selon la formule officielle)
-            ebe_value = self.calculer_excedent_brut_exploitation()
-            if ebe_value > 0:
-                composantes_positives.append('EBE')
-            
-            # Vérifier les autres composantes
-            re_composantes = ['AUTRES PRODUITS DE GESTION COURANTE', 'REPRISES AMORTISSEMENTS', 'AUTRES CHARGES DE GESTION COURANTE', 'DOTATIONS AMORTISSEMENTS']
-            for comp in re_composantes:
-                montant = self._get_montant_par_indicateur_sous_ind('RE', [comp])
-                if montant > 0:
-                    composantes_positives.append(comp)
-                elif montant < 0:
-                    composantes_negatives.append(comp)
-            
-            return composantes_positives, composantes_negatives
-            
-        elif indicateur == 'R':
-            # R = RE + Résultat financier + Résultat exceptionnel - Impôts sur les bénéfices
-            composantes_positives = []
-            composantes_negatives = []
-            
-            # Ajouter RE comme composante positive (selon la formule officielle)
-            re_value = self.calculer_resultat_exploitation()
-            if re_value > 0:
-                composantes_positives.append('RE')
-            
-            # Vérifier les autres composantes
-            r_composantes = ['PRODUITS FINANCIERS', 'CHARGES FINANCIÈRES', 'PRODUITS EXCEPTIONNELS', 'CHARGES EXCEPTIONNELLES', 'IMPÔTS SUR LES BÉNÉFICES']
-            for comp in r_composantes:
-                montant = self._get_montant_par_indicateur_sous_ind('R', [comp])
-                if montant > 0:
-                    composantes_positives.append(comp)
-                elif montant < 0:
-                    composantes_negatives.append(comp)
-            
-            return composantes_positives, composantes_negatives
+        if indicateur in PLAN_SIG.formules:
+            # Formule déclarée (models/SIG_formules.py)
+            valeurs = {amont: self.valeur_indicateur(amont) for amont in PLAN_SIG.amont[indicateur]}
+            return PLAN_SIG.composantes(indicateur, self._sommes_plan(), valeurs)
         
-        else:
-            # Fallback pour les autres indicateurs
-            sous_indicateurs_possibles = MappingIndicateurSIG.get_sous_indicateurs_possibles().get(indicateur, [])
-            
-            composantes_positives = []
-            composantes_negatives = []
-            
-            # Vérifier quels sous-indicateurs ont réellement des montants dans les données
-            for sous_ind in sous_indicateurs_possibles:
-                montant = self._get_montant_par_indicateur_sous_ind(indicateur, [sous_ind])
-                if montant > 0:
-                    composantes_positives.append(sous_ind)
-                elif montant < 0:
-                    composantes_negatives.append(sous_ind)
-            
-            return composantes_positives, composantes_negatives
+        # Fallback pour les autres indicateurs
+        sous_indicateurs_possibles = MappingIndicateurSIG.get_sous_indicateurs_possibles().get(indicateur, [])
+        
+        composantes_positives = []
+        composantes_negatives = []
+        
+        # Vérifier quels sous-indicateurs ont réellement des montants dans les données
+        for sous_ind in sous_indicateurs_possibles:
+            montant = self._get_montant_par_indicateur_sous_ind(indicateur, [sous_ind])
+            if montant > 0:
+                composantes_positives.append(sous_ind)
+            elif montant < 0:
+                composantes_negatives.append(sous_ind)
+        
+        return composantes_positives, composantes_negatives
     
-    def construire_formule_text(self, indicateur: str, valeur: float = 0) -> str:
+    def valeur_indicateur(self, indicateur: str) -> float:
         """
-        Construit la formule textuelle d'un indicateur
+        Valeur d'un nœud du graphe MC -> VA -> EBE -> RE -> R, calculée une seule fois par calculateur
+        (y compris lorsqu'elle est nulle) jusqu'à son invalidation
         
         Args:
             indicateur: Code de l'indicateur
-            valeur: Valeur calculée de l'indicateur (ignorée, recalculée)
             
         Returns:
-            Formule textuelle formatée
+            Valeur calculée à partir de la valeur mémorisée de l'indicateur amont
         """
-        composantes_positives, composantes_negatives = self.get_composantes_formule(indicateur)
+        if indicateur in self._valeurs:
+            return self._valeurs[indicateur]
+        if indicateur in PLAN_SIG.formules:
+            valeur = self._evaluer_formule(indicateur)
+        else:
+            valeur = self._get_montant_par_indicateur(indicateur)
+        self._valeurs[indicateur] = valeur
+        return valeur
+    
+    def invalider(self, indicateur: Optional[str] = None):
+        """
+        Invalide un nœud du graphe et tous les nœuds qui en dépendent (valeurs et SIGResult)
         
-        partie_plus = []
-        partie_moins = []
-        somme_calculee = 0
+        Args:
+            indicateur: Code du nœud à invalider ; None invalide tout, y compris les sommes mémorisées
+        """
+        if indicateur is None:
+            self._valeurs.clear()
+            self._resultats.clear()
+            self._cache_montants.clear()
+            self._sommes = None
+            return
+        a_invalider = PLAN_SIG.dependants(indicateur) if indicateur in PLAN_SIG.formules else [indicateur]
+        for code in a_invalider:
+            self._valeurs.pop(code, None)
+            self._resultats.pop(code, None)
+    
+    def evaluate(self, indicateur: str) -> SIGResult:
+        """
+        Évalue un indicateur : composantes de la formule, montant de chacune et valeur finale
+        (somme des composantes retenues), calculés une seule fois par calculateur
         
-        # Construire la partie positive
-        for comp in composantes_positives:
-            if comp in ['MC', 'VA', 'EBE', 'RE']:
-                # Pour les composantes calculées, récupérer leur valeur calculée
-                if comp == 'MC':
-                    montant = self.calculer_marge_commerciale()
-                elif comp == 'VA':
-                    montant = self.calculer_valeur_ajoutee()
-                elif comp == 'EBE':
-                    montant = self.calculer_excedent_brut_exploitation()
-                elif comp == 'RE':
-                    montant = self.calculer_resultat_exploitation()
-                else:
-                    montant = 0
-            else:
-                # Pour les sous-indicateurs individuels
-                montant = self._get_montant_par_indicateur_sous_ind(indicateur, [comp])
+        Args:
+            indicateur: Code de l'indicateur
             
-            if montant > 0:
-                partie_plus.append(f"{comp} ({montant:.2f})")
-                somme_calculee += montant
+        Returns:
+            SIGResult de l'indicateur
+        """
+        resultat = self._resultats.get(indicateur)
+        if resultat is not None:
+            return resultat
         
-        # Construire la partie négative
-        for comp in composantes_negatives:
-            if comp in ['MC', 'VA', 'EBE', 'RE']:
-                # Pour les composantes calculées, récupérer leur valeur calculée
-                if comp == 'MC':
-                    montant = self.calculer_marge_commerciale()
-                elif comp == 'VA':
-                    montant = self.calculer_valeur_ajoutee()
-                elif comp == 'EBE':
-                    montant = self.calculer_excedent_brut_exploitation()
-                elif comp == 'RE':
-                    montant = self.calculer_resultat_exploitation()
-                else:
-                    montant = 0
+        composantes_positives, composantes_negatives = self.get_composantes_formule(indicateur)
+        montants = {}
+        for comp in composantes_positives + composantes_negatives:
+            if comp in INDICATEURS_CALCULES:
+                # Composante calculée : valeur mémorisée de l'indicateur
+                montants[comp] = self.valeur_indicateur(comp)
             else:
-                # Pour les sous-indicateurs individuels
-                montant = self._get_montant_par_indicateur_sous_ind(indicateur, [comp])
-            
-            # Les composantes négatives sont maintenant incluses si montant > 0 (car ce sont des charges)
-            if montant > 0:
-                partie_moins.append(f"{comp} ({montant:.2f})")
-                somme_calculee -= montant  # On soustrait car c'est une charge
+                # Sous-indicateur individuel
+                montants[comp] = self._get_montant_par_indicateur_sous_ind(indicateur, [comp])
         
-        # Construire la formule avec la somme calculée
-        if partie_plus and partie_moins:
-            formule = f"{indicateur} = {' + '.join(partie_plus)} - {' + '.join(partie_moins)} = {somme_calculee:.2f}"
-        elif partie_plus and not partie_moins:
-            formule = f"{indicateur} = {' + '.join(partie_plus)} = {somme_calculee:.2f}"
-        elif not partie_plus and partie_moins:
-            formule = f"{indicateur} = -({' + '.join(partie_moins)}) = {somme_calculee:.2f}"
-        else:
-            formule = f"{indicateur} = {somme_calculee:.2f}"
+        # Les composantes (positives comme négatives) ne sont retenues que si leur montant est > 0 ;
+        # les négatives sont des charges et sont soustraites
+        valeur = 0
+        for comp in composantes_positives:
+            if montants[comp] > 0:
+                valeur += montants[comp]
+        for comp in composantes_negatives:
+            if montants[comp] > 0:
+                valeur -= montants[comp]
+        
+        resultat = self._resultats[indicateur] = SIGResult(
+            indicateur=indicateur,
+            valeur=valeur,
+            composantes_positives=composantes_positives,
+            composantes_negatives=composantes_negatives,
+            montants=montants,
+        )
+        return resultat
+    
+    def construire_formule_text(self, indicateur: str, valeur: float = 0) -> str:
+        """
+        Construit la formule textuelle d'un indicateur
         
-        return formule
+        Args:
+            indicateur: Code de l'indicateur
+            valeur: Valeur calculée de l'indicateur (ignorée, recalculée)
+            
+        Returns:
+            Formule textuelle formatée
+        """
+        return self.evaluate(indicateur).formule_text
     
     def construire_formule_numeric(self, indicateur: str, valeur: float = 0) -> str:
         """
@@ -497,68 +510,7 @@ class SIGCalculator:
         Returns:
             Formule numérique formatée
         """
-        composantes_positives, composantes_negatives = self.get_composantes_formule(indicateur)
-        
-        partie_plus = []
-        partie_moins = []
-        somme_calculee = 0
-        
-        # Construire la partie positive
-        for comp in composantes_positives:
-            if comp in ['MC', 'VA', 'EBE', 'RE']:
-                # Pour les composantes calculées, récupérer leur valeur calculée
-                if comp == 'MC':
-                    montant = self.calculer_marge_commerciale()
-                elif comp == 'VA':
-                    montant = self.calculer_valeur_ajoutee()
-                elif comp == 'EBE':
-                    montant = self.calculer_excedent_brut_exploitation()
-                elif comp == 'RE':
-                    montant = self.calculer_resultat_exploitation()
-                else:
-                    montant = 0
-            else:
-                # Pour les sous-indicateurs individuels
-                montant = self._get_montant_par_indicateur_sous_ind(indicateur, [comp])
-            
-            if montant > 0:
-                partie_plus.append(f"{montant:.2f}")
-                somme_calculee += montant
-        
-        # Construire la partie négative
-        for comp in composantes_negatives:
-            if comp in ['MC', 'VA', 'EBE', 'RE']:
-                # Pour les composantes calculées, récupérer leur valeur calculée
-                if comp == 'MC':
-                    montant = self.calculer_marge_commerciale()
-                elif comp == 'VA':
-                    montant = self.calculer_valeur_ajoutee()
-                elif comp == 'EBE':
-                    montant = self.calculer_excedent_brut_exploitation()
-                elif comp == 'RE':
-                    montant = self.calculer_resultat_exploitation()
-                else:
-                    montant = 0
-            else:
-                # Pour les sous-indicateurs individuels
-                montant = self._get_montant_par_indicateur_sous_ind(indicateur, [comp])
-            
-            # Les composantes négatives sont maintenant incluses si montant > 0 (car ce sont des charges)
-            if montant > 0:
-                partie_moins.append(f"{montant:.2f}")
-                somme_calculee -= montant  # On soustrait car c'est une charge
-        
-        # Construire la formule avec la somme calculée
-        if partie_plus and partie_moins:
-            formule = f"{indicateur} = ({' + '.join(partie_plus)}) - ({' + '.join(partie_moins)}) = {somme_calculee:.2f}"
-        elif partie_plus and not partie_moins:
-            formule = f"{indicateur} = {' + '.join(partie_plus)} = {somme_calculee:.2f}"
-        elif not partie_plus and partie_moins:
-            formule = f"{indicateur} = -({' + '.join(partie_moins)}) = {somme_calculee:.2f}"
-        else:
-            formule = f"{indicateur} = {somme_calculee:.2f}"
-        
-        return formule
+        return self.evaluate(indicateur).formule_numeric
     
     def calculer_valeur_par_formule(self, indicateur: str) -> float:
         """
@@ -570,54 +522,7 @@ class SIGCalculator:
         Returns:
             Valeur calculée basée sur la somme des composantes de la formule
         """
-        composantes_positives, composantes_negatives = self.get_composantes_formule(indicateur)
-        
-        somme_calculee = 0
-        
-        # Calculer la somme des composantes positives
-        for comp in composantes_positives:
-            if comp in ['MC', 'VA', 'EBE', 'RE']:
-                # Pour les composantes calculées, récupérer leur valeur calculée
-                if comp == 'MC':
-                    montant = self.calculer_marge_commerciale()
-                elif comp == 'VA':
-                    montant = self.calculer_valeur_ajoutee()
-                elif comp == 'EBE':
-                    montant = self.calculer_excedent_brut_exploitation()
-                elif comp == 'RE':
-                    montant = self.calculer_resultat_exploitation()
-                else:
-                    montant = 0
-            else:
-                # Pour les sous-indicateurs individuels
-                montant = self._get_montant_par_indicateur_sous_ind(indicateur, [comp])
-            
-            if montant > 0:
-                somme_calculee += montant
-        
-        # Calculer la somme des composantes négatives
-        for comp in composantes_negatives:
-            if comp in ['MC', 'VA', 'EBE', 'RE']:
-                # Pour les composantes calculées, récupérer leur valeur calculée
-                if comp == 'MC':
-                    montant = self.calculer_marge_commerciale()
-                elif comp == 'VA':
-                    montant = self.calculer_valeur_ajoutee()
-                elif comp == 'EBE':
-                    montant = self.calculer_excedent_brut_exploitation()
-                elif comp == 'RE':
-                    montant = self.calculer_resultat_exploitation()
-                else:
-                    montant = 0
-            else:
-                # Pour les sous-indicateurs individuels
-                montant = self._get_montant_par_indicateur_sous_ind(indicateur, [comp])
-            
-            # Les composantes négatives sont maintenant incluses si montant > 0 (car ce sont des charges)
-            if montant > 0:
-                somme_calculee -= montant  # On soustrait car c'est une charge
-        
-        return somme_calculee
+        return self.evaluate(indicateur).valeur
     
     def get_sous_indicateurs_avec_montants(self, indicateur: str) -> List[Dict[str, Any]]:
         """
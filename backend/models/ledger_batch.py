@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Représentation compacte des lignes comptables enrichies
+Les lignes sont stockées en colonnes (module array) au lieu d'un dict par ligne :
+les codes de compte et libellés sont internés ; classes, indicateur et sous-indicateurs
+ne sont pas stockés par ligne mais lus dans la table de dimension des comptes,
+jointe par l'indice du code.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from models.PlanComptable import TableComptes
+
+
+class LedgerBatch:
+    """
+    Lot de lignes comptables en colonnes (struct-of-arrays)
+    """
+
+    def __init__(self, lignes: Optional[Iterable[Dict[str, Any]]] = None):
+        self.ids = array('q')
+        self.annees = array('h')
+        self.mois = array('b')
+        self.dates = array('i')
+        self.comptes = array('i')
+        self.libelles = array('i')
+        self.documents = array('i')
+        self.utilisateurs = array('i')
+        self.debits = array('d')
+        self.credits = array('d')
+        self.montants = array('d')
+
+        # Tables d'internement (index -> valeur) et index inverses
+        self.codes = []
+        self._index_codes = {}
+        self.textes = []
+        self._index_textes = {}
+        # Indice de code -> DimensionCompte (classes, indicateur, sous-indicateurs)
+        self.dimensions = []
+
+        if lignes:
+            self.etendre(lignes)
+
+    @staticmethod
+    def _interner(valeur, table: List, index: Dict) -> int:
+        position = index.get(valeur)
+        if position is None:
+            position = index[valeur] = len(table)
+            table.append(valeur)
+        return position
+
+    @staticmethod
+    def _extraire_mois(date_ecriture) -> int:
+        """
+        Extrait le mois d'une date "2021-01-31T00:00:00" ou "2021-01-31" (0 si absente)
+        """
+        try:
+            return int(str(date_ecriture or '')[5:7])
+        except ValueError:
+            return 0
+
+    def _texte(self, valeur) -> int:
+        return self._interner(valeur, self.textes, self._index_textes)
+
+    def ajouter(self, ligne: Dict[str, Any]):
+        """
+        Ajoute une ligne (montant et annee déjà calculés ; indicateur et classes sont lus dans la table des comptes)
+        """
+        date_ecriture = ligne.get('date_ecriture') or ligne.get('date')
+        self.ids.append(ligne.get('id') or 0)
+        self.annees.append(ligne.get('annee') or 0)
+        self.mois.append(self._extraire_mois(date_ecriture))
+        self.dates.append(self._texte(date_ecriture))
+        self.comptes.append(self._indice_compte(ligne.get('code_compte')))
+        self.libelles.append(self._texte(ligne.get('libelle_compte') or ligne.get('description') or ''))
+        self.documents.append(self._texte(ligne.get('document')))
+        self.utilisateurs.append(self._texte(ligne.get('utilisateur')))
+        self.debits.append(ligne.get('debit', 0) or 0)
+        self.credits.append(ligne.get('credit', 0) or 0)
+        self.montants.append(ligne.get('montant', 0) or 0)
+
+    def _indice_compte(self, code_compte) -> int:
+        code = str(code_compte or '')
+        position = self._index_codes.get(code)
+        if position is None:
+            position = self._index_codes[code] = len(self.codes)
+            self.codes.append(code)
+            self.dimensions.append(TableComptes.dimension(code))
+        return position
+
+    def etendre(self, lignes: Iterable[Dict[str, Any]]):
+        for ligne in lignes:
+            self.ajouter(ligne)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nb_octets(self) -> int:
+        """
+        Taille approximative des colonnes (hors tables d'internement)
+        """
+        colonnes = (self.ids, self.annees, self.mois, self.dates, self.comptes, self.libelles, self.documents,
+                    self.utilisateurs, self.debits, self.credits, self.montants)
+        return sum(c.itemsize * len(c) for c in colonnes)
+
+    def ligne(self, i: int) -> Dict[str, Any]:
+        """
+        Reconstruit la ligne i au format dict utilisé par les routes (objet temporaire)
+        """
+        compte = self.dimensions[self.comptes[i]]
+        libelle = self.textes[self.libelles[i]]
+        return {
+            'id': self.ids[i],
+            'date_ecriture': self.textes[self.dates[i]],
+            'code_compte': compte.code_compte,
+            'description': libelle,
+            'libelle_compte': libelle,
+            'document': self.textes[self.documents[i]],
+            'utilisateur': self.textes[self.utilisateurs[i]],
+            'classe': compte.classe,
+            'sous_classe': compte.sous_classe,
+            'sss_classe': compte.sss_classe,
+            'indicateur': compte.indicateur,
+            'sous_indicateur': list(compte.sous_indicateurs),
+            'debit': self.debits[i],
+            'credit': self.credits[i],
+            'montant': self.montants[i],
+            'annee': self.annees[i] or None,
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self.ids)):
+            yield self.ligne(i)
+
+    def indices(self, annee: Optional[int] = None, trimestre: Optional[int] = None, mois: Optional[int] = None) -> Iterator[int]:
+        """
+        Indices des lignes d'une période, filtrées directement sur les colonnes
+        """
+        annees, colonne_mois = self.annees, self.mois
+        for i in range(len(annees)):
+            if annee is not None and annees[i] != annee:
+                continue
+            if mois is not None and colonne_mois[i] != mois:
+                continue
+            if trimestre is not None and (colonne_mois[i] - 1) // 3 + 1 != trimestre:
+                continue
+            yield i
+
+    def lignes(self, annee: Optional[int] = None, trimestre: Optional[int] = None, mois: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lignes (dicts temporaires) d'une période
+        """
+        for i in self.indices(annee, trimestre, mois):
+            yield self.ligne(i)
+
+    def annees_disponibles(self) -> List[int]:
+        """
+        Années présentes, de la plus récente à la plus ancienne
+        """
+        return sorted({a for a in self.annees if a}, reverse=True)
+
+    def agregats(self, annee: Optional[int] = None, trimestre: Optional[int] = None, mois: Optional[int] = None) -> Dict[Tuple[str, Tuple[str, ...], bool], float]:
+        """
+        Table (indicateur, sous-indicateurs, est_tiers) -> montant au format de SIGCalculator.depuis_agregats,
+        calculée sur les colonnes sans reconstruire de lignes
+        """
+        agregats = {}
+        # Clé d'agrégat de chaque code (None pour un compte sans indicateur), puis lecture par indice
+        cles = [(c.indicateur, c.sous_indicateurs, c.classe in ('4', '5')) if c.indicateur else None for c in self.dimensions]
+        comptes, montants = self.comptes, self.montants
+        for i in self.indices(annee, trimestre, mois):
+            cle = cles[comptes[i]]
+            if cle is None:
+                continue
+            agregats[cle] = agregats.get(cle, 0) + montants[i]
+        return agregats
@@ -3,11 +3,17 @@ from fastapi import APIRouter
 from controllers.navision_sig_controller import NavisionSIGController
 from models.PlanComptable import MappingIndicateurSIG
 from models.SIG_model import SIGCalculator
+from models.SIG_cube import SIGCube
+from services.navision import http_session
+from services.navision.ligne_store import ligne_store
+from services.navision import ledger_snapshot
+from services.result_cache import CachedRoute, result_cache
 import datetime
 from fastapi import Query
 from typing import Optional
 
-navision_router = APIRouter()
+# Les réponses SIG passent par le cache (TTL + LRU, ETag) : voir services/result_cache.py
+navision_router = APIRouter(route_class=CachedRoute)
 
 SOCIETE_VUE_MAP = {
     "rsp-bgs": "bgs_view_entry",
@@ -24,7 +30,7 @@ def calcul_sig_adapte(lignes):
     return calculator.calculer_tous_indicateurs()
 
 @navision_router.get("/{societe}/comptes/global", tags=["Navision"])
-def get_comptes_global(
+async def get_comptes_global(
     societe: str,
     sous_indicateur: str,
     periode: str = Query(..., description="annee ou trimestre"),
@@ -38,10 +44,10 @@ def get_comptes_global(
     navision_sig = NavisionSIGController(vue)
     comptes_result = {}
     if periode == "annee":
-        lignes = navision_sig.get_lines("annee")
-        annees = sorted({l.get('annee') for l in lignes if l.get('annee')}, reverse=True)[:3]
+        lignes = await navision_sig.get_lines_async("annee")
+        annees = navision_sig.annees_disponibles(lignes)[:3]
         for a in annees:
-            lignes_annee = [l for l in lignes if l.get('annee') == a]
+            lignes_annee = navision_sig.filtrer_periode(lignes, a)
             comptes_dict = {}
             for l in lignes_annee:
                 if any(sous_indicateur.strip().lower() == si.strip().lower() for si in l.get("sous_indicateur", [])) and l.get("annee") == a:
@@ -69,10 +75,11 @@ def get_comptes_global(
             return {"error": "Il faut fournir trimestre (1, 2, 3 ou 4) pour la période trimestre."}
         if trimestre_int not in [1, 2, 3, 4]:
             return {"error": "Il faut fournir trimestre (1, 2, 3 ou 4) pour la période trimestre."}
-        lignes = navision_sig.get_lines("annee")
-        annees = sorted({l.get('annee') for l in lignes if l.get('annee')}, reverse=True)[:3]
+        # Une seule requête : le trimestre de chaque année est découpé dans les lignes annuelles
+        lignes = await navision_sig.get_lines_async("annee")
+        annees = navision_sig.annees_disponibles(lignes)[:3]
         for a in annees:
-            lignes_trim = navision_sig.get_lines("trimestre", annee=a, trimestre=trimestre_int)
+            lignes_trim = navision_sig.filtrer_periode(lignes, a, trimestre=trimestre_int)
             comptes_dict = {}
             for l in lignes_trim:
                 if any(sous_indicateur.strip().lower() == si.strip().lower() for si in l.get("sous_indicateur", [])) and l.get("annee") == a:
@@ -98,35 +105,19 @@ def get_comptes_global(
 
 # 3. Sous indicateurs mensuels
 @navision_router.get("/{societe}/sous_indicateurs/mensuel", tags=["Navision"])
-def get_sous_indicateurs_mensuel(societe: str, annee: int):
+async def get_sous_indicateurs_mensuel(societe: str, annee: int):
     vue = SOCIETE_VUE_MAP.get(societe)
     if not vue:
         return {"error": "Société inconnue"}
     navision_sig = NavisionSIGController(vue)
     
-    lignes = navision_sig.get_lines("annee")
     result = {}
     
-    for mois in range(1, 13):
-        # Filtrer les lignes par année et mois en utilisant date_ecriture
-        lignes_mois = []
-        for l in lignes:
-            if l.get('annee') == annee:
-                try:
-                    date_ecriture = l.get('date_ecriture', '')
-                    if date_ecriture:
-                        # Extraire le mois de la date (format: "2021-01-31T00:00:00")
-                        mois_ligne = int(date_ecriture.split('-')[1])
-                        if mois_ligne == mois:
-                            lignes_mois.append(l)
-                except (IndexError, ValueError):
-                    continue
-        
-        if not lignes_mois:
-            continue
-        
-        # Utiliser le nouveau SIGCalculator
-        calculator = SIGCalculator(lignes_mois)
+    # Une seule passe sur les lignes, lues page par page : les mois sont obtenus par agrégation du cube
+    cube = await navision_sig.get_cube_async("annee")
+    
+    for mois in cube.mois_disponibles(annee):
+        calculator = cube.calculateur(annee, mois=mois)
         
         # Définition des libellés des indicateurs
         libelles = {
@@ -143,18 +134,13 @@ def get_sous_indicateurs_mensuel(societe: str, annee: int):
         # Calculer les indicateurs principaux
         for code, libelle in libelles.items():
             # Construction des formules avec le nouveau modèle
-            formule_text = calculator.construire_formule_text(code, 0)  # valeur temporaire
-            formule_numeric = calculator.construire_formule_numeric(code, 0)  # valeur temporaire
-            
-            # Extraire la valeur finale de la formule numérique
-            # La formule est au format "INDICATEUR = ... = VALEUR_FINALE"
-            try:
-                valeur_finale = float(formule_numeric.split(' = ')[-1])
-            except (IndexError, ValueError):
-                valeur_finale = 0
-            
-            if valeur_finale == 0:
+            resultat = calculator.evaluate(code)
+            # Valeur exacte ; l'indicateur est ignoré s'il est nul au centime près
+            if resultat.est_nul:
                 continue
+            valeur_finale = resultat.valeur
+            formule_text = resultat.formule_text
+            formule_numeric = resultat.formule_numeric
             
             indicateurs_calcules[code] = {
                 "indicateur": code,
@@ -167,26 +153,15 @@ def get_sous_indicateurs_mensuel(societe: str, annee: int):
         # Pour chaque indicateur calculé, récupérer ses sous-indicateurs
         indicateurs_dict = {}
         for ind_key in indicateurs_calcules.keys():
-            # Utiliser get_composantes_formule pour récupérer seulement les sous-indicateurs utilisés dans la formule
-            composantes_positives, composantes_negatives = calculator.get_composantes_formule(ind_key)
-            tous_composantes = composantes_positives + composantes_negatives
-            
             sous_indicateurs_list = []
-            for composante in tous_composantes:
-                # Si c'est un indicateur calculé (MC, VA, EBE, RE), on ne l'inclut pas dans les sous-indicateurs
-                if composante in ['MC', 'VA', 'EBE', 'RE']:
-                    continue
-                
-                # Récupérer le montant pour ce sous-indicateur
-                montant = calculator._get_montant_par_indicateur_sous_ind(ind_key, [composante])
-                if montant != 0:
-                    sous_indicateurs_list.append({
-                        "sousIndicateur": composante,
-                        "libelle": MappingIndicateurSIG.get_libelle(composante),
-                        "initiales": MappingIndicateurSIG.get_initiales(composante),
-                        "formule": MappingIndicateurSIG.get_formule(composante),
-                        "montant": montant
-                    })
+            for composante, montant in calculator.evaluate(ind_key).sous_indicateurs():
+                sous_indicateurs_list.append({
+                    "sousIndicateur": composante,
+                    "libelle": MappingIndicateurSIG.get_libelle(composante),
+                    "initiales": MappingIndicateurSIG.get_initiales(composante),
+                    "formule": MappingIndicateurSIG.get_formule(composante),
+                    "montant": montant
+                })
             indicateurs_dict[ind_key] = sous_indicateurs_list
         
         result[mois] = indicateurs_dict
@@ -196,7 +171,7 @@ def get_sous_indicateurs_mensuel(societe: str, annee: int):
 
 # 4. Comptes mensuels (paginé)
 @navision_router.get("/{societe}/comptes/mensuel", tags=["Navision"])
-def get_comptes_mensuel(
+async def get_comptes_mensuel(
     societe: str,
     annee: int,
     mois: int,
@@ -208,7 +183,7 @@ def get_comptes_mensuel(
     if not vue:
         return {"error": "Société inconnue"}
     navision_sig = NavisionSIGController(vue)
-    lignes = navision_sig.get_lines("mois", annee=annee, mois=mois)
+    lignes = await navision_sig.get_lines_async("mois", annee=annee, mois=mois)
     comptes = [
         {
             "code_compte": l["code_compte"],
@@ -228,7 +203,7 @@ def get_comptes_mensuel(
     return {"total": total, "limit": limit, "offset": offset, "comptes": comptes_page}
 
 @navision_router.get("/{societe}/indicateurs/mensuel", tags=["Navision"])
-def get_indicateurs_mensuel_valeurs(societe: str, annee: int):
+async def get_indicateurs_mensuel_valeurs(societe: str, annee: int):
     vue = SOCIETE_VUE_MAP.get(societe)
     if not vue:
         return {"error": "Société inconnue"}
@@ -241,63 +216,32 @@ def get_indicateurs_mensuel_valeurs(societe: str, annee: int):
         'R': 'Résultat net',
     }
     
-    lignes = navision_sig.get_lines("annee")
     result = {}
     
-    for mois in range(1, 13):
-        # Filtrer les lignes par année et mois en utilisant date_ecriture
-        lignes_mois = []
-        for l in lignes:
-            if l.get('annee') == annee:
-                try:
-                    date_ecriture = l.get('date_ecriture', '')
-                    if date_ecriture:
-                        # Extraire le mois de la date (format: "2021-01-31T00:00:00")
-                        mois_ligne = int(date_ecriture.split('-')[1])
-                        if mois_ligne == mois:
-                            lignes_mois.append(l)
-                except (IndexError, ValueError):
-                    continue
-        
-        if not lignes_mois:
-            continue
-        
-        # Utiliser le nouveau SIGCalculator
-        calculator = SIGCalculator(lignes_mois)
+    # Une seule passe sur les lignes, lues page par page : les mois sont obtenus par agrégation du cube
+    cube = await navision_sig.get_cube_async("annee")
+    
+    for mois in cube.mois_disponibles(annee):
+        calculator = cube.calculateur(annee, mois=mois)
         indicateurs_list = []
         
         for code, libelle in libelles.items():
             # Construction des formules avec le nouveau modèle
-            formule_text = calculator.construire_formule_text(code, 0)  # valeur temporaire
-            formule_numeric = calculator.construire_formule_numeric(code, 0)  # valeur temporaire
-            
-            # Extraire la valeur finale de la formule numérique
-            # La formule est au format "INDICATEUR = ... = VALEUR_FINALE"
-            try:
-                valeur_finale = float(formule_numeric.split(' = ')[-1])
-            except (IndexError, ValueError):
-                valeur_finale = 0
-            
-            if valeur_finale == 0:
+            resultat = calculator.evaluate(code)
+            # Valeur exacte ; l'indicateur est ignoré s'il est nul au centime près
+            if resultat.est_nul:
                 continue
+            valeur_finale = resultat.valeur
+            formule_text = resultat.formule_text
+            formule_numeric = resultat.formule_numeric
             
             # Récupération des sous-indicateurs avec montants non-nuls
-            composantes_positives, composantes_negatives = calculator.get_composantes_formule(code)
-            tous_composantes = composantes_positives + composantes_negatives
-            
             sous_indicateurs = []
-            for composante in tous_composantes:
-                # Si c'est un indicateur calculé (MC, VA, EBE, RE), on ne l'inclut pas dans les sous-indicateurs
-                if composante in ['MC', 'VA', 'EBE', 'RE']:
-                    continue
-                
-                # Récupérer le montant pour ce sous-indicateur
-                montant = calculator._get_montant_par_indicateur_sous_ind(code, [composante])
-                if montant != 0:
-                    sous_indicateurs.append({
-                        "sous_indicateur": composante,
-                        "montant": montant
-                    })
+            for composante, montant in resultat.sous_indicateurs():
+                sous_indicateurs.append({
+                    "sous_indicateur": composante,
+                    "montant": montant
+                })
         
             indicateurs_list.append({
                 "indicateur": code,
@@ -313,7 +257,7 @@ def get_indicateurs_mensuel_valeurs(societe: str, annee: int):
     return {"annee": annee, "mois": result}
 
 @navision_router.get("/{societe}/indicateurs/global", tags=["Navision"])
-def get_indicateurs_global_valeurs(
+async def get_indicateurs_global_valeurs(
     societe: str,
     periode: str = Query(..., description="annee ou trimestre"),
     trimestre: Optional[str] = Query(None, description="Numéro du trimestre (1, 2, 3 ou 4) si période=trimestre")
@@ -331,48 +275,30 @@ def get_indicateurs_global_valeurs(
     }
     
     if periode == "annee":
-        lignes = navision_sig.get_lines("annee")
-        annees = sorted({l.get('annee') for l in lignes if l.get('annee')}, reverse=True)[:3]
+        cube = await navision_sig.get_cube_async("annee")
+        annees = cube.annees()[:3]
         result = {}
         for a in annees:
-            lignes_annee = [l for l in lignes if l.get('annee') == a]
-            
-            # Utiliser le nouveau SIGCalculator
-            calculator = SIGCalculator(lignes_annee)
+            calculator = cube.calculateur(a)
             indicateurs_list = []
             
             for code, libelle in libelles.items():
                 # Construction des formules avec le nouveau modèle
-                formule_text = calculator.construire_formule_text(code, 0)  # valeur temporaire
-                formule_numeric = calculator.construire_formule_numeric(code, 0)  # valeur temporaire
-                
-                # Extraire la valeur finale de la formule numérique
-                # La formule est au format "INDICATEUR = ... = VALEUR_FINALE"
-                try:
-                    valeur_finale = float(formule_numeric.split(' = ')[-1])
-                except (IndexError, ValueError):
-                    valeur_finale = 0
-                
-                if valeur_finale == 0:
+                resultat = calculator.evaluate(code)
+                # Valeur exacte ; l'indicateur est ignoré s'il est nul au centime près
+                if resultat.est_nul:
                     continue
+                valeur_finale = resultat.valeur
+                formule_text = resultat.formule_text
+                formule_numeric = resultat.formule_numeric
                 
                 # Récupération des sous-indicateurs avec montants non-nuls
-                composantes_positives, composantes_negatives = calculator.get_composantes_formule(code)
-                tous_composantes = composantes_positives + composantes_negatives
-                
                 sous_indicateurs = []
-                for composante in tous_composantes:
-                    # Si c'est un indicateur calculé (MC, VA, EBE, RE), on ne l'inclut pas dans les sous-indicateurs
-                    if composante in ['MC', 'VA', 'EBE', 'RE']:
-                        continue
-                    
-                    # Récupérer le montant pour ce sous-indicateur
-                    montant = calculator._get_montant_par_indicateur_sous_ind(code, [composante])
-                    if montant != 0:
-                        sous_indicateurs.append({
-                            "sous_indicateur": composante,
-                            "montant": montant
-                        })
+                for composante, montant in resultat.sous_indicateurs():
+                    sous_indicateurs.append({
+                        "sous_indicateur": composante,
+                        "montant": montant
+                    })
                 
                 indicateurs_list.append({
                     "indicateur": code,
@@ -391,48 +317,31 @@ def get_indicateurs_global_valeurs(
             return {"error": "Il faut fournir trimestre (1, 2, 3 ou 4) pour la période trimestre."}
         if trimestre_int not in [1, 2, 3, 4]:
             return {"error": "Il faut fournir trimestre (1, 2, 3 ou 4) pour la période trimestre."}
-        lignes = navision_sig.get_lines("annee")
-        annees = sorted({l.get('annee') for l in lignes if l.get('annee')}, reverse=True)[:3]
+        # Une seule requête : le trimestre de chaque année est agrégé depuis le cube annuel
+        cube = await navision_sig.get_cube_async("annee")
+        annees = cube.annees()[:3]
         result = {}
         for a in annees:
-            lignes_trim = navision_sig.get_lines("trimestre", annee=a, trimestre=trimestre_int)
-            
-            # Utiliser le nouveau SIGCalculator
-            calculator = SIGCalculator(lignes_trim)
+            calculator = cube.calculateur(a, trimestre=trimestre_int)
             indicateurs_list = []
             
             for code, libelle in libelles.items():
                 # Construction des formules avec le nouveau modèle
-                formule_text = calculator.construire_formule_text(code, 0)  # valeur temporaire
-                formule_numeric = calculator.construire_formule_numeric(code, 0)  # valeur temporaire
-                
-                # Extraire la valeur finale de la formule numérique
-                # La formule est au format "INDICATEUR = ... = VALEUR_FINALE"
-                try:
-                    valeur_finale = float(formule_numeric.split(' = ')[-1])
-                except (IndexError, ValueError):
-                    valeur_finale = 0
-                
-                if valeur_finale == 0:
+                resultat = calculator.evaluate(code)
+                # Valeur exacte ; l'indicateur est ignoré s'il est nul au centime près
+                if resultat.est_nul:
                     continue
+                valeur_finale = resultat.valeur
+                formule_text = resultat.formule_text
+                formule_numeric = resultat.formule_numeric
                 
                 # Récupération des sous-indicateurs avec montants non-nuls
-                composantes_positives, composantes_negatives = calculator.get_composantes_formule(code)
-                tous_composantes = composantes_positives + composantes_negatives
-                
                 sous_indicateurs = []
-                for composante in tous_composantes:
-                    # Si c'est un indicateur calculé (MC, VA, EBE, RE), on ne l'inclut pas dans les sous-indicateurs
-                    if composante in ['MC', 'VA', 'EBE', 'RE']:
-                        continue
-                    
-                    # Récupérer le montant pour ce sous-indicateur
-                    montant = calculator._get_montant_par_indicateur_sous_ind(code, [composante])
-                    if montant != 0:
-                        sous_indicateurs.append({
-                            "sous_indicateur": composante,
-                            "montant": montant
-                        })
+                for composante, montant in resultat.sous_indicateurs():
+                    sous_indicateurs.append({
+                        "sous_indicateur": composante,
+                        "montant": montant
+                    })
                 
                 indicateurs_list.append({
                     "indicateur": code,
@@ -485,7 +394,7 @@ def debug_lignes(societe: str, limit: int = 10):
     }
 
 @navision_router.get("/{societe}/sous_indicateurs/global", tags=["Navision"])
-def get_sous_indicateurs_global(
+async def get_sous_indicateurs_global(
     societe: str,
     periode: str = Query(..., description="annee ou trimestre"),
     trimestre: Optional[str] = Query(None, description="Numéro du trimestre (1, 2, 3 ou 4) si période=trimestre")
@@ -496,34 +405,18 @@ def get_sous_indicateurs_global(
     navision_sig = NavisionSIGController(vue)
     
     if periode == "annee":
-        lignes = navision_sig.get_lines("annee")
-        annees = sorted({l.get('annee') for l in lignes if l.get('annee')}, reverse=True)[:3]
+        cube = await navision_sig.get_cube_async("annee")
+        annees = cube.annees()[:3]
         result = {}
         for a in annees:
-            lignes_annee = [l for l in lignes if l.get('annee') == a]
-            
-            # Utiliser le nouveau SIGCalculator
-            calculator = SIGCalculator(lignes_annee)
+            calculator = cube.calculateur(a)
             indicateurs_calcules = calculator.calculer_tous_indicateurs()
             sous_indicateurs = {}
             
             # Pour chaque indicateur calculé, récupérer ses sous-indicateurs
             for ind_key in indicateurs_calcules.keys():
-                # Utiliser get_composantes_formule pour récupérer seulement les sous-indicateurs utilisés dans la formule
-                composantes_positives, composantes_negatives = calculator.get_composantes_formule(ind_key)
-                tous_composantes = composantes_positives + composantes_negatives
-                
                 sous_indicateurs_list = []
-                
-                # Pour chaque composante de la formule, récupérer ses informations
-                for composante in tous_composantes:
-                    # Si c'est un indicateur calculé (MC, VA, EBE, RE), on ne l'inclut pas dans les sous-indicateurs
-                    if composante in ['MC', 'VA', 'EBE', 'RE']:
-                        continue
-                    
-                    # Récupérer le montant pour ce sous-indicateur
-                    montant = calculator._get_montant_par_indicateur_sous_ind(ind_key, [composante])
-                    
+                for composante, montant in calculator.evaluate(ind_key).sous_indicateurs():
                     sous_indicateurs_list.append({
                         "sousIndicateur": composante,
                         "libelle": MappingIndicateurSIG.get_libelle(composante),
@@ -542,34 +435,19 @@ def get_sous_indicateurs_global(
             return {"error": "Il faut fournir trimestre (1, 2, 3 ou 4) pour la période trimestre."}
         if trimestre_int not in [1, 2, 3, 4]:
             return {"error": "Il faut fournir trimestre (1, 2, 3 ou 4) pour la période trimestre."}
-        lignes = navision_sig.get_lines("annee")
-        annees = sorted({l.get('annee') for l in lignes if l.get('annee')}, reverse=True)[:3]
+        # Une seule requête : le trimestre de chaque année est agrégé depuis le cube annuel
+        cube = await navision_sig.get_cube_async("annee")
+        annees = cube.annees()[:3]
         result = {}
         for a in annees:
-            lignes_trim = navision_sig.get_lines("trimestre", annee=a, trimestre=trimestre_int)
-            
-            # Utiliser le nouveau SIGCalculator
-            calculator = SIGCalculator(lignes_trim)
+            calculator = cube.calculateur(a, trimestre=trimestre_int)
             indicateurs_calcules = calculator.calculer_tous_indicateurs()
             sous_indicateurs = {}
             
             # Pour chaque indicateur calculé, récupérer ses sous-indicateurs
             for ind_key in indicateurs_calcules.keys():
-                # Utiliser get_composantes_formule pour récupérer seulement les sous-indicateurs utilisés dans la formule
-                composantes_positives, composantes_negatives = calculator.get_composantes_formule(ind_key)
-                tous_composantes = composantes_positives + composantes_negatives
-                
                 sous_indicateurs_list = []
-                
-                # Pour chaque composante de la formule, récupérer ses informations
-                for composante in tous_composantes:
-                    # Si c'est un indicateur calculé (MC, VA, EBE, RE), on ne l'inclut pas dans les sous-indicateurs
-                    if composante in ['MC', 'VA', 'EBE', 'RE']:
-                        continue
-                    
-                    # Récupérer le montant pour ce sous-indicateur
-                    montant = calculator._get_montant_par_indicateur_sous_ind(ind_key, [composante])
-                    
+                for composante, montant in calculator.evaluate(ind_key).sous_indicateurs():
                     sous_indicateurs_list.append({
                         "sousIndicateur": composante,
                         "libelle": MappingIndicateurSIG.get_libelle(composante),
@@ -582,4 +460,35 @@ def get_sous_indicateurs_global(
             result[a] = sous_indicateurs
         return {"periode": "trimestre", "trimestre": trimestre_int, "sous_indicateurs": result}
     else:
-        return {"error": "Période inconnue. Utilisez 'annee' ou 'trimestre'."}
\ No newline at end of file
+        return {"error": "Période inconnue. Utilisez 'annee' ou 'trimestre'."}
+
+@navision_router.get("/navision/stats/http", tags=["Navision"])
+def get_stats_http():
+    """
+    Statistiques de la session HTTP partagée vers Supabase (pool, timeouts, histogramme des latences)
+    """
+    return http_session.stats()
+
+@navision_router.get("/navision/stats/cache", tags=["Navision"])
+def get_stats_cache():
+    """
+    Statistiques du cache des réponses SIG (hits, misses, 304, nombre d'entrées)
+    """
+    return result_cache.stats()
+
+@navision_router.post("/navision/stats/cache/invalider", tags=["Navision"])
+def invalider_cache(prefixe: str = Query("", description="Préfixe des chemins à invalider, par exemple /rsp-neg/ (vide : tout le cache)")):
+    """
+    Supprime les réponses en cache (toutes, ou celles d'une société) après une correction
+    des écritures ou une régénération des données
+    """
+    result_cache.invalider(prefixe)
+    return {"invalide": prefixe or "*", **result_cache.stats()}
+
+@navision_router.get("/navision/stats/lignes", tags=["Navision"])
+def get_stats_lignes():
+    """
+    Statistiques du stockage partagé des lignes (hits, misses, chargements partagés, lignes en mémoire)
+    et des instantanés synchronisés de façon incrémentale
+    """
+    return {**ligne_store.stats(), "snapshots": ledger_snapshot.stats()}
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Génère les fonctions SQL (PostgreSQL / Supabase) d'agrégation SIG exposées par PostgREST :
+    POST /rest/v1/rpc/sig_agregats_<vue>  {"p_annee": 2024}  ou  {"p_annee_min": 2022}
+Chaque fonction retourne (code_compte, annee, mois, debit, credit, nb_lignes, libelle_compte),
+c'est-à-dire les sommes par compte et par mois, utilisées par NavisionSIGController
+en mode NAVISION_FETCH_MODE=agregats.
+
+Usage :
+    python create_sig_agregats.py            # affiche le SQL
+    python create_sig_agregats.py out.sql    # écrit le SQL dans un fichier
+"""
+
+import sys
+
+VUES = [
+    'bgs_view_entry',
+    'neg_view_entry',
+    'sb_view_entry'
+]
+
+ROLES = ['anon', 'authenticated']
+
+def generer_fonction(vue):
+    fonction = f"sig_agregats_{vue}"
+    grants = "\n".join(
+        f"GRANT EXECUTE ON FUNCTION public.{fonction}(integer, integer) TO {role};" for role in ROLES
+    )
+    return f'''-- Agrégats SIG de la vue {vue}
+CREATE OR REPLACE FUNCTION public.{fonction}(p_annee integer DEFAULT NULL, p_annee_min integer DEFAULT NULL)
+RETURNS TABLE (
+  code_compte text,
+  annee integer,
+  mois integer,
+  debit double precision,
+  credit double precision,
+  nb_lignes bigint,
+  libelle_compte text
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    e.code_compte::text,
+    EXTRACT(YEAR FROM e.date_ecriture)::integer AS annee,
+    EXTRACT(MONTH FROM e.date_ecriture)::integer AS mois,
+    COALESCE(SUM(e.debit), 0)::double precision AS debit,
+    COALESCE(SUM(e.credit), 0)::double precision AS credit,
+    COUNT(*) AS nb_lignes,
+    MAX(e.description)::text AS libelle_compte
+  FROM public.{vue} e
+  WHERE (p_annee IS NULL OR (e.date_ecriture >= make_date(p_annee, 1, 1) AND e.date_ecriture < make_date(p_annee + 1, 1, 1)))
+    AND (p_annee_min IS NULL OR e.date_ecriture >= make_date(p_annee_min, 1, 1))
+  GROUP BY 1, 2, 3
+$$;
+{grants}
+'''
+
+def generer_sql():
+    blocs = [generer_fonction(vue) for vue in VUES]
+    # Recharger le cache de schéma PostgREST pour exposer les nouvelles fonctions
+    blocs.append("NOTIFY pgrst, 'reload schema';\n")
+    return "\n".join(blocs)
+
+if __name__ == "__main__":
+    sql = generer_sql()
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'w', encoding='utf-8') as f:
+            f.write(sql)
+        print(f"-- SQL écrit dans {sys.argv[1]}")
+    else:
+        print(sql)
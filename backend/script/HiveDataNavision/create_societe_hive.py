@@ -4,10 +4,18 @@
 Script pour générer des fichiers .hive par société depuis SQL Server Navision
 """
 
+import argparse
 import os
-import json
+import sys
 import pyodbc
 from datetime import datetime
+from typing import Iterator
+
+# Ajouter les répertoires backend et script au path pour importer les modèles et le format .hive
+_SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([os.path.dirname(_SCRIPT_DIR), _SCRIPT_DIR])
+
+from hive_format import FORMAT_NDJSON, EcrivainHive, arguments_format
 
 # === CONFIGURATION SQL SERVER ===
 SQL_SERVER = 'srvnavsql'
@@ -23,6 +31,9 @@ SOCIETE_MAPPING = {
     'SB': 'rsp-sb'
 }
 
+# Nombre de lignes lues à la fois (fetchmany) : la mémoire ne dépend pas de la taille du grand livre
+TAILLE_LOT = 5000
+
 # Tables Entry à traiter
 ENTRY_TABLES = [
     'dbo_BGS$G_L Entry',
@@ -41,8 +52,8 @@ def connect_sql_server():
     )
     return pyodbc.connect(conn_str)
 
-def fetch_entry_data(cursor, table_name: str) -> list:
-    """Récupère les données Entry d'une table spécifique"""
+def fetch_entry_data(cursor, table_name: str) -> Iterator[dict]:
+    """Récupère les données Entry d'une table spécifique, par lots de TAILLE_LOT lignes"""
     print(f"📊 Récupération des données depuis {table_name}...")
     
     # Requête convertie de PostgreSQL vers SQL Server
@@ -76,24 +87,27 @@ def fetch_entry_data(cursor, table_name: str) -> list:
     
     cursor.execute(query)
     columns = [column[0] for column in cursor.description]
-    rows = cursor.fetchall()
     
-    data = []
-    for row in rows:
-        row_dict = {}
-        for col, value in zip(columns, row):
-            if isinstance(value, datetime):
-                row_dict[col] = value.isoformat()
-            elif isinstance(value, (int, float)):
-                row_dict[col] = value
-            else:
-                row_dict[col] = str(value) if value is not None else None
-        data.append(row_dict)
+    nb_lignes = 0
+    while True:
+        rows = cursor.fetchmany(TAILLE_LOT)
+        if not rows:
+            break
+        for row in rows:
+            row_dict = {}
+            for col, value in zip(columns, row):
+                if isinstance(value, datetime):
+                    row_dict[col] = value.isoformat()
+                elif isinstance(value, (int, float)):
+                    row_dict[col] = value
+                else:
+                    row_dict[col] = str(value) if value is not None else None
+            nb_lignes += 1
+            yield row_dict
     
-    print(f"✅ {len(data)} lignes récupérées de {table_name}")
-    return data
+    print(f"✅ {nb_lignes} lignes récupérées de {table_name}")
 
-def create_societe_hive():
+def create_societe_hive(format_sortie: str = FORMAT_NDJSON):
     print("🚀 Génération des fichiers .hive par société depuis SQL Server")
     
     try:
@@ -102,14 +116,10 @@ def create_societe_hive():
         sql_conn = connect_sql_server()
         cursor = sql_conn.cursor()
         
-        # Dictionnaire pour stocker les données par société
-        societes_data = {
-            "rsp-bgs": [],
-            "rsp-neg": [],
-            "rsp-sb": []
-        }
+        # Sociétés déjà écrites : une seconde table de la même société complète son fichier
+        societes_ecrites = set()
         
-        # Traitement de chaque table Entry
+        # Traitement de chaque table Entry : les lignes sont écrites au fil de la lecture
         for table_name in ENTRY_TABLES:
             # Extraire le code société du nom de table
             societe_code = table_name.split('$')[0].replace('dbo_', '')
@@ -117,39 +127,26 @@ def create_societe_hive():
             
             print(f"\n📊 Société: {societe_name}")
             
-            # Récupération des données
-            lignes = fetch_entry_data(cursor, table_name)
-            societes_data[societe_name].extend(lignes)
-        
-        # Générer un fichier hive par société
-        print(f"\n📝 Génération des fichiers .hive par société...")
-        
-        for societe, lignes in societes_data.items():
-            if not lignes:
-                print(f"⚠️  Aucune donnée pour {societe}")
-                continue
-                
-            print(f"\n📊 Société {societe}: {len(lignes)} lignes")
-            
-            # Construction du fichier .hive pour cette société
-            hive_data = {
-                "metadata": {
-                    "generation_date": datetime.now().isoformat(),
-                    "societe": societe,
-                    "total_lines": len(lignes),
-                    "description": f"Données Navision SQL Server pour {societe}"
-                },
-                "donnees_brutes": {
-                    "lignes": lignes
-                }
+            # Métadonnées du fichier .hive pour cette société
+            metadata = {
+                "generation_date": datetime.now().isoformat(),
+                "societe": societe_name,
+                "description": f"Données Navision SQL Server pour {societe_name}"
             }
             
-            # Sauvegarder le fichier
-            filename = f"{societe}_data.hive"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(hive_data, f, ensure_ascii=False, indent=2)
+            # Sauvegarder le fichier (NDJSON en flux par défaut)
+            filename = f"{societe_name}_data.hive"
+            ajout = societe_name in societes_ecrites and format_sortie == FORMAT_NDJSON
+            with EcrivainHive(filename, metadata, format_sortie, ajout=ajout) as ecrivain:
+                ecrivain.ecrire_lignes(fetch_entry_data(cursor, table_name))
+            
+            if ecrivain.nb_lignes == 0 and not ajout:
+                os.remove(filename)
+                print(f"⚠️  Aucune donnée pour {societe_name}")
+                continue
+            societes_ecrites.add(societe_name)
             
-            print(f"✅ Fichier généré: {filename}")
+            print(f"✅ Fichier généré: {filename} ({ecrivain.nb_lignes} lignes)")
         
         # Fermeture de la connexion
         cursor.close()
@@ -157,7 +154,7 @@ def create_societe_hive():
         
         print(f"\n🎉 Génération terminée !")
         print(f"📁 Fichiers créés:")
-        for societe in societes_data.keys():
+        for societe in sorted(societes_ecrites):
             filename = f"{societe}_data.hive"
             if os.path.exists(filename):
                 size = os.path.getsize(filename)
@@ -170,4 +167,6 @@ def create_societe_hive():
     return 0
 
 if __name__ == "__main__":
-    exit(create_societe_hive()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Génération des fichiers .hive par société depuis SQL Server Navision")
+    arguments_format(parser, FORMAT_NDJSON)
+    exit(create_societe_hive(parser.parse_args().format_sortie)) 
\ No newline at end of file
@@ -4,17 +4,20 @@
 Script pour générer des fichiers .hive par société depuis Odoo
 """
 
+import argparse
 import os
-import json
 import sys
 from datetime import datetime
+from typing import Iterator
 from dotenv import load_dotenv
 
-# Ajouter le répertoire parent au path pour importer les services
-sys.path.append('../..')
+# Ajouter les répertoires backend et script au path pour importer les services et le format .hive
+_SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([os.path.dirname(_SCRIPT_DIR), _SCRIPT_DIR])
 
 from services.odoo.odoo_api import OdooService
-from models.PlanComptable import MappingIndicateurSIG
+from models.PlanComptable import TableComptes
+from hive_format import FORMAT_NDJSON, EcrivainHive, arguments_format
 
 load_dotenv()
 
@@ -33,15 +36,15 @@ def connect_odoo():
         print(f"❌ Erreur de connexion Odoo: {e}")
         return None
 
-def fetch_odoo_data(odoo_service, periode="annee") -> list:
-    """Récupère les données depuis Odoo"""
+def fetch_odoo_data(odoo_service, periode="annee") -> Iterator[dict]:
+    """Récupère les données depuis Odoo, lot par lot (une requête search_read à la fois)"""
     print(f"📊 Récupération des données Odoo (période: {periode})...")
     
     try:
         # Utiliser la même logique que le contrôleur Odoo
         today = datetime.now().date()
         annees = [today.year, today.year - 1, today.year - 2, today.year - 3]
-        all_lines = []
+        nb_lignes = 0
         
         for annee in annees:
             if periode == "trimestre":
@@ -73,26 +76,22 @@ def fetch_odoo_data(odoo_service, periode="annee") -> list:
                             line['code_compte'] = ''
                             line['libelle_compte'] = ''
                         
-                        code = line["code_compte"]
-                        line['classe'] = code[:1] if code else ''
-                        line['sous_classe'] = code[:2] if code else ''
-                        line['sss_classe'] = code[:3] if code else ''
+                        compte = TableComptes.dimension(line["code_compte"])
+                        line['classe'] = compte.classe
+                        line['sous_classe'] = compte.sous_classe
+                        line['sss_classe'] = compte.sss_classe
                         
                         # Mapping des indicateurs
-                        mapping = MappingIndicateurSIG.find_best_mapping(code)
-                        if mapping:
-                            line['indicateur'] = mapping.indicateur
-                            line['sous_indicateur'] = [mapping.sous_indicateur] if mapping.sous_indicateur else []
-                        else:
-                            line['indicateur'] = None
-                            line['sous_indicateur'] = []
+                        line['indicateur'] = compte.indicateur
+                        line['sous_indicateur'] = list(compte.sous_indicateurs)
                         
                         line['montant'] = line['debit'] - line['credit']
                         line['annee'] = annee
                         line['mois'] = int(line['date'][5:7]) if line['date'] else None
                         line['trimestre'] = ((int(line['date'][5:7]) - 1) // 3) + 1 if line['date'] else None
                         
-                        all_lines.append(line)
+                        nb_lignes += 1
+                        yield line
             else:
                 # Pour les années
                 domain = [
@@ -112,35 +111,30 @@ def fetch_odoo_data(odoo_service, periode="annee") -> list:
                         line['code_compte'] = ''
                         line['libelle_compte'] = ''
                     
-                    code = line["code_compte"]
-                    line['classe'] = code[:1] if code else ''
-                    line['sous_classe'] = code[:2] if code else ''
-                    line['sss_classe'] = code[:3] if code else ''
+                    compte = TableComptes.dimension(line["code_compte"])
+                    line['classe'] = compte.classe
+                    line['sous_classe'] = compte.sous_classe
+                    line['sss_classe'] = compte.sss_classe
                     
                     # Mapping des indicateurs
-                    mapping = MappingIndicateurSIG.find_best_mapping(code)
-                    if mapping:
-                        line['indicateur'] = mapping.indicateur
-                        line['sous_indicateur'] = [mapping.sous_indicateur] if mapping.sous_indicateur else []
-                    else:
-                        line['indicateur'] = None
-                        line['sous_indicateur'] = []
+                    line['indicateur'] = compte.indicateur
+                    line['sous_indicateur'] = list(compte.sous_indicateurs)
                     
                     line['montant'] = line['debit'] - line['credit']
                     line['annee'] = annee
                     line['mois'] = int(line['date'][5:7]) if line['date'] else None
                     line['trimestre'] = ((int(line['date'][5:7]) - 1) // 3) + 1 if line['date'] else None
                     
-                    all_lines.append(line)
+                    nb_lignes += 1
+                    yield line
         
-        print(f"✅ {len(all_lines)} lignes récupérées d'Odoo")
-        return all_lines
+        print(f"✅ {nb_lignes} lignes récupérées d'Odoo")
         
     except Exception as e:
         print(f"❌ Erreur lors de la récupération des données Odoo: {e}")
-        return []
+        raise
 
-def create_societe_hive():
+def create_societe_hive(format_sortie: str = FORMAT_NDJSON):
     print("🚀 Génération des fichiers .hive par société depuis Odoo")
     
     try:
@@ -152,53 +146,48 @@ def create_societe_hive():
             print("❌ Impossible de se connecter à Odoo")
             return 1
         
-        # Récupération des données pour chaque société
-        societes_data = {}
-        
+        # Un fichier hive par société, écrit au fil de la récupération ;
+        # l'échec d'une société n'interrompt pas les suivantes
+        echecs = []
         for societe_code, societe_name in SOCIETE_MAPPING.items():
             print(f"\n📊 Société: {societe_name}")
             
-            # Récupération des données
-            lignes = fetch_odoo_data(odoo_service, "annee")
-            societes_data[societe_name] = lignes
-        
-        # Générer un fichier hive par société
-        print(f"\n📝 Génération des fichiers .hive par société...")
-        
-        for societe, lignes in societes_data.items():
-            if not lignes:
-                print(f"⚠️  Aucune donnée pour {societe}")
-                continue
-                
-            print(f"\n📊 Société {societe}: {len(lignes)} lignes")
-            
-            # Construction du fichier .hive pour cette société
-            hive_data = {
-                "metadata": {
-                    "generation_date": datetime.now().isoformat(),
-                    "societe": societe,
-                    "total_lines": len(lignes),
-                    "description": f"Données Odoo pour {societe}"
-                },
-                "donnees_brutes": {
-                    "lignes": lignes
-                }
+            # Métadonnées du fichier .hive pour cette société
+            metadata = {
+                "generation_date": datetime.now().isoformat(),
+                "societe": societe_name,
+                "description": f"Données Odoo pour {societe_name}"
             }
             
-            # Sauvegarder le fichier
-            filename = f"{societe}_data.hive"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(hive_data, f, ensure_ascii=False, indent=2)
+            # Sauvegarder le fichier (NDJSON en flux par défaut) ; en cas d'erreur,
+            # l'écrivain abandonne le fichier temporaire et l'ancien fichier est conservé
+            filename = f"{societe_name}_data.hive"
+            try:
+                with EcrivainHive(filename, metadata, format_sortie) as ecrivain:
+                    ecrivain.ecrire_lignes(fetch_odoo_data(odoo_service, "annee"))
+            except Exception as e:
+                print(f"❌ {societe_name} ignorée, fichier non modifié: {e}")
+                echecs.append(societe_name)
+                continue
             
-            print(f"✅ Fichier généré: {filename}")
+            if ecrivain.nb_lignes == 0:
+                os.remove(filename)
+                print(f"⚠️  Aucune donnée pour {societe_name}")
+                continue
+            
+            print(f"✅ Fichier généré: {filename} ({ecrivain.nb_lignes} lignes)")
         
         print(f"\n🎉 Génération terminée !")
         print(f"📁 Fichiers créés:")
-        for societe in societes_data.keys():
+        for societe in SOCIETE_MAPPING.values():
             filename = f"{societe}_data.hive"
             if os.path.exists(filename):
                 size = os.path.getsize(filename)
                 print(f"   📄 {filename} ({size:,} bytes)")
+        
+        if echecs:
+            print(f"⚠️  Sociétés en échec: {', '.join(echecs)}")
+            return 1
                 
     except Exception as e:
         print(f"❌ Erreur: {e}")
@@ -207,4 +196,6 @@ def create_societe_hive():
     return 0
 
 if __name__ == "__main__":
-    exit(create_societe_hive()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Génération des fichiers .hive par société depuis Odoo")
+    arguments_format(parser, FORMAT_NDJSON)
+    exit(create_societe_hive(parser.parse_args().format_sortie)) 
\ No newline at end of file
@@ -4,13 +4,19 @@
 Script pour générer des fichiers .hive par société et payloads organisés
 """
 
+import argparse
 import os
-import json
+import sys
 from datetime import datetime
 from dotenv import load_dotenv
 
+# Ajouter les répertoires backend et script au path pour importer les contrôleurs et le format .hive
+_SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([os.path.dirname(_SCRIPT_DIR), _SCRIPT_DIR])
+
 # Import des contrôleurs
 from controllers.navision_sig_controller import NavisionSIGController
+from hive_format import FORMAT_NDJSON, EcrivainHive, arguments_format
 
 load_dotenv()
 
@@ -21,7 +27,7 @@ SOCIETE_MAPPING = {
     "bgs_view_entry": "rsp-bgs"
 }
 
-def create_societe_hive():
+def create_societe_hive(format_sortie: str = FORMAT_NDJSON):
     print("🚀 Génération des fichiers .hive par société")
     
     # Contrôleurs Navision pour les 3 vues
@@ -35,13 +41,6 @@ def create_societe_hive():
     # Récupération des données pour les années 2022, 2021, 2020
     annees = [2022, 2021, 2020]
     
-    # Dictionnaire pour stocker les données par société
-    societes_data = {
-        "rsp-neg": [],
-        "rsp-sb": [],
-        "rsp-bgs": []
-    }
-    
     # Contrôleurs par société
     controllers = {
         "rsp-neg": navision_neg,
@@ -49,55 +48,44 @@ def create_societe_hive():
         "rsp-bgs": navision_bgs
     }
     
+    # Un fichier hive par société, écrit au fil de la récupération des pages
     for societe, controller in controllers.items():
         print(f"\n📊 Société: {societe}")
         
-        for annee in annees:
-            print(f"   📅 Année {annee}:")
-            
-            # Récupération des lignes pour cette société/année
-            lignes = controller.get_lines("annee", annee)
-            societes_data[societe].extend(lignes)
-            
-            print(f"      ✅ {len(lignes)} lignes récupérées")
-    
-    # Générer un fichier hive par société
-    print(f"\n📝 Génération des fichiers .hive par société...")
-    
-    for societe, lignes in societes_data.items():
-        if not lignes:
-            print(f"⚠️  Aucune donnée pour {societe}")
-            continue
-            
-        print(f"\n📊 Société {societe}: {len(lignes)} lignes")
-        
-        # Construction du fichier .hive pour cette société
-        hive_data = {
-            "metadata": {
-                "generation_date": datetime.now().isoformat(),
-                "societe": societe,
-                "total_lines": len(lignes),
-                "description": f"Données Navision pour {societe} (années 2022, 2021, 2020)"
-            },
-            "donnees_brutes": {
-                "lignes": lignes
-            }
+        # Métadonnées du fichier .hive pour cette société
+        metadata = {
+            "generation_date": datetime.now().isoformat(),
+            "societe": societe,
+            "description": f"Données Navision pour {societe} (années 2022, 2021, 2020)"
         }
         
-        # Sauvegarder le fichier
+        # Sauvegarder le fichier (NDJSON en flux par défaut)
         filename = f"{societe}_data.hive"
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(hive_data, f, ensure_ascii=False, indent=2)
+        with EcrivainHive(filename, metadata, format_sortie) as ecrivain:
+            for annee in annees:
+                print(f"   📅 Année {annee}:")
+                
+                # Lignes de cette société/année, écrites page par page
+                nb_lignes = ecrivain.ecrire_lignes(controller.iter_lines("annee", annee))
+                
+                print(f"      ✅ {nb_lignes} lignes récupérées")
+        
+        if ecrivain.nb_lignes == 0:
+            os.remove(filename)
+            print(f"⚠️  Aucune donnée pour {societe}")
+            continue
         
-        print(f"✅ Fichier généré: {filename}")
+        print(f"✅ Fichier généré: {filename} ({ecrivain.nb_lignes} lignes)")
     
     print(f"\n🎉 Génération terminée !")
     print(f"📁 Fichiers créés:")
-    for societe in societes_data.keys():
+    for societe in controllers.keys():
         filename = f"{societe}_data.hive"
         if os.path.exists(filename):
             size = os.path.getsize(filename)
             print(f"   📄 {filename} ({size:,} bytes)")
 
 if __name__ == "__main__":
-    create_societe_hive() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Génération des fichiers .hive par société")
+    arguments_format(parser, FORMAT_NDJSON)
+    create_societe_hive(parser.parse_args().format_sortie) 
\ No newline at end of file
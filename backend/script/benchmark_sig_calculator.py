@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark du SIGCalculator : parcours ligne à ligne vs table pré-agrégée
+La référence « parcours ligne à ligne » est gardée ici (CalculateurParcours) : comme le
+calculateur d'origine, elle reparcourt toutes les lignes à chaque montant demandé.
+
+Usage :
+    python benchmark_sig_calculator.py [fichier.hive ...] [--synthetique 100000]
+Sans fichier, le fichier livré HiveDataSupabase/rsp-bgs_data.hive est utilisé ; il est
+complété d'un grand livre synthétique (ses lignes répétées) pour mesurer l'effet à l'échelle.
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List, Any, Tuple
+
+# Ajouter les dossiers backend et script au path pour importer les modèles et le format .hive
+sys.path.extend([os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'), os.path.dirname(os.path.abspath(__file__))])
+
+from hive_format import iter_lignes
+from models.PlanComptable import TableComptes
+from models.SIG_formules import PLAN_SIG
+from models.SIG_model import SIGCalculator
+
+INDICATEURS = ['MC', 'VA', 'EBE', 'RE', 'R']
+NB_LIGNES_SYNTHETIQUES = 100_000
+FICHIERS_PAR_DEFAUT = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "HiveDataSupabase", "rsp-bgs_data.hive")]
+
+def charger_lignes(file_path: str) -> List[Dict[str, Any]]:
+    """
+    Charge et enrichit les lignes d'un fichier hive (même règles que NavisionSIGController)
+    """
+    lignes = list(iter_lignes(file_path, ('date_ecriture', 'code_compte', 'debit', 'credit')))
+
+    for l in lignes:
+        compte = TableComptes.dimension(l.get('code_compte', ''))
+        l['indicateur'] = compte.indicateur
+        l['sous_indicateur'] = list(compte.sous_indicateurs)
+        l['montant'] = compte.solde(float(l.get('debit', 0) or 0), float(l.get('credit', 0) or 0))
+        try:
+            l['annee'] = int(str(l.get('date_ecriture', ''))[:4])
+        except ValueError:
+            l['annee'] = None
+    return lignes
+
+def ledger_synthetique(lignes: List[Dict[str, Any]], nb_lignes: int) -> List[Dict[str, Any]]:
+    """
+    Grand livre synthétique : les lignes d'un fichier répétées jusqu'à nb_lignes
+    (même répartition des comptes et des années, volume d'une grosse société)
+    """
+    return [dict(lignes[i % len(lignes)]) for i in range(nb_lignes)]
+
+class SommesParParcours:
+    """
+    Sommes du plan SIG lues une à une, chacune par un parcours complet des lignes
+    """
+
+    def __init__(self, lignes: List[Dict[str, Any]]):
+        self.lignes = lignes
+        self.cles = {position: cle for cle, position in PLAN_SIG.positions.items()}
+
+    def __getitem__(self, position: int) -> float:
+        indicateur, sous_indicateur = self.cles[position]
+        total = 0
+        for l in self.lignes:
+            if l.get('indicateur') != indicateur or SIGCalculator.est_compte_tiers(l.get('code_compte', '')):
+                continue
+            if sous_indicateur is None or sous_indicateur in (l.get('sous_indicateur') or ()):
+                total += l['montant']
+        return total
+
+
+class CalculateurParcours(SIGCalculator):
+    """
+    Référence : mêmes formules que SIGCalculator, mais chaque montant demandé reparcourt
+    toutes les lignes, sans table pré-agrégée ni cache (comportement du calculateur d'origine)
+    """
+
+    def __init__(self, lignes: List[Dict[str, Any]]):
+        super().__init__(lignes, pre_agreger=False)
+
+    def _sommes_plan(self) -> SommesParParcours:
+        return SommesParParcours(self.lignes)
+
+    def _get_montant_par_indicateur_sous_ind(self, indicateur: str, sous_indicateurs_list: List[str], exclure_tiers: bool = True) -> float:
+        self._cache_montants.clear()
+        return super()._get_montant_par_indicateur_sous_ind(indicateur, sous_indicateurs_list, exclure_tiers)
+
+    def _get_montant_par_indicateur(self, indicateur: str, exclure_tiers: bool = True) -> float:
+        self._cache_montants.clear()
+        return super()._get_montant_par_indicateur(indicateur, exclure_tiers)
+
+
+def evaluer_periode(lignes: List[Dict[str, Any]], reference: bool) -> Dict[str, Any]:
+    """
+    Reproduit la charge d'une route indicateurs/global pour une période
+    """
+    calculator = CalculateurParcours(lignes) if reference else SIGCalculator(lignes)
+    resultat = {'indicateurs': {k: round(v, 2) for k, v in calculator.calculer_tous_indicateurs().items()}}
+    for code in INDICATEURS:
+        sig = calculator.evaluate(code)
+        resultat[code] = (
+            sig.formule_text,
+            sig.formule_numeric,
+            [round(montant, 2) for _, montant in sig.sous_indicateurs()]
+        )
+    return resultat
+
+def mesurer(lignes: List[Dict[str, Any]], reference: bool, repetitions: int) -> Tuple[float, Dict[int, Any]]:
+    """
+    Mesure le temps moyen d'évaluation de toutes les années du jeu de données
+    """
+    annees = sorted({l['annee'] for l in lignes if l.get('annee')}, reverse=True)
+    lignes_par_annee = {a: [l for l in lignes if l.get('annee') == a] for a in annees}
+    resultats = {}
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        resultats = {a: evaluer_periode(lignes_annee, reference) for a, lignes_annee in lignes_par_annee.items()}
+    return (time.perf_counter() - debut) / repetitions, resultats
+
+def comparer(nom: str, lignes: List[Dict[str, Any]], repetitions: int):
+    duree_lignes, resultat_lignes = mesurer(lignes, True, repetitions)
+    duree_agregats, resultat_agregats = mesurer(lignes, False, repetitions)
+    identiques = resultat_lignes == resultat_agregats
+    print(f"\n📊 {nom}: {len(lignes):,} lignes")
+    print(f"   Parcours ligne à ligne : {duree_lignes * 1000:.1f} ms")
+    print(f"   Table pré-agrégée     : {duree_agregats * 1000:.1f} ms ({len(lignes) / duree_agregats / 1e6:.2f} M lignes/s)")
+    print(f"   Accélération          : x{duree_lignes / duree_agregats:.1f}")
+    print(f"   Formules identiques   : {'✅' if identiques else '❌'}")
+
+def benchmark(fichiers: List[str], repetitions: int = 5, nb_lignes_synthetiques: int = 0):
+    print("⏱️  Benchmark SIGCalculator (parcours des lignes vs pré-agrégation)")
+    print("=" * 50)
+    for fichier in fichiers:
+        if not os.path.exists(fichier):
+            print(f"⚠️  Fichier {fichier} non trouvé")
+            continue
+        lignes = charger_lignes(fichier)
+        comparer(os.path.basename(fichier), lignes, repetitions)
+        if nb_lignes_synthetiques and lignes:
+            comparer(f"{os.path.basename(fichier)} (synthétique)", ledger_synthetique(lignes, nb_lignes_synthetiques), repetitions)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du SIGCalculator")
+    parser.add_argument("fichiers", nargs="*", default=FICHIERS_PAR_DEFAUT)
+    parser.add_argument(
+        "--synthetique", type=int, default=NB_LIGNES_SYNTHETIQUES,
+        help="Nombre de lignes du grand livre synthétique construit à partir de chaque fichier (0 pour le désactiver)"
+    )
+    parser.add_argument("--repetitions", type=int, default=5)
+    options = parser.parse_args()
+    benchmark(options.fichiers, options.repetitions, options.synthetique)
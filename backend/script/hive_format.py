@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+"""
+Format binaire colonnaire des fichiers .hive, lu par projection mémoire (mmap)
+
+Structure d'un fichier (version 1) :
+    MAGIC (8 octets) | longueur de l'en-tête (uint32, little-endian) | en-tête JSON (UTF-8)
+    | sections de données alignées sur 8 octets
+L'en-tête contient la version, les métadonnées, le nombre de lignes, l'ordre des octets
+et, pour chaque colonne, son type et la position de ses sections :
+    'q' : entiers 64 bits, 'd' : flottants 64 bits (lus sans copie via memoryview.cast)
+    'dictionnaire' : codes int32 (-1 pour une valeur absente) et liste JSON des valeurs distinctes
+                     (textes, dates, listes... décodée seulement si la colonne est lue)
+Un lecteur ne lit que les colonnes qu'il demande. Le format JSON historique reste
+disponible en export (ecrire_hive(..., format_sortie='json')).
+
+Variante NDJSON (écriture en flux) : une ligne d'en-tête
+    {"format": "hive-ndjson", "version": 1, "metadata": {...}}
+puis un enregistrement JSON par ligne. Les lignes sont écrites au fil de l'extraction
+(mémoire constante), un fichier existant peut être complété (ajout) et la lecture est paresseuse ;
+une dernière ligne non terminée (interruption) est ignorée, et supprimée avant un ajout.
+
+Usage (conversion d'un fichier existant) :
+    python hive_format.py source.hive destination.hive                    # vers le format colonnaire
+    python hive_format.py source.hive destination.hive --format json      # vers le format JSON
+    python hive_format.py source.hive destination.hive --format ndjson    # vers le format NDJSON
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+MAGIC = b'MDMHIVE\x00'
+VERSION = 1
+ALIGNEMENT = 8
+
+FORMAT_COLONNES = 'colonnes'
+FORMAT_JSON = 'json'
+FORMAT_NDJSON = 'ndjson'
+FORMATS = [FORMAT_COLONNES, FORMAT_NDJSON, FORMAT_JSON]
+
+# Début de la ligne d'en-tête d'un fichier NDJSON
+ENTETE_NDJSON = b'{"format": "hive-ndjson"'
+
+
+def format_hive(chemin: str) -> str:
+    """
+    Format d'un fichier .hive : 'colonnes', 'ndjson' ou 'json'
+    """
+    with open(chemin, 'rb') as f:
+        debut = f.read(len(ENTETE_NDJSON))
+    if debut.startswith(MAGIC):
+        return FORMAT_COLONNES
+    if debut == ENTETE_NDJSON:
+        return FORMAT_NDJSON
+    return FORMAT_JSON
+
+
+def est_colonnaire(chemin: str) -> bool:
+    """
+    Indique si un fichier .hive est au format colonnaire
+    """
+    return format_hive(chemin) == FORMAT_COLONNES
+
+
+def _type_colonne(valeurs: List[Any]) -> str:
+    """
+    Type de stockage d'une colonne : 'q' si entière, 'd' si numérique, sinon 'dictionnaire'
+    """
+    entiere = True
+    for valeur in valeurs:
+        if isinstance(valeur, bool) or not isinstance(valeur, (int, float)):
+            return 'dictionnaire'
+        if entiere and (not isinstance(valeur, int) or not -2 ** 63 <= valeur < 2 ** 63):
+            entiere = False
+    return 'q' if entiere else 'd'
+
+
+def _cle_valeur(valeur: Any) -> Tuple:
+    # Distingue 1, 1.0 et True ; les listes et dicts sont comparés par leur JSON
+    if isinstance(valeur, (list, dict)):
+        return ('json', json.dumps(valeur, ensure_ascii=False, sort_keys=True))
+    return (type(valeur), valeur)
+
+
+def _encoder_dictionnaire(valeurs: List[Any]) -> Tuple[array, List[Any]]:
+    codes = array('i')
+    distinctes = []
+    index = {}
+    for valeur in valeurs:
+        if valeur is None:
+            codes.append(-1)
+            continue
+        cle = _cle_valeur(valeur)
+        code = index.get(cle)
+        if code is None:
+            code = index[cle] = len(distinctes)
+            distinctes.append(valeur)
+        codes.append(code)
+    return codes, distinctes
+
+
+def _ecrire_colonnes(f, lignes: List[Dict[str, Any]], metadata: Dict[str, Any]):
+    noms = []
+    vus = set()
+    for ligne in lignes:
+        for nom in ligne:
+            if nom not in vus:
+                vus.add(nom)
+                noms.append(nom)
+
+    # Sections de données : (bytes) dans l'ordre d'écriture, positions relatives au début des données
+    sections = []
+    position = 0
+
+    def ajouter_section(donnees: bytes) -> Dict[str, int]:
+        nonlocal position
+        section = {"offset": position, "longueur": len(donnees)}
+        bourrage = -len(donnees) % ALIGNEMENT
+        sections.append(donnees + b'\x00' * bourrage)
+        position += len(donnees) + bourrage
+        return section
+
+    colonnes = []
+    for nom in noms:
+        valeurs = [ligne.get(nom) for ligne in lignes]
+        type_colonne = _type_colonne(valeurs)
+        colonne = {"nom": nom, "type": type_colonne}
+        if type_colonne == 'dictionnaire':
+            codes, distinctes = _encoder_dictionnaire(valeurs)
+            colonne["donnees"] = ajouter_section(codes.tobytes())
+            colonne["valeurs"] = ajouter_section(json.dumps(distinctes, ensure_ascii=False).encode('utf-8'))
+        else:
+            colonne["donnees"] = ajouter_section(array(type_colonne, valeurs).tobytes())
+        colonnes.append(colonne)
+
+    entete = json.dumps({
+        "version": VERSION,
+        "metadata": metadata,
+        "nb_lignes": len(lignes),
+        "ordre_octets": sys.byteorder,
+        "colonnes": colonnes,
+    }, ensure_ascii=False).encode('utf-8')
+    # Les données commencent sur une frontière d'alignement
+    entete += b' ' * (-(len(MAGIC) + 4 + len(entete)) % ALIGNEMENT)
+
+    f.write(MAGIC)
+    f.write(struct.pack('<I', len(entete)))
+    f.write(entete)
+    for section in sections:
+        f.write(section)
+
+
+def ecrire_hive(chemin: str, lignes: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None,
+                format_sortie: str = FORMAT_COLONNES):
+    """
+    Écrit un fichier .hive de façon atomique (fichier temporaire puis renommage)
+
+    Args:
+        chemin: Fichier de destination
+        lignes: Lignes brutes (dicts)
+        metadata: Métadonnées du fichier (société, date de génération...)
+        format_sortie: 'colonnes' (binaire colonnaire), 'ndjson' ou 'json' (format historique)
+    """
+    metadata = metadata or {}
+    temporaire = f"{chemin}.{os.getpid()}.tmp"
+    try:
+        if format_sortie == FORMAT_JSON:
+            with open(temporaire, 'w', encoding='utf-8') as f:
+                json.dump({"metadata": metadata, "donnees_brutes": {"lignes": lignes}}, f, ensure_ascii=False, indent=2)
+        elif format_sortie == FORMAT_NDJSON:
+            with open(temporaire, 'w', encoding='utf-8') as f:
+                _ecrire_entete_ndjson(f, metadata)
+                for ligne in lignes:
+                    _ecrire_ligne_ndjson(f, ligne)
+        elif format_sortie == FORMAT_COLONNES:
+            with open(temporaire, 'wb') as f:
+                _ecrire_colonnes(f, lignes, metadata)
+        else:
+            raise ValueError(f"Format de sortie inconnu : {format_sortie}")
+        os.replace(temporaire, chemin)
+    finally:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+
+
+def _ecrire_entete_ndjson(f, metadata: Dict[str, Any]):
+    f.write(json.dumps({"format": "hive-ndjson", "version": VERSION, "metadata": metadata}, ensure_ascii=False))
+    f.write('\n')
+
+
+def _ecrire_ligne_ndjson(f, ligne: Dict[str, Any]):
+    f.write(json.dumps(ligne, ensure_ascii=False))
+    f.write('\n')
+
+
+def _tronquer_ligne_incomplete(chemin: str):
+    """
+    Supprime une dernière ligne non terminée (écriture interrompue) avant un ajout
+    """
+    with open(chemin, 'rb+') as f:
+        fin = f.seek(0, os.SEEK_END)
+        position = fin
+        while position > 0:
+            debut = max(0, position - 4096)
+            f.seek(debut)
+            bloc = f.read(position - debut)
+            dernier = bloc.rfind(b'\n')
+            if dernier >= 0:
+                if debut + dernier + 1 < fin:
+                    f.truncate(debut + dernier + 1)
+                return
+            position = debut
+
+
+class EcrivainHive:
+    """
+    Écriture d'un fichier .hive ligne par ligne
+
+    Au format NDJSON, chaque ligne est écrite directement sur disque (mémoire constante) dans un
+    fichier temporaire renommé à la fermeture ; ajout=True complète un fichier NDJSON existant
+    sans réécrire son en-tête. Les formats colonnaire et JSON ont besoin de toutes les lignes :
+    elles sont conservées puis écrites (de façon atomique) à la fermeture.
+    Si une exception interrompt l'écriture (bloc with), le fichier existant est laissé intact :
+    rien n'est renommé, et un ajout est annulé en revenant à la taille d'origine.
+
+    Usage :
+        with EcrivainHive("rsp-bgs_data.hive", metadata, FORMAT_NDJSON) as ecrivain:
+            for ligne in lignes:
+                ecrivain.ecrire(ligne)
+    """
+
+    def __init__(self, chemin: str, metadata: Optional[Dict[str, Any]] = None,
+                 format_sortie: str = FORMAT_NDJSON, ajout: bool = False):
+        if format_sortie not in FORMATS:
+            raise ValueError(f"Format de sortie inconnu : {format_sortie}")
+        self.chemin = chemin
+        self.metadata = dict(metadata or {})
+        self.format_sortie = format_sortie
+        self.nb_lignes = 0
+        self._lignes = []
+        self._fichier = None
+        self._temporaire = None
+        self._taille_initiale = None
+        if format_sortie == FORMAT_NDJSON:
+            if ajout and os.path.exists(chemin):
+                if format_hive(chemin) != FORMAT_NDJSON:
+                    raise ValueError(f"{chemin} n'est pas un fichier .hive NDJSON : ajout impossible")
+                _tronquer_ligne_incomplete(chemin)
+                self._taille_initiale = os.path.getsize(chemin)
+                self._fichier = open(chemin, 'a', encoding='utf-8')
+            else:
+                self._temporaire = f"{chemin}.{os.getpid()}.tmp"
+                self._fichier = open(self._temporaire, 'w', encoding='utf-8')
+                _ecrire_entete_ndjson(self._fichier, self.metadata)
+        elif ajout:
+            raise ValueError("L'ajout à un fichier .hive n'est possible qu'au format ndjson")
+
+    def ecrire(self, ligne: Dict[str, Any]):
+        if self._fichier is not None:
+            _ecrire_ligne_ndjson(self._fichier, ligne)
+        else:
+            self._lignes.append(ligne)
+        self.nb_lignes += 1
+
+    def ecrire_lignes(self, lignes: Iterable[Dict[str, Any]]) -> int:
+        """
+        Écrit un flux de lignes et retourne le nombre de lignes écrites
+        """
+        nb_lignes = self.nb_lignes
+        for ligne in lignes:
+            self.ecrire(ligne)
+        return self.nb_lignes - nb_lignes
+
+    def close(self):
+        if self._fichier is not None:
+            self._fichier.close()
+            self._fichier = None
+            if self._temporaire is not None:
+                os.replace(self._temporaire, self.chemin)
+                self._temporaire = None
+        elif self._lignes is not None:
+            self.metadata.setdefault("total_lines", self.nb_lignes)
+            ecrire_hive(self.chemin, self._lignes, self.metadata, self.format_sortie)
+        self._lignes = None
+
+    def abandonner(self):
+        """
+        Annule l'écriture en cours : le fichier existant (ou son absence) est conservé tel quel
+        """
+        if self._fichier is not None:
+            self._fichier.close()
+            self._fichier = None
+            if self._temporaire is not None:
+                os.remove(self._temporaire)
+                self._temporaire = None
+            elif self._taille_initiale is not None:
+                with open(self.chemin, 'r+b') as f:
+                    f.truncate(self._taille_initiale)
+        self._lignes = None
+
+    def __enter__(self) -> 'EcrivainHive':
+        return self
+
+    def __exit__(self, type_exc, exc, tb):
+        if type_exc is not None:
+            # On n'écrit pas un fichier incomplet
+            self.abandonner()
+        else:
+            self.close()
+
+
+class ColonneDictionnaire:
+    """
+    Colonne encodée par dictionnaire : codes lus sans copie, valeurs décodées une fois
+    """
+
+    def __init__(self, codes: Sequence[int], valeurs: List[Any]):
+        self.codes = codes
+        self.valeurs = valeurs
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> Any:
+        code = self.codes[i]
+        return None if code < 0 else self.valeurs[code]
+
+    def __iter__(self) -> Iterator[Any]:
+        valeurs = self.valeurs
+        for code in self.codes:
+            yield None if code < 0 else valeurs[code]
+
+
+class HiveColonnaire:
+    """
+    Fichier .hive colonnaire ouvert par projection mémoire
+
+    Usage :
+        with HiveColonnaire("rsp-bgs_data.hive") as hive:
+            debits = hive.colonne("debit")   # memoryview 'd', sans copie
+    """
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        self._fichier = open(chemin, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._fichier.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Fichier vide
+            self._fichier.close()
+            raise ValueError(f"{chemin} n'est pas un fichier .hive colonnaire")
+        self._vues = []
+        try:
+            self._lire_entete()
+        except Exception:
+            self.close()
+            raise
+
+    def _lire_entete(self):
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.chemin} n'est pas un fichier .hive colonnaire")
+        (longueur,) = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        debut_entete = len(MAGIC) + 4
+        entete = json.loads(self._mmap[debut_entete:debut_entete + longueur].decode('utf-8'))
+        if entete.get("version") != VERSION:
+            raise ValueError(f"Version de format .hive non supportée : {entete.get('version')} (attendue : {VERSION})")
+        self.metadata = entete.get("metadata", {})
+        self.nb_lignes = entete["nb_lignes"]
+        self._ordre_natif = entete.get("ordre_octets") == sys.byteorder
+        self._colonnes = {colonne["nom"]: colonne for colonne in entete["colonnes"]}
+        self._debut_donnees = debut_entete + longueur
+
+    @property
+    def noms_colonnes(self) -> List[str]:
+        return list(self._colonnes)
+
+    def _section(self, section: Dict[str, int], type_valeurs: str):
+        debut = self._debut_donnees + section["offset"]
+        fin = debut + section["longueur"]
+        if not self._ordre_natif:
+            # Fichier écrit sur une machine d'autre boutisme : copie inversée
+            valeurs = array(type_valeurs, self._mmap[debut:fin])
+            valeurs.byteswap()
+            return valeurs
+        vue = memoryview(self._mmap)[debut:fin].cast(type_valeurs)
+        self._vues.append(vue)
+        return vue
+
+    def colonne(self, nom: str):
+        """
+        Colonne lue sans copie : memoryview pour les colonnes numériques,
+        ColonneDictionnaire pour les autres ; None si la colonne n'existe pas
+        """
+        colonne = self._colonnes.get(nom)
+        if colonne is None:
+            return None
+        if colonne["type"] == 'dictionnaire':
+            section = colonne["valeurs"]
+            debut = self._debut_donnees + section["offset"]
+            valeurs = json.loads(self._mmap[debut:debut + section["longueur"]].decode('utf-8'))
+            return ColonneDictionnaire(self._section(colonne["donnees"], 'i'), valeurs)
+        return self._section(colonne["donnees"], colonne["type"])
+
+    def lignes(self, colonnes: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Reconstruit les lignes (dicts) en ne lisant que les colonnes demandées (toutes par défaut)
+        """
+        noms = [nom for nom in (colonnes or self._colonnes) if nom in self._colonnes]
+        valeurs = [self.colonne(nom) for nom in noms]
+        for ligne in zip(*valeurs):
+            yield dict(zip(noms, ligne))
+
+    def close(self):
+        # Les vues sur la projection doivent être libérées avant de la fermer
+        for vue in self._vues:
+            vue.release()
+        self._vues = []
+        self._mmap.close()
+        self._fichier.close()
+
+    def __enter__(self) -> 'HiveColonnaire':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def lire_json(chemin: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Lit un fichier .hive JSON : (métadonnées, lignes brutes)
+    """
+    with open(chemin, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    # Extraire les données brutes selon la structure du fichier
+    if isinstance(data, dict) and 'donnees_brutes' in data:
+        if 'lignes' in data['donnees_brutes']:
+            # Structure avec lignes dans donnees_brutes
+            return data.get('metadata', {}), data['donnees_brutes']['lignes']
+        # Structure avec vues dans donnees_brutes
+        lignes = []
+        for vue, donnees in data['donnees_brutes'].items():
+            if isinstance(donnees, list):
+                lignes.extend(donnees)
+        return data.get('metadata', {}), lignes
+    # Structure simple (liste directe)
+    return {}, data if isinstance(data, list) else []
+
+
+def _iter_ndjson(f) -> Iterator[Dict[str, Any]]:
+    for ligne in f:
+        if not ligne.endswith('\n'):
+            # Dernière ligne non terminée (extraction interrompue) : ignorée
+            return
+        if ligne.strip():
+            yield json.loads(ligne)
+
+
+def lire_ndjson(chemin: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """
+    Ouvre un fichier .hive NDJSON : (métadonnées, itérateur paresseux sur les lignes)
+    """
+    f = open(chemin, 'r', encoding='utf-8')
+    try:
+        entete = json.loads(f.readline())
+    except Exception:
+        f.close()
+        raise
+    if entete.get("version") != VERSION:
+        f.close()
+        raise ValueError(f"Version de format .hive non supportée : {entete.get('version')} (attendue : {VERSION})")
+
+    def lignes():
+        with f:
+            yield from _iter_ndjson(f)
+
+    return entete.get("metadata", {}), lignes()
+
+
+def iter_lignes(chemin: str, colonnes: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lignes brutes d'un fichier .hive, quel que soit son format
+    Au format colonnaire, seules les colonnes demandées sont lues ; au format NDJSON
+    les lignes sont lues une à une ; au format JSON le fichier est chargé entièrement.
+    """
+    format_fichier = format_hive(chemin)
+    if format_fichier == FORMAT_COLONNES:
+        with HiveColonnaire(chemin) as hive:
+            yield from hive.lignes(colonnes)
+    elif format_fichier == FORMAT_NDJSON:
+        yield from lire_ndjson(chemin)[1]
+    else:
+        yield from lire_json(chemin)[1]
+
+
+def lire_hive(chemin: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Lit entièrement un fichier .hive, quel que soit son format : (métadonnées, lignes)
+    """
+    format_fichier = format_hive(chemin)
+    if format_fichier == FORMAT_COLONNES:
+        with HiveColonnaire(chemin) as hive:
+            return hive.metadata, list(hive.lignes())
+    if format_fichier == FORMAT_NDJSON:
+        metadata, lignes = lire_ndjson(chemin)
+        return metadata, list(lignes)
+    return lire_json(chemin)
+
+
+def arguments_format(parser: argparse.ArgumentParser, defaut: str = FORMAT_COLONNES):
+    """
+    Ajoute l'option --format des scripts de génération des fichiers .hive
+    """
+    parser.add_argument(
+        "--format", dest="format_sortie", choices=FORMATS, default=defaut,
+        help=f"Format des fichiers .hive générés (défaut : {defaut} ; ndjson est écrit en flux, json est l'export historique)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversion d'un fichier .hive entre les formats JSON et colonnaire")
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    arguments_format(parser)
+    args = parser.parse_args()
+    metadata, lignes = lire_hive(args.source)
+    ecrire_hive(args.destination, lignes, metadata, args.format_sortie)
+    print(f"✅ {len(lignes)} lignes écrites dans {args.destination} ({os.path.getsize(args.destination):,} bytes)")
@@ -0,0 +1,754 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline commun de conversion des fichiers hive par société en payloads JSON
+Un lecteur propre à chaque source (Navision, Odoo, Supabase) charge et enrichit les lignes ;
+elles sont parcourues une seule fois pour construire un cube par période (année, mois),
+à partir duquel les six payloads sont produits :
+    indicateurs_global_annee, indicateurs_mensuel_<annee>,
+    sous_indicateurs_global_annee, sous_indicateurs_mensuel_<annee>,
+    comptes_global_annee, comptes_mensuel_<annee>
+Le temps de conversion est linéaire en nombre de lignes. Un fichier .hive colonnaire
+(script/hive_format.py) est lu par projection mémoire, limité aux colonnes du lecteur.
+
+Plusieurs sociétés sont converties en parallèle (--workers) : chaque société est un shard
+traité par un ProcessPoolExecutor, qui lit son fichier une fois et en produit toutes les années,
+et les fichiers sont écrits de façon atomique.
+
+Un manifeste par société (manifest.json) enregistre l'empreinte des lignes de chaque année,
+la version des règles de calcul (mapping des comptes, formules SIG) et l'empreinte des
+fichiers produits : une année dont rien n'a changé n'est pas reconvertie. La régénération
+nocturne ne reconvertit ainsi que l'exercice ouvert (--forcer reconvertit tout).
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from hive_format import iter_lignes
+from models.PlanComptable import MappingIndex, MappingIndicateurSIG, TableComptes
+from models.SIG_cube import SIGCube
+from models.SIG_formules import FORMULES_SIG
+from models.SIG_model import SIGCalculator
+
+LIBELLES_INDICATEURS = {
+    'MC': 'Marge commerciale',
+    'VA': 'Valeur ajoutée',
+    'EBE': 'Excédent brut d\'exploitation',
+    'RE': 'Résultat d\'exploitation',
+    'R': 'Résultat net',
+}
+
+# Sous-indicateurs détaillés par compte dans les payloads comptes
+SOUS_INDICATEURS_COMPTES = [
+    "VENTES DE MARCHANDISES", "ACHATS DE MARCHANDISES", "PRESTATIONS DE SERVICES",
+    "FOURNITURES", "SERVICES EXTÉRIEURS", "CHARGES DE PERSONNEL", "IMPÔTS ET TAXES"
+]
+
+# Nombre d'années (les plus récentes) converties et nombre de comptes par sous-indicateur
+NB_ANNEES = 3
+LIMITE_COMPTES = 50
+
+# Manifeste de construction par société ; VERSION_PAYLOADS est à incrémenter dès que le format
+# ou le calcul des payloads change, pour que les années déjà construites soient reconverties
+FICHIER_MANIFESTE = 'manifest.json'
+VERSION_MANIFESTE = 1
+VERSION_PAYLOADS = 1
+# Champs d'une ligne couverts par l'empreinte d'entrée de son année
+CHAMPS_EMPREINTE = ('date_ecriture', 'code_compte', 'libelle_compte', 'montant', 'debit', 'credit', 'annee', 'mois')
+# Valeur vide de chaque clé d'une part annuelle des payloads globaux (voir payloads_annee)
+PARTS_VIDES = {"indicateurs": list, "sous_indicateurs": dict, "comptes": dict}
+
+
+class LecteurHive:
+    """
+    Lecteur de fichier hive : charge les lignes brutes et les enrichit au format commun
+    (code_compte, libelle_compte, montant, debit, credit, annee, mois, indicateur, sous_indicateur)
+    Les sous-classes adaptent normaliser() aux champs de leur source.
+    """
+
+    source = 'supabase'
+    # Sous-indicateurs des payloads indicateurs détaillés (libellé, initiales, formule) ;
+    # sinon seulement leur code (les payloads sous-indicateurs sont toujours détaillés)
+    detail_sous_indicateurs = True
+    # Une période sans indicateur est omise du payload au lieu d'y figurer vide
+    omettre_periodes_vides = False
+    # Les payloads de sous-indicateurs listent tous les indicateurs, même nuls
+    tous_les_indicateurs = False
+
+    # Colonnes brutes utilisées : seules celles-ci sont lues dans un fichier .hive colonnaire
+    colonnes = ('date_ecriture', 'code_compte', 'libelle_compte', 'montant', 'debit', 'credit')
+
+    def charger(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Lignes brutes du fichier hive d'une société (format colonnaire ou JSON)
+        """
+        return iter_lignes(file_path, self.colonnes)
+
+    @staticmethod
+    def dater(ligne: Dict[str, Any], date_ecriture: Optional[str]):
+        """
+        Renseigne annee, mois et trimestre à partir de la date d'écriture (None si absente ou invalide)
+        """
+        ligne['annee'] = ligne['mois'] = ligne['trimestre'] = None
+        if not date_ecriture:
+            return
+        try:
+            date_obj = datetime.datetime.fromisoformat(date_ecriture.replace('Z', '+00:00'))
+        except (AttributeError, ValueError):
+            return
+        ligne['annee'] = date_obj.year
+        ligne['mois'] = date_obj.month
+        ligne['trimestre'] = ((date_obj.month - 1) // 3) + 1
+
+    def normaliser(self, ligne: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Adapte une ligne brute au format commun (les lignes Supabase le sont déjà : enrichies en place)
+        """
+        self.dater(ligne, ligne.get('date_ecriture', ''))
+        return ligne
+
+    def lire(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Lignes enrichies du fichier hive, jointes à la table des comptes (mapping et classes)
+        """
+        for ligne in self.charger(file_path):
+            ligne_enrichie = self.normaliser(ligne)
+            compte = TableComptes.dimension(ligne_enrichie.get('code_compte', ''))
+            ligne_enrichie['classe'] = compte.classe
+            ligne_enrichie['sous_classe'] = compte.sous_classe
+            ligne_enrichie['sss_classe'] = compte.sss_classe
+            ligne_enrichie['indicateur'] = compte.indicateur or ''
+            ligne_enrichie['sous_indicateur'] = list(compte.sous_indicateurs)
+            yield ligne_enrichie
+
+
+class LecteurSupabase(LecteurHive):
+    source = 'supabase'
+
+
+class LecteurNavision(LecteurHive):
+    source = 'navision'
+    colonnes = ('date_ecriture', 'code_compte', 'description', 'montant', 'debit', 'credit')
+
+    def normaliser(self, ligne: Dict[str, Any]) -> Dict[str, Any]:
+        ligne_enrichie = {
+            'code_compte': ligne.get('code_compte', ''),
+            'libelle_compte': ligne.get('description', ''),
+            'montant': float(ligne.get('montant', 0)),
+            'debit': float(ligne.get('debit', 0)),
+            'credit': float(ligne.get('credit', 0)),
+            'date_ecriture': ligne.get('date_ecriture', ''),
+            'document_no': ligne.get('document', ''),
+            'user_id': ligne.get('utilisateur', ''),
+            'source_code': ligne.get('source', ''),
+            'global_dimension_1': ligne.get('dimension_1', ''),
+            'global_dimension_2': ligne.get('dimension_2', ''),
+        }
+        self.dater(ligne_enrichie, ligne_enrichie['date_ecriture'])
+        return ligne_enrichie
+
+
+class LecteurOdoo(LecteurHive):
+    source = 'odoo'
+    detail_sous_indicateurs = False
+    omettre_periodes_vides = True
+    tous_les_indicateurs = True
+    colonnes = ('date', 'annee', 'mois', 'code_compte', 'libelle_compte', 'montant', 'debit', 'credit')
+
+    def normaliser(self, ligne: Dict[str, Any]) -> Dict[str, Any]:
+        # Année et mois sont déjà calculés à la création du fichier hive Odoo
+        return {
+            'code_compte': ligne.get('code_compte', ''),
+            'libelle_compte': ligne.get('libelle_compte', ''),
+            'montant': float(ligne.get('montant', 0)),
+            'debit': float(ligne.get('debit', 0)),
+            'credit': float(ligne.get('credit', 0)),
+            'date_ecriture': ligne.get('date', ''),
+            'document_no': ligne.get('ref', ''),
+            'user_id': ligne.get('name', ''),
+            'source_code': ligne.get('move_id', ''),
+            'global_dimension_1': '',
+            'global_dimension_2': '',
+            'annee': ligne.get('annee'),
+            'mois': ligne.get('mois'),
+        }
+
+
+LECTEURS = {
+    'navision': LecteurNavision,
+    'odoo': LecteurOdoo,
+    'supabase': LecteurSupabase,
+}
+
+
+class CubePayload(SIGCube):
+    """
+    SIGCube complété, dans la même passe, des montants par compte et libellé
+    pour chaque année et chaque mois
+    """
+
+    def __init__(self, lignes=None):
+        # annee -> (code_compte, libelle_compte) -> [montant, debit, credit, sous_indicateurs]
+        self._comptes_annee = {}
+        # (annee, mois) -> (code_compte, libelle_compte) -> [montant, debit, credit, sous_indicateurs]
+        self._comptes_mois = {}
+        super().__init__(lignes)
+
+    def _ajouter_ligne(self, ligne: Dict[str, Any], annees_touchees):
+        super()._ajouter_ligne(ligne, annees_touchees)
+        annee = ligne.get('annee')
+        if annee is None:
+            return
+        cle = (ligne['code_compte'], ligne.get('libelle_compte', ''))
+        montant, debit, credit = ligne['montant'], ligne.get('debit', 0) or 0, ligne.get('credit', 0) or 0
+        for table in (self._comptes_annee.setdefault(annee, {}),
+                      self._comptes_mois.setdefault((annee, self.extraire_mois(ligne)), {})):
+            compte = table.get(cle)
+            if compte is None:
+                compte = table[cle] = [0, 0, 0, ligne['sous_indicateur']]
+            compte[0] += montant
+            compte[1] += debit
+            compte[2] += credit
+
+    def nb_lignes(self, annee: Optional[int] = None) -> int:
+        return sum(n for (a, _), n in self._nb_lignes.items() if annee is None or a == annee)
+
+    def comptes_libelles(self, annee: int, mois: Optional[int] = None) -> Dict[Tuple[Any, str], List[Any]]:
+        """
+        Montants par (code_compte, libelle_compte) d'une année ou d'un mois, dans l'ordre d'apparition
+        """
+        if mois is None:
+            return self._comptes_annee.get(annee, {})
+        return self._comptes_mois.get((annee, mois), {})
+
+
+def _sous_indicateur(composante: str, montant: float, detail: bool = True) -> Dict[str, Any]:
+    if detail:
+        return {
+            "sousIndicateur": composante,
+            "libelle": MappingIndicateurSIG.get_libelle(composante),
+            "initiales": MappingIndicateurSIG.get_initiales(composante),
+            "formule": MappingIndicateurSIG.get_formule(composante),
+            "montant": montant
+        }
+    return {"sous_indicateur": composante, "montant": montant}
+
+def indicateurs_periode(lecteur: LecteurHive, calculator: SIGCalculator) -> List[Dict[str, Any]]:
+    """
+    Indicateurs non nuls d'une période, avec formules et sous-indicateurs
+    """
+    indicateurs_list = []
+    for code, libelle in LIBELLES_INDICATEURS.items():
+        resultat = calculator.evaluate(code)
+        # Valeur exacte ; l'indicateur est ignoré s'il est nul au centime près
+        if resultat.est_nul:
+            continue
+        indicateurs_list.append({
+            "indicateur": code,
+            "libelle": libelle,
+            "valeur": resultat.valeur,
+            "formule_text": resultat.formule_text,
+            "formule_numeric": resultat.formule_numeric,
+            "sous_indicateurs": [
+                _sous_indicateur(c, m, lecteur.detail_sous_indicateurs) for c, m in resultat.sous_indicateurs()
+            ]
+        })
+    return indicateurs_list
+
+def sous_indicateurs_periode(lecteur: LecteurHive, calculator: SIGCalculator) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Sous-indicateurs de chaque indicateur d'une période
+    """
+    sous_indicateurs = {}
+    for code in LIBELLES_INDICATEURS:
+        resultat = calculator.evaluate(code)
+        if resultat.est_nul and not lecteur.tous_les_indicateurs:
+            continue
+        sous_indicateurs[code] = [_sous_indicateur(c, m) for c, m in resultat.sous_indicateurs()]
+    return sous_indicateurs
+
+def comptes_periode(cube: CubePayload, annee: int, mois: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Comptes de chaque sous-indicateur détaillé pour une période (LIMITE_COMPTES comptes au plus)
+    """
+    comptes = cube.comptes_libelles(annee, mois)
+    comptes_result = {}
+    for sous_indicateur in SOUS_INDICATEURS_COMPTES:
+        cible = sous_indicateur.strip().lower()
+        comptes_list = [
+            {
+                "code_compte": code_compte,
+                "libelle_compte": libelle_compte,
+                "montant": montant,
+                "debit": debit,
+                "credit": credit
+            }
+            for (code_compte, libelle_compte), (montant, debit, credit, sous_indicateurs) in comptes.items()
+            if any(cible == si.strip().lower() for si in sous_indicateurs)
+        ]
+        if comptes_list:
+            comptes_result[sous_indicateur] = {
+                "total": len(comptes_list),
+                "limit": LIMITE_COMPTES,
+                "offset": 0,
+                "comptes": comptes_list[:LIMITE_COMPTES]
+            }
+    return comptes_result
+
+def _ajouter_periode(result: Dict, cle: int, valeur, omettre: bool):
+    if valeur or not omettre:
+        result[cle] = valeur
+
+def annees_converties(cube: CubePayload) -> List[int]:
+    """
+    Années converties : les NB_ANNEES plus récentes
+    """
+    return [annee for annee in cube.annees() if annee][:NB_ANNEES]
+
+def payloads_annee(lecteur: LecteurHive, cube: CubePayload, annee: int) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Produit les payloads mensuels d'une année et sa part des payloads globaux
+
+    Returns:
+        (part globale {"indicateurs", "sous_indicateurs", "comptes"}, nom de fichier -> payload mensuel)
+    """
+    omettre = lecteur.omettre_periodes_vides
+    calculator = cube.calculateur(annee)
+    globaux = {
+        "indicateurs": indicateurs_periode(lecteur, calculator),
+        "sous_indicateurs": sous_indicateurs_periode(lecteur, calculator),
+        "comptes": comptes_periode(cube, annee),
+    }
+
+    indicateurs_mois = {}
+    sous_indicateurs_mois = {}
+    comptes_mois = {}
+    for mois in cube.mois_disponibles(annee):
+        calculator_mois = cube.calculateur(annee, mois=mois)
+        _ajouter_periode(indicateurs_mois, mois, indicateurs_periode(lecteur, calculator_mois), omettre)
+        _ajouter_periode(sous_indicateurs_mois, mois, sous_indicateurs_periode(lecteur, calculator_mois), omettre)
+        comptes_du_mois = comptes_periode(cube, annee, mois)
+        if comptes_du_mois:
+            comptes_mois[mois] = comptes_du_mois
+    mensuels = {
+        f"indicateurs_mensuel_{annee}": {"annee": annee, "mois": indicateurs_mois},
+        f"sous_indicateurs_mensuel_{annee}": {"annee": annee, "mois": sous_indicateurs_mois},
+        f"comptes_mensuel_{annee}": {"annee": annee, "mois": comptes_mois},
+    }
+    return globaux, mensuels
+
+def assembler_globaux(lecteur: LecteurHive, parts: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Assemble les payloads globaux à partir des parts annuelles (de la plus récente à la plus ancienne)
+    """
+    omettre = lecteur.omettre_periodes_vides
+    indicateurs = {}
+    sous_indicateurs = {}
+    comptes = {}
+    for annee, globaux in parts:
+        _ajouter_periode(indicateurs, annee, globaux["indicateurs"], omettre)
+        _ajouter_periode(sous_indicateurs, annee, globaux["sous_indicateurs"], omettre)
+        if globaux["comptes"]:
+            comptes[annee] = globaux["comptes"]
+    return {
+        "indicateurs_global_annee": {"periode": "annee", "indicateurs": indicateurs},
+        "sous_indicateurs_global_annee": {"periode": "annee", "sous_indicateurs": sous_indicateurs},
+        "comptes_global_annee": {"periode": "annee", "comptes": comptes},
+    }
+
+def generer_payloads(lecteur: LecteurHive, cube: CubePayload) -> Dict[str, Dict[str, Any]]:
+    """
+    Produit les six payloads d'une société à partir du cube
+
+    Returns:
+        Nom de fichier (sans extension) -> payload
+    """
+    parts = []
+    mensuels = {}
+    for annee in annees_converties(cube):
+        globaux, mensuels_annee = payloads_annee(lecteur, cube, annee)
+        parts.append((annee, globaux))
+        mensuels.update(mensuels_annee)
+    payloads = assembler_globaux(lecteur, parts)
+    payloads.update(mensuels)
+    return payloads
+
+def ecrire_json(chemin: str, payload: Dict[str, Any]) -> str:
+    """
+    Écrit un payload de façon atomique : fichier temporaire dans le même dossier, puis renommage
+    (un lecteur ne voit jamais de fichier partiel, et l'ancien fichier reste intact en cas d'erreur)
+
+    Returns:
+        Empreinte sha256 du fichier écrit
+    """
+    contenu = json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8')
+    temporaire = f"{chemin}.{os.getpid()}.tmp"
+    try:
+        with open(temporaire, 'wb') as f:
+            f.write(contenu)
+        os.replace(temporaire, chemin)
+    finally:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+    return hashlib.sha256(contenu).hexdigest()
+
+def empreinte_fichier(chemin: str) -> Optional[str]:
+    """
+    Empreinte sha256 d'un fichier, ou None s'il n'existe pas
+    """
+    try:
+        with open(chemin, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def version_calcul(lecteur: LecteurHive) -> str:
+    """
+    Version des règles de calcul des payloads : mapping des comptes, formules SIG,
+    format des payloads et source du lecteur
+    """
+    regles = {
+        "mapping": MappingIndex.version(),
+        "formules": FORMULES_SIG,
+        "payloads": VERSION_PAYLOADS,
+        "source": lecteur.source,
+    }
+    return hashlib.sha256(json.dumps(regles, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class EmpreintesAnnees:
+    """
+    Empreintes d'entrée par année, calculées au fil de la lecture (sans seconde passe sur le fichier)
+    L'empreinte d'une année couvre ses lignes, dans l'ordre du fichier, et la version des règles de calcul.
+    """
+
+    def __init__(self, version: str):
+        self.version = version.encode('utf-8')
+        self._hashes = {}
+
+    def suivre(self, lignes: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Transmet les lignes en mettant à jour l'empreinte de leur année
+        """
+        hashes = self._hashes
+        for ligne in lignes:
+            annee = ligne.get('annee')
+            if annee:
+                h = hashes.get(annee)
+                if h is None:
+                    h = hashes[annee] = hashlib.sha256(self.version)
+                h.update(repr(tuple(ligne.get(champ) for champ in CHAMPS_EMPREINTE)).encode('utf-8'))
+            yield ligne
+
+    def empreintes(self) -> Dict[int, str]:
+        """
+        Année -> empreinte, pour les NB_ANNEES années les plus récentes
+        """
+        annees = sorted(self._hashes, reverse=True)[:NB_ANNEES]
+        return {annee: self._hashes[annee].hexdigest() for annee in annees}
+
+
+class Manifeste:
+    """
+    Manifeste de construction d'une société (<output_dir>/<societe>/manifest.json)
+    Pour chaque année : empreinte d'entrée et empreintes des payloads mensuels écrits ;
+    pour les payloads globaux : empreintes d'entrée des années assemblées et des fichiers écrits.
+    Le manifeste n'est réécrit qu'une fois les payloads globaux à jour.
+    """
+
+    def __init__(self, societe_dir: str):
+        self.societe_dir = societe_dir
+        self.chemin = os.path.join(societe_dir, FICHIER_MANIFESTE)
+        self.annees = {}
+        self.globaux = {}
+        try:
+            with open(self.chemin, encoding='utf-8') as f:
+                contenu = json.load(f)
+            if contenu.get("version") == VERSION_MANIFESTE:
+                self.annees = contenu.get("annees", {})
+                self.globaux = contenu.get("globaux", {})
+        except (OSError, ValueError):
+            pass
+        self.globaux_intacts = self.intact(self.globaux.get("sorties"))
+
+    def intact(self, sorties: Optional[Dict[str, str]]) -> bool:
+        """
+        Vrai si tous les fichiers enregistrés existent avec leur empreinte
+        """
+        if not sorties:
+            return False
+        return all(
+            empreinte_fichier(os.path.join(self.societe_dir, f"{nom}.json")) == empreinte
+            for nom, empreinte in sorties.items()
+        )
+
+    def annee_a_jour(self, annee: int, empreinte: str) -> bool:
+        """
+        Vrai si l'année a les mêmes entrées qu'à la dernière construction et que ses payloads,
+        mensuels et globaux, sont intacts
+        """
+        entree = self.annees.get(str(annee), {})
+        return (
+            entree.get("entree") == empreinte
+            and self.globaux.get("annees", {}).get(str(annee)) == empreinte
+            and self.globaux_intacts
+            and self.intact(entree.get("sorties"))
+        )
+
+    def globaux_a_jour(self, empreintes: Dict[int, str]) -> bool:
+        return self.globaux_intacts and self.globaux.get("annees") == {str(a): e for a, e in empreintes.items()}
+
+    def enregistrer_annee(self, annee: int, empreinte: str, sorties: Dict[str, str]):
+        self.annees[str(annee)] = {"entree": empreinte, "sorties": sorties}
+
+    def enregistrer_globaux(self, empreintes: Dict[int, str], sorties: Dict[str, str]):
+        self.globaux = {"annees": {str(a): e for a, e in empreintes.items()}, "sorties": sorties}
+        self.globaux_intacts = True
+
+    def sauvegarder(self):
+        """
+        Écrit le manifeste (les années qui ne sont plus converties en sont retirées)
+        """
+        annees = self.globaux.get("annees", {})
+        ecrire_json(self.chemin, {
+            "version": VERSION_MANIFESTE,
+            "annees": {annee: entree for annee, entree in self.annees.items() if annee in annees},
+            "globaux": self.globaux,
+        })
+
+
+def parts_existantes(societe_dir: str, annees: List[int]) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Relit dans les payloads globaux existants la part des années non reconverties
+    La valeur enregistrée est reprise telle quelle ; une période absente d'un payload (omise ou vide)
+    donne la valeur vide du type produit par payloads_annee (liste d'indicateurs, dictionnaires sinon).
+    """
+    if not annees:
+        return []
+    payloads = {}
+    for cle in PARTS_VIDES:
+        with open(os.path.join(societe_dir, f"{cle}_global_annee.json"), encoding='utf-8') as f:
+            payloads[cle] = json.load(f)[cle]
+    return [
+        (annee, {cle: valeurs[str(annee)] if str(annee) in valeurs else PARTS_VIDES[cle]()
+                 for cle, valeurs in payloads.items()})
+        for annee in annees
+    ]
+
+def planifier(manifeste: Manifeste, empreintes: Dict[int, str], forcer: bool = False) -> Tuple[List[int], List[int]]:
+    """
+    Sépare les années à convertir de celles dont les entrées et les payloads sont inchangés
+
+    Returns:
+        (années à convertir, années ignorées), de la plus récente à la plus ancienne
+    """
+    annees = sorted(empreintes, reverse=True)
+    if forcer:
+        return annees, []
+    ignorees = [annee for annee in annees if manifeste.annee_a_jour(annee, empreintes[annee])]
+    return [annee for annee in annees if annee not in ignorees], ignorees
+
+def finaliser_societe(lecteur: LecteurHive, manifeste: Manifeste, empreintes: Dict[int, str],
+                      parts: List[Tuple[int, Dict[str, Any]]], ignorees: List[int]) -> bool:
+    """
+    Écrit les payloads globaux d'une société à partir des parts reconverties et de celles
+    des années ignorées, puis le manifeste ; rien n'est écrit si tout est à jour
+
+    Returns:
+        True si les payloads globaux ont été réécrits
+    """
+    if not parts and manifeste.globaux_a_jour(empreintes):
+        return False
+    societe_dir = manifeste.societe_dir
+    parts = sorted(parts + parts_existantes(societe_dir, ignorees), key=lambda part: part[0], reverse=True)
+    sorties = {
+        nom: ecrire_json(os.path.join(societe_dir, f"{nom}.json"), payload)
+        for nom, payload in assembler_globaux(lecteur, parts).items()
+    }
+    manifeste.enregistrer_globaux(empreintes, sorties)
+    manifeste.sauvegarder()
+    return True
+
+def convertir_societe(lecteur: LecteurHive, societe: str, hive_file_path: str, output_dir: str = "payloads",
+                      forcer: bool = False, verbeux: bool = True) -> List[Dict[str, Any]]:
+    """
+    Convertit le fichier hive d'une société en payloads JSON (une lecture, une passe d'agrégation)
+    Les années dont les entrées sont inchangées depuis la dernière construction ne sont pas
+    reconverties (forcer=True ignore le manifeste).
+
+    Returns:
+        Résumé par année (societe, annee, lecture, et lignes, fichiers, duree, ou ignore) ;
+        lecture est la durée de lecture et d'agrégation du fichier, commune aux années de la société,
+        duree celle de la génération et de l'écriture des payloads de l'année
+    """
+    afficher = print if verbeux else (lambda *args: None)
+    societe_dir = os.path.join(output_dir, societe)
+    os.makedirs(societe_dir, exist_ok=True)
+
+    afficher(f"📊 Conversion de {societe} ({lecteur.source})...")
+    afficher(f"📁 Fichier source: {hive_file_path}")
+    afficher(f"📁 Dossier de sortie: {societe_dir}")
+
+    debut = time.perf_counter()
+    manifeste = Manifeste(societe_dir)
+    suivi = EmpreintesAnnees(version_calcul(lecteur))
+    cube = CubePayload(suivi.suivre(lecteur.lire(hive_file_path)))
+    lecture = time.perf_counter() - debut
+    afficher(f"📊 {cube.nb_lignes()} lignes datées agrégées en {lecture:.2f} s")
+    empreintes = suivi.empreintes()
+    a_convertir, ignorees = planifier(manifeste, empreintes, forcer)
+
+    afficher("📝 Génération des payloads...")
+    resume = []
+    parts = []
+    for annee in a_convertir:
+        debut = time.perf_counter()
+        globaux, mensuels = payloads_annee(lecteur, cube, annee)
+        parts.append((annee, globaux))
+        sorties = {}
+        for nom, payload in mensuels.items():
+            sorties[nom] = ecrire_json(os.path.join(societe_dir, f"{nom}.json"), payload)
+            afficher(f"✓ Payload {nom} généré")
+        manifeste.enregistrer_annee(annee, empreintes[annee], sorties)
+        resume.append({
+            "societe": societe,
+            "annee": annee,
+            "lecture": lecture,
+            "lignes": cube.nb_lignes(annee),
+            "fichiers": len(mensuels),
+            "duree": time.perf_counter() - debut,
+        })
+    for annee in ignorees:
+        afficher(f"⏭️  Payloads {annee} inchangés")
+        resume.append({"societe": societe, "annee": annee, "lecture": lecture, "ignore": True})
+
+    if finaliser_societe(lecteur, manifeste, empreintes, parts, ignorees):
+        afficher("✓ Payloads globaux générés")
+    else:
+        afficher("⏭️  Payloads globaux inchangés")
+
+    afficher(f"✅ Conversion terminée pour {societe} !")
+    return resume
+
+def convertir_societes_parallele(lecteur: LecteurHive, societes: List[str], output_dir: str, workers: Optional[int] = None,
+                                 forcer: bool = False) -> List[Dict[str, Any]]:
+    """
+    Convertit plusieurs sociétés en parallèle, un shard par société dans un ProcessPoolExecutor
+    Chaque fichier hive n'est lu qu'une fois : le shard agrège ses lignes dans un cube, d'où sont
+    produites toutes ses années, et en calcule les empreintes pendant la même lecture.
+    Les années dont les entrées sont inchangées depuis la dernière construction ne sont pas reconverties ;
+    si une société échoue, ses anciens payloads globaux et son ancien manifeste sont conservés.
+
+    Returns:
+        Résumé par année (voir convertir_societe), ou par société en erreur (societe, erreur)
+    """
+    resume = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(convertir_societe, lecteur, societe, f"{societe}_data.hive", output_dir, forcer, False): societe
+            for societe in societes
+        }
+        for future in as_completed(futures):
+            societe = futures[future]
+            try:
+                resume_societe = future.result()
+            except Exception as e:
+                resume.append({"societe": societe, "erreur": str(e)})
+                print(f"❌ Erreur lors de la conversion {societe}: {e}")
+                continue
+            resume.extend(resume_societe)
+            converties = [shard for shard in resume_societe if not shard.get("ignore")]
+            if converties:
+                lecture = resume_societe[0]["lecture"]
+                generation = sum(shard["duree"] for shard in converties)
+                print(f"✅ Conversion {societe} terminée avec succès : {len(converties)} année(s) reconverties, "
+                      f"lecture {lecture:.2f} s, génération {generation:.2f} s")
+            else:
+                print(f"⏭️  {societe} inchangée")
+    return resume
+
+def convertir_societes(lecteur: LecteurHive, societes: List[str], output_dir: str, workers: Optional[int] = None,
+                       forcer: bool = False):
+    """
+    Convertit les fichiers hive <societe>_data.hive du répertoire courant
+    workers=1 convertit en série dans le processus courant ; sinon un pool de workers
+    processus (par défaut un par cœur) convertit les sociétés, une par processus.
+    Les années inchangées depuis la dernière construction sont ignorées, sauf avec forcer=True.
+    """
+    print(f"🔄 Conversion de tous les fichiers hive par société ({lecteur.source})")
+    print("=" * 50)
+
+    presentes = []
+    for societe in societes:
+        if os.path.exists(f"{societe}_data.hive"):
+            presentes.append(societe)
+        else:
+            print(f"⚠️  Fichier {societe}_data.hive non trouvé")
+
+    debut = time.perf_counter()
+    if workers == 1:
+        resume = []
+        for societe in presentes:
+            print(f"\n📊 Conversion de {societe}...")
+            try:
+                resume.extend(convertir_societe(lecteur, societe, f"{societe}_data.hive", output_dir, forcer))
+                print(f"✅ Conversion {societe} terminée avec succès !")
+            except Exception as e:
+                resume.append({"societe": societe, "erreur": str(e)})
+                print(f"❌ Erreur lors de la conversion {societe}: {e}")
+    else:
+        resume = convertir_societes_parallele(lecteur, presentes, output_dir, workers, forcer)
+    print("\n⏱️  Résumé par société et par année (lecture : lecture et agrégation du fichier, "
+          "génération : calcul et écriture des payloads de l'année):")
+    societe_courante = None
+    for shard in sorted(resume, key=lambda s: (s["societe"], -s.get("annee", 0))):
+        if "erreur" in shard:
+            print(f"  {shard['societe']:<15} ❌ {shard['erreur']}")
+            continue
+        if shard["societe"] != societe_courante:
+            societe_courante = shard["societe"]
+            print(f"  {societe_courante:<15} lecture {shard['lecture']:>7.2f} s")
+        if shard.get("ignore"):
+            print(f"  {'':<15} {shard['annee']}  ⏭️  inchangé, non reconverti")
+        else:
+            print(f"  {'':<15} {shard['annee']}  {shard['lignes']:>9} lignes  génération {shard['duree']:>7.2f} s")
+    annees = [shard for shard in resume if "erreur" not in shard]
+    ignores = sum(1 for shard in annees if shard.get("ignore"))
+    print(f"⏭️  Années ignorées: {ignores}/{len(annees)}")
+    print(f"⏱️  Durée totale: {time.perf_counter() - debut:.2f} s")
+
+    print("\n" + "=" * 50)
+    print("📁 Structure des fichiers générés:")
+
+    for societe in presentes:
+        societe_dir = os.path.join(output_dir, societe)
+        if os.path.exists(societe_dir):
+            print(f"\n📂 Dossier {societe}:")
+            for file in os.listdir(societe_dir):
+                if file.endswith('.json'):
+                    size = os.path.getsize(os.path.join(societe_dir, file))
+                    print(f"  📄 {file} ({size:,} bytes)")
+
+    print("\n🎉 Conversion terminée !")
+    print("\n💡 Utilisation dans Flutter:")
+    print(f"   - Accédez aux données par société: {output_dir}/{societes[0]}/")
+    print("   - Même format que les webservices")
+
+def arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Options en ligne de commande des scripts de conversion
+    """
+    parser = argparse.ArgumentParser(description="Conversion des fichiers hive par société en payloads JSON")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Nombre de processus (défaut : un par cœur ; 1 pour une conversion en série)"
+    )
+    parser.add_argument(
+        "--forcer", action="store_true",
+        help="Reconvertit toutes les années sans tenir compte du manifeste de construction"
+    )
+    return parser.parse_args(argv)
@@ -4,6 +4,7 @@ from pydantic import BaseModel
 from routes.odoo_routes import odoo_router
 from routes.navision_routes import navision_router
 from routes.file_routes import file_router
+from services.navision.navision_api_async import get_async_navision_service
 import json
 import locale
 import os
@@ -40,6 +41,11 @@ app.include_router(odoo_router)
 app.include_router(navision_router)
 app.include_router(file_router)
 
+@app.on_event("shutdown")
+async def fermer_clients_http():
+    # Ferme proprement les connexions keep-alive du client httpx partagé
+    await get_async_navision_service().aclose()
+
 @app.get("/")
 def root():
     return {
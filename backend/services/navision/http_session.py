@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Session HTTP partagée pour l'accès à Supabase (PostgREST)
+Une seule requests.Session par processus : connexions keep-alive réutilisées, pool dimensionnable,
+gzip, timeouts et retries bornés avec backoff (lectures et RPC en lecture seule uniquement). Les latences par requête sont relevées dans un histogramme.
+"""
+
+import os
+import threading
+from dotenv import load_dotenv
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+load_dotenv()
+
+POOL_SIZE = int(os.getenv("NAVISION_HTTP_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("NAVISION_HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("NAVISION_HTTP_READ_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("NAVISION_HTTP_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("NAVISION_HTTP_BACKOFF", "0.5"))
+
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+
+class LatencyHistogram:
+    """
+    Histogramme des latences HTTP (en millisecondes) par méthode
+    """
+
+    BORNES_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def enregistrer(self, methode: str, duree_ms: float):
+        with self._lock:
+            serie = self._series.get(methode)
+            if serie is None:
+                serie = self._series[methode] = {
+                    "compteurs": [0] * (len(self.BORNES_MS) + 1),
+                    "nombre": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                }
+            index = len(self.BORNES_MS)
+            for i, borne in enumerate(self.BORNES_MS):
+                if duree_ms <= borne:
+                    index = i
+                    break
+            serie["compteurs"][index] += 1
+            serie["nombre"] += 1
+            serie["total_ms"] += duree_ms
+            serie["max_ms"] = max(serie["max_ms"], duree_ms)
+
+    def snapshot(self):
+        """
+        Retourne l'état de l'histogramme au format JSON
+        """
+        etiquettes = [f"<={b}ms" for b in self.BORNES_MS] + [f">{self.BORNES_MS[-1]}ms"]
+        with self._lock:
+            return {
+                methode: {
+                    "nombre": serie["nombre"],
+                    "moyenne_ms": round(serie["total_ms"] / serie["nombre"], 2) if serie["nombre"] else 0,
+                    "max_ms": round(serie["max_ms"], 2),
+                    "histogramme": dict(zip(etiquettes, serie["compteurs"])),
+                }
+                for methode, serie in self._series.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+
+latences = LatencyHistogram()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _adapter(methodes) -> HTTPAdapter:
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset(methodes),
+        respect_retry_after_header=True,
+    )
+    return HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+
+def _creer_session() -> requests.Session:
+    session = requests.Session()
+    # Retries réservés aux méthodes idempotentes : un POST d'insertion rejoué après un timeout
+    # de lecture ou une 5xx pourrait dupliquer des lignes
+    adapter = _adapter(["GET", "HEAD"])
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Les fonctions /rpc/ appelées ici sont en lecture seule (sig_agregats_*) : leurs POST sont rejoués
+    supabase_url = os.getenv("SUPABASE_URL")
+    if supabase_url:
+        session.mount(f"{supabase_url.rstrip('/')}/rest/v1/rpc/", _adapter(["GET", "HEAD", "POST"]))
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+    session.hooks["response"].append(_mesurer_latence)
+    return session
+
+
+def _mesurer_latence(response, *args, **kwargs):
+    latences.enregistrer(response.request.method, response.elapsed.total_seconds() * 1000)
+
+
+def get_session() -> requests.Session:
+    """
+    Retourne la session HTTP partagée du processus (créée au premier appel)
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _creer_session()
+    return _session
+
+
+def stats():
+    """
+    Statistiques de la session partagée : configuration du pool et latences par méthode
+    """
+    return {
+        "pool_size": POOL_SIZE,
+        "timeout": {"connect": CONNECT_TIMEOUT, "read": READ_TIMEOUT},
+        "max_retries": MAX_RETRIES,
+        "latences": latences.snapshot(),
+    }
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Instantané local du grand livre d'une vue Navision, synchronisé de façon incrémentale
+On conserve les lignes enrichies (LedgerBatch compact) et un SIGCube, ainsi que le plus grand id déjà lu (high-water mark).
+Une synchronisation ne récupère que les lignes id=gt.<mark> et les applique au cube comme des deltas :
+son coût dépend du nombre de nouvelles écritures, pas de l'historique.
+
+Les écritures validées Navision ne sont jamais modifiées (une correction est une nouvelle écriture) ;
+NAVISION_SYNC_MODE=full revient au rechargement complet à chaque requête.
+Les instantanés restent en mémoire du processus : leur nombre est borné (éviction LRU,
+NAVISION_SNAPSHOT_MAX_VUES) et un instantané inutilisé depuis NAVISION_SNAPSHOT_TTL secondes est libéré.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from models.SIG_cube import SIGCube
+from models.ledger_batch import LedgerBatch
+
+load_dotenv()
+
+SYNC_MODE = os.getenv("NAVISION_SYNC_MODE", "incremental").lower()
+# Intervalle minimal (en secondes) entre deux synchronisations d'une même vue
+SYNC_INTERVAL = float(os.getenv("NAVISION_SYNC_INTERVAL", "30"))
+# Nombre maximal d'instantanés conservés et durée (en secondes) au-delà de laquelle
+# un instantané non consulté est libéré (0 : pas d'expiration)
+MAX_VUES = int(os.getenv("NAVISION_SNAPSHOT_MAX_VUES", "8"))
+SNAPSHOT_TTL = float(os.getenv("NAVISION_SNAPSHOT_TTL", "3600"))
+
+
+class LedgerSnapshot:
+    def __init__(self, vue: str):
+        self.vue = vue
+        self.lignes = LedgerBatch()
+        self.cube = SIGCube()
+        self.high_water_mark = None
+        self.derniere_synchro = None
+        self.nb_synchros = 0
+        self.lignes_derniere_synchro = 0
+        self.dernier_acces = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def appliquer(self, page: List[Dict[str, Any]]):
+        """
+        Applique une page de nouvelles lignes enrichies : ajout aux lignes, deltas sur le cube
+        et avancement du high-water mark
+        """
+        if not page:
+            return
+        self.lignes.etendre(page)
+        self.cube.ajouter_lignes(page)
+        mark = max(l['id'] for l in page)
+        if self.high_water_mark is None or mark > self.high_water_mark:
+            self.high_water_mark = mark
+
+    async def synchroniser(self, controller, intervalle: Optional[float] = None):
+        """
+        Récupère les lignes postérieures au high-water mark, au plus une fois par intervalle
+        (les requêtes concurrentes attendent la synchronisation en cours)
+        """
+        intervalle = SYNC_INTERVAL if intervalle is None else intervalle
+        async with self._get_lock():
+            if self.derniere_synchro is not None and time.monotonic() - self.derniere_synchro < intervalle:
+                return
+            nb_lignes = 0
+            async for page in controller.iter_pages_async("annee", apres=self.high_water_mark):
+                self.appliquer(page)
+                nb_lignes += len(page)
+            self.derniere_synchro = time.monotonic()
+            self.nb_synchros += 1
+            self.lignes_derniere_synchro = nb_lignes
+
+    def stats(self):
+        return {
+            "lignes": len(self.lignes),
+            "octets": self.lignes.nb_octets(),
+            "high_water_mark": self.high_water_mark,
+            "synchros": self.nb_synchros,
+            "lignes_derniere_synchro": self.lignes_derniere_synchro,
+        }
+
+
+# Vue -> instantané, du moins récemment consulté au plus récent
+_snapshots = OrderedDict()
+_snapshots_lock = threading.Lock()
+
+def _expirer(maintenant: float):
+    while _snapshots and SNAPSHOT_TTL > 0:
+        vue, snapshot = next(iter(_snapshots.items()))
+        if maintenant - snapshot.dernier_acces <= SNAPSHOT_TTL:
+            break
+        del _snapshots[vue]
+
+def get_snapshot(vue: str) -> LedgerSnapshot:
+    """
+    Retourne l'instantané d'une vue (créé vide au premier appel) ; les instantanés expirés
+    puis les moins récemment consultés au-delà de MAX_VUES sont libérés
+    """
+    maintenant = time.monotonic()
+    with _snapshots_lock:
+        _expirer(maintenant)
+        snapshot = _snapshots.get(vue)
+        if snapshot is None:
+            snapshot = _snapshots[vue] = LedgerSnapshot(vue)
+        _snapshots.move_to_end(vue)
+        snapshot.dernier_acces = maintenant
+        while len(_snapshots) > MAX_VUES:
+            _snapshots.popitem(last=False)
+    return snapshot
+
+def stats():
+    return {
+        "mode": SYNC_MODE,
+        "intervalle": SYNC_INTERVAL,
+        "max_vues": MAX_VUES,
+        "ttl": SNAPSHOT_TTL,
+        "vues": {vue: snapshot.stats() for vue, snapshot in list(_snapshots.items())},
+    }
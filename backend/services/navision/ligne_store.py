@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Stockage partagé des lignes enrichies, indexé par (vue, filtre de période)
+Les requêtes simultanées sur la même clé partagent un seul appel Supabase en cours (single-flight),
+et les requêtes rapprochées réutilisent le résultat pendant LIGNE_STORE_TTL secondes.
+Le nombre total de lignes conservées est plafonné (LIGNE_STORE_MAX_LIGNES), avec éviction LRU.
+Les lignes retournées sont partagées entre requêtes : elles doivent être traitées en lecture seule.
+Le chargement tourne dans une tâche propre au stockage : l'annulation d'une requête (client
+déconnecté, timeout) n'interrompt pas le chargement attendu par les autres.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_LIGNES = int(os.getenv("LIGNE_STORE_MAX_LIGNES", "500000"))
+TTL = float(os.getenv("LIGNE_STORE_TTL", "60"))
+
+
+class LigneStore:
+    def __init__(self, max_lignes: int = MAX_LIGNES, ttl: float = TTL):
+        self.max_lignes = max_lignes
+        self.ttl = ttl
+        # cle -> (lignes, expiration)
+        self._entrees = OrderedDict()
+        # cle -> tâche du chargement en cours (propriété du stockage, attendue via shield)
+        self._en_cours = {}
+        self._nb_lignes = 0
+        self.hits = 0
+        self.misses = 0
+        self.partages = 0
+
+    @property
+    def actif(self) -> bool:
+        return self.max_lignes > 0
+
+    def _lire(self, cle: Hashable):
+        entree = self._entrees.get(cle)
+        if entree is None:
+            return None
+        lignes, expiration = entree
+        if expiration <= time.monotonic():
+            self._retirer(cle)
+            return None
+        self._entrees.move_to_end(cle)
+        return lignes
+
+    def _retirer(self, cle: Hashable):
+        lignes, _ = self._entrees.pop(cle)
+        self._nb_lignes -= len(lignes)
+
+    def _stocker(self, cle: Hashable, lignes: List[Dict[str, Any]]):
+        if cle in self._entrees:
+            self._retirer(cle)
+        if len(lignes) > self.max_lignes:
+            # Résultat plus gros que le plafond : partagé avec les requêtes en attente mais non conservé
+            return
+        while self._entrees and self._nb_lignes + len(lignes) > self.max_lignes:
+            self._retirer(next(iter(self._entrees)))
+        self._entrees[cle] = (lignes, time.monotonic() + self.ttl)
+        self._nb_lignes += len(lignes)
+
+    async def get_or_fetch(self, cle: Hashable, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """
+        Retourne les lignes de la clé, en ne lançant fetch() que si aucun résultat
+        valide ni chargement en cours n'existe pour cette clé
+        """
+        if not self.actif:
+            self.misses += 1
+            return await fetch()
+
+        lignes = self._lire(cle)
+        if lignes is not None:
+            self.hits += 1
+            return lignes
+
+        en_cours = self._en_cours.get(cle)
+        if en_cours is not None and en_cours.get_loop() is asyncio.get_running_loop():
+            self.partages += 1
+            return await asyncio.shield(en_cours)
+
+        self.misses += 1
+        tache = asyncio.get_running_loop().create_task(self._charger(cle, fetch))
+        # Marque l'exception comme lue si toutes les requêtes en attente ont été annulées
+        tache.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._en_cours[cle] = tache
+        return await asyncio.shield(tache)
+
+    async def _charger(self, cle: Hashable, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        try:
+            lignes = await fetch()
+        finally:
+            if self._en_cours.get(cle) is asyncio.current_task():
+                del self._en_cours[cle]
+        self._stocker(cle, lignes)
+        return lignes
+
+    def invalider(self, prefixe=None):
+        """
+        Vide le stockage, ou seulement les clés dont le premier élément (la vue) vaut prefixe
+        """
+        for cle in list(self._entrees):
+            if prefixe is None or cle[0] == prefixe:
+                self._retirer(cle)
+
+    def stats(self):
+        return {
+            "entrees": len(self._entrees),
+            "lignes": self._nb_lignes,
+            "max_lignes": self.max_lignes,
+            "ttl": self.ttl,
+            "chargements_en_cours": len(self._en_cours),
+            "hits": self.hits,
+            "misses": self.misses,
+            "partages": self.partages,
+        }
+
+
+ligne_store = LigneStore()
@@ -1,12 +1,36 @@
 # -*- coding: utf-8 -*-
 import os
 from dotenv import load_dotenv
-import requests
 from requests.auth import HTTPBasicAuth
 import json
+from services.navision.http_session import get_session, TIMEOUT
 
 load_dotenv()
 
+# Taille de page demandée (le serveur peut en renvoyer moins si son max-rows est inférieur)
+PAGE_SIZE = int(os.getenv("NAVISION_PAGE_SIZE", "1000"))
+
+def params_de_base(params, cle):
+    """
+    Paramètres PostgREST communs à toutes les pages d'un parcours paginé
+    """
+    base_params = list(params.items()) if isinstance(params, dict) else list(params or [])
+    if cle:
+        base_params.append(("order", f"{cle}.asc"))
+    return base_params
+
+def params_de_page(base_params, page_size, cle, derniere_cle, offset):
+    """
+    Paramètres PostgREST d'une page : pagination par clé si possible, sinon par offset
+    """
+    page_params = list(base_params)
+    if cle and derniere_cle is not None:
+        page_params.append((cle, f"gt.{derniere_cle}"))
+    elif not cle and offset:
+        page_params.append(("offset", str(offset)))
+    page_params.append(("limit", str(page_size)))
+    return page_params
+
 class NavisionService:
     def __init__(self):
         self.url = os.getenv("SUPABASE_URL").rstrip('/')
@@ -24,10 +48,11 @@ class NavisionService:
             self.auth = HTTPBasicAuth(self.basic_user, self.basic_pass)
         else:
             self.auth = None
+        self.session = get_session()
 
     def get(self, table, params=None):
         req_url = f"{self.url}/rest/v1/{table}"
-        response = requests.get(req_url, headers=self.headers, auth=self.auth, params=params)
+        response = self.session.get(req_url, headers=self.headers, auth=self.auth, params=params, timeout=TIMEOUT)
         response.encoding = 'utf-8'  # Force l'encodage UTF-8
         response.raise_for_status()
         
@@ -40,9 +65,33 @@ class NavisionService:
         
         return data
 
+    def iter_rows(self, table, params=None, page_size=PAGE_SIZE, cle="id", apres=None):
+        """
+        Parcourt une table page par page et retourne les lignes au fil de l'eau.
+        La pagination se fait par clé (cle=gt.<dernière valeur>, triée sur cle) pour ne pas
+        dépendre du max-rows de PostgREST ; sans clé, on pagine par offset.
+        Le parcours ne s'arrête que sur une page vide : une page plus courte que page_size
+        peut venir d'un max-rows serveur inférieur et ne marque pas la fin de la table.
+        La mémoire consommée est bornée par la taille d'une page et non par celle du grand livre.
+        apres permet de ne lire que les lignes dont la clé est supérieure à une valeur déjà connue.
+        """
+        base_params = params_de_base(params, cle)
+        derniere_cle = apres
+        offset = 0
+        while True:
+            page = self.get(table, params=params_de_page(base_params, page_size, cle, derniere_cle, offset))
+            if not page:
+                return
+            for row in page:
+                yield row
+            if cle:
+                derniere_cle = page[-1][cle]
+            offset += len(page)
+            del page
+
     def post(self, table, data):
         req_url = f"{self.url}/rest/v1/{table}"
-        response = requests.post(req_url, headers=self.headers, auth=self.auth, json=data)
+        response = self.session.post(req_url, headers=self.headers, auth=self.auth, json=data, timeout=TIMEOUT)
         response.encoding = 'utf-8'  # Force l'encodage UTF-8
         response.raise_for_status()
         
@@ -53,9 +102,15 @@ class NavisionService:
         
         return result
 
+    def rpc(self, fonction, params=None):
+        """
+        Appelle une fonction SQL exposée par PostgREST (POST /rest/v1/rpc/<fonction>)
+        """
+        return self.post(f"rpc/{fonction}", params or {})
+
     def table_has_data(self, table):
         req_url = f"{self.url}/rest/v1/{table}?select=*&limit=1"
-        response = requests.get(req_url, headers=self.headers, auth=self.auth)
+        response = self.session.get(req_url, headers=self.headers, auth=self.auth, timeout=TIMEOUT)
         response.encoding = 'utf-8'  # Force l'encodage UTF-8
         response.raise_for_status()
         
@@ -66,6 +121,17 @@ class NavisionService:
         
         return bool(data)
 
+_service_partage = None
+
+def get_navision_service():
+    """
+    Retourne l'instance de NavisionService partagée par tous les contrôleurs
+    """
+    global _service_partage
+    if _service_partage is None:
+        _service_partage = NavisionService()
+    return _service_partage
+
 if __name__ == "__main__":
     nav = NavisionService()
     if nav.table_has_data("bgs$g_l_account"):
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Variante asynchrone de NavisionService basée sur httpx.AsyncClient
+Permet aux routes async de partager la boucle d'événements sans bloquer le threadpool de FastAPI
+"""
+
+import asyncio
+import json
+import os
+import time
+from dotenv import load_dotenv
+import httpx
+from services.navision.http_session import latences, POOL_SIZE, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES
+from services.navision.navision_api import PAGE_SIZE, params_de_base, params_de_page
+
+load_dotenv()
+
+
+class AsyncNavisionService:
+    def __init__(self):
+        self.url = os.getenv("SUPABASE_URL").rstrip('/')
+        self.api_key = os.getenv("SUPABASE_KEY")
+        self.basic_user = os.getenv("SUPABASE_BASIC_USER")
+        self.basic_pass = os.getenv("SUPABASE_BASIC_PASS")
+        self.headers = {
+            "apikey": self.api_key,
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json; charset=utf-8",
+            "Accept": "application/json; charset=utf-8",
+            "Accept-Encoding": "gzip, deflate"
+        }
+        # Utiliser Basic Auth seulement si configuré
+        if self.basic_user and self.basic_pass:
+            self.auth = httpx.BasicAuth(self.basic_user, self.basic_pass)
+        else:
+            self.auth = None
+        # Boucle d'événements -> client : un AsyncClient reste lié à la boucle
+        # sur laquelle ses connexions ont été ouvertes
+        self._clients = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Retourne le client de la boucle d'événements courante (créé au premier appel sur cette boucle)
+        Les clients des autres boucles sont conservés jusqu'à aclose() ; ceux des boucles déjà
+        fermées, dont les connexions ne peuvent plus être fermées proprement, sont oubliés.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            self._clients = {l: c for l, c in self._clients.items() if not l.is_closed()}
+            client = self._clients[loop] = httpx.AsyncClient(
+                headers=self.headers,
+                auth=self.auth,
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+                transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES),
+            )
+        return client
+
+    async def get(self, table, params=None):
+        req_url = f"{self.url}/rest/v1/{table}"
+        debut = time.perf_counter()
+        response = await self._get_client().get(req_url, params=params)
+        latences.enregistrer("GET (async)", (time.perf_counter() - debut) * 1000)
+        response.encoding = 'utf-8'  # Force l'encodage UTF-8
+        response.raise_for_status()
+
+        try:
+            data = response.json()
+        except json.JSONDecodeError:
+            data = json.loads(response.content.decode('utf-8'))
+
+        return data
+
+    async def rpc(self, fonction, params=None):
+        """
+        Appelle une fonction SQL exposée par PostgREST (POST /rest/v1/rpc/<fonction>)
+        """
+        req_url = f"{self.url}/rest/v1/rpc/{fonction}"
+        debut = time.perf_counter()
+        response = await self._get_client().post(req_url, json=params or {})
+        latences.enregistrer("POST (async)", (time.perf_counter() - debut) * 1000)
+        response.encoding = 'utf-8'  # Force l'encodage UTF-8
+        response.raise_for_status()
+
+        try:
+            data = response.json()
+        except json.JSONDecodeError:
+            data = json.loads(response.content.decode('utf-8'))
+
+        return data
+
+    async def iter_pages(self, table, params=None, page_size=PAGE_SIZE, cle="id", apres=None):
+        """
+        Parcourt une table page par page (même pagination que NavisionService.iter_rows)
+        et retourne chaque page décodée ; apres limite la lecture aux clés supérieures à cette valeur
+        Le parcours s'arrête sur la première page vide, quelle que soit la taille des précédentes.
+        """
+        base_params = params_de_base(params, cle)
+        derniere_cle = apres
+        offset = 0
+        while True:
+            page = await self.get(table, params=params_de_page(base_params, page_size, cle, derniere_cle, offset))
+            if not page:
+                return
+            yield page
+            if cle:
+                derniere_cle = page[-1][cle]
+            offset += len(page)
+
+    async def aclose(self):
+        """
+        Ferme tous les clients : celui de la boucle courante directement, ceux des autres
+        boucles encore actives sur leur propre boucle
+        """
+        loop = asyncio.get_running_loop()
+        clients, self._clients = self._clients, {}
+        for boucle, client in clients.items():
+            if boucle is loop:
+                await client.aclose()
+            elif boucle.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), boucle))
+
+
+_service_partage = None
+
+def get_async_navision_service():
+    """
+    Retourne l'instance d'AsyncNavisionService partagée par tous les contrôleurs
+    """
+    global _service_partage
+    if _service_partage is None:
+        _service_partage = AsyncNavisionService()
+    return _service_partage
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Pool borné de proxies XML-RPC Odoo
+Un xmlrpc.client.ServerProxy n'est pas thread-safe : chaque appel emprunte un proxy au pool et le rend ensuite.
+Les proxies sont créés à la demande (aucun appel réseau à l'import), réutilisent leur connexion HTTP/1.1
+(keep-alive du Transport xmlrpc) et appliquent un timeout à chaque appel.
+"""
+
+import http.client
+import queue
+import threading
+import xmlrpc.client
+from contextlib import contextmanager
+
+
+class TimeoutTransport(xmlrpc.client.Transport):
+    """
+    Transport HTTP avec timeout de socket (la connexion est conservée entre les appels)
+    """
+
+    def __init__(self, timeout, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class TimeoutSafeTransport(xmlrpc.client.SafeTransport):
+    """
+    Transport HTTPS avec timeout de socket (la connexion est conservée entre les appels)
+    """
+
+    def __init__(self, timeout, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class OdooConnectionPool:
+    def __init__(self, endpoint: str, max_size: int, timeout: float, acquire_timeout: float = None):
+        """
+        Args:
+            endpoint: URL XML-RPC complète (ex: https://odoo/xmlrpc/2/object)
+            max_size: nombre maximal de proxies ouverts simultanément
+            timeout: timeout (secondes) de chaque appel XML-RPC
+            acquire_timeout: attente maximale d'un proxy libre (par défaut : timeout)
+        """
+        self.endpoint = endpoint
+        self.max_size = max_size
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout if acquire_timeout is not None else timeout
+        self._libres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._crees = 0
+
+    def _creer_proxy(self) -> xmlrpc.client.ServerProxy:
+        if self.endpoint.startswith("https"):
+            transport = TimeoutSafeTransport(self.timeout)
+        else:
+            transport = TimeoutTransport(self.timeout)
+        return xmlrpc.client.ServerProxy(self.endpoint, transport=transport, allow_none=True)
+
+    def _prendre(self) -> xmlrpc.client.ServerProxy:
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._crees < self.max_size:
+                self._crees += 1
+                creer = True
+            else:
+                creer = False
+        if creer:
+            try:
+                return self._creer_proxy()
+            except Exception:
+                with self._lock:
+                    self._crees -= 1
+                raise
+        try:
+            return self._libres.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Aucune connexion Odoo libre après {self.acquire_timeout}s (pool de {self.max_size})")
+
+    def _jeter(self, proxy: xmlrpc.client.ServerProxy):
+        try:
+            proxy("close")()
+        except Exception:
+            pass
+        with self._lock:
+            self._crees -= 1
+
+    @contextmanager
+    def acquire(self):
+        """
+        Emprunte un proxy ; il est rendu au pool après l'appel, ou jeté si la connexion a échoué
+        """
+        proxy = self._prendre()
+        try:
+            yield proxy
+        except (OSError, http.client.HTTPException, xmlrpc.client.ProtocolError):
+            self._jeter(proxy)
+            raise
+        except BaseException:
+            # Erreur applicative (xmlrpc.client.Fault...) : la connexion reste utilisable
+            self._libres.put(proxy)
+            raise
+        else:
+            self._libres.put(proxy)
+
+    def stats(self):
+        return {"max_size": self.max_size, "ouverts": self._crees, "libres": self._libres.qsize()}
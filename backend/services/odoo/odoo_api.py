@@ -1,51 +1,103 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import xmlrpc.client
+from services.odoo.connection_pool import OdooConnectionPool
 
 load_dotenv()
 
+# Pagination des extractions volumineuses (search_read_all)
+PAGE_SIZE = int(os.getenv("ODOO_PAGE_SIZE", "1000"))
+WORKERS = int(os.getenv("ODOO_WORKERS", "4"))
+
+# Connexions XML-RPC : pool borné, timeout par appel
+POOL_SIZE = int(os.getenv("ODOO_POOL_SIZE", "8"))
+TIMEOUT = float(os.getenv("ODOO_TIMEOUT", "60"))
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="odoo-rpc")
+_pools = {}
+_pools_lock = threading.Lock()
+# uid authentifié, mis en cache par (url, db, utilisateur) ; verrou propre pour que
+# l'authentification (appel réseau) ne bloque pas get_pool
+_uids = {}
+_uids_lock = threading.Lock()
+
+def get_pool(endpoint):
+    """
+    Pool de proxies partagé par toutes les instances d'OdooService pour un même endpoint
+    """
+    with _pools_lock:
+        pool = _pools.get(endpoint)
+        if pool is None:
+            pool = _pools[endpoint] = OdooConnectionPool(endpoint, POOL_SIZE, TIMEOUT)
+        return pool
+
 class OdooService:
     def __init__(self):
         self.url = os.getenv("ODOO_URL")
         self.db = os.getenv("ODOO_DB")
         self.username = os.getenv("ODOO_USER")
         self.password = os.getenv("ODOO_PASSWORD")
-        self.common = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/common")
-        self.uid = self.common.authenticate(self.db, self.username, self.password, {})
-        self.models = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/object")
+        # Aucun appel réseau ici : authentification et connexions sont établies au premier appel
+        self.common = get_pool(f"{self.url}/xmlrpc/2/common")
+        self.models = get_pool(f"{self.url}/xmlrpc/2/object")
+
+    @property
+    def uid(self):
+        """
+        uid Odoo, authentifié au premier accès puis mis en cache pour le processus
+        """
+        cle = (self.url, self.db, self.username)
+        uid = _uids.get(cle)
+        if uid is None:
+            with _uids_lock:
+                uid = _uids.get(cle)
+                if uid is None:
+                    with self.common.acquire() as common:
+                        uid = common.authenticate(self.db, self.username, self.password, {})
+                    if not uid:
+                        raise PermissionError(f"Authentification Odoo refusée pour {self.username} sur {self.db}")
+                    _uids[cle] = uid
+        return uid
+
+    def execute_kw(self, model, method, args, kwargs=None):
+        """
+        Appel execute_kw sur un proxy emprunté au pool (sûr depuis plusieurs threads)
+        """
+        uid = self.uid
+        with self.models.acquire() as models:
+            if kwargs is None:
+                return models.execute_kw(self.db, uid, self.password, model, method, args)
+            return models.execute_kw(self.db, uid, self.password, model, method, args, kwargs)
 
     def search(self, model, domain=None, limit=10):
         domain = domain or []
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             model, 'search',
             [domain], {'limit': limit}
         )
 
     def read(self, model, ids, fields=None):
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             model, 'read',
             [ids], {'fields': fields or []}
         )
 
     def create(self, model, data):
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             model, 'create',
             [data]
         )
 
     def update(self, model, ids, data):
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             model, 'write',
             [ids, data]
         )
 
     def delete(self, model, ids):
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             model, 'unlink',
             [ids]
         )
@@ -58,8 +110,7 @@ class OdooService:
         :return: liste d'IDs
         """
         domain = domain or []
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             'account.move', 'search',
             [domain], {'limit': limit}
         )
@@ -71,8 +122,7 @@ class OdooService:
         :param fields: liste des champs à lire (ex: ['name', 'date', 'state'])
         :return: liste de dictionnaires
         """
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             'account.move', 'read',
             [ids], {'fields': fields or []}
         )
@@ -85,8 +135,7 @@ class OdooService:
         :return: liste d'IDs
         """
         domain = domain or []
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             'account.move.line', 'search',
             [domain], {'limit': limit}
         )
@@ -98,8 +147,7 @@ class OdooService:
         :param fields: liste des champs à lire
         :return: liste de dictionnaires
         """
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             'account.move.line', 'read',
             [ids], {'fields': fields or []}
         )
@@ -107,13 +155,52 @@ class OdooService:
     def search_read(self, model, domain=None, fields=None, limit=1000):
         domain = domain or []
         fields = fields or []
-        return self.models.execute_kw(
-            self.db, self.uid, self.password,
+        return self.execute_kw(
             model, 'search_read',
             [domain],
             {'fields': fields, 'limit': limit}
         )
 
+    def read_group(self, model, domain, fields, groupby, lazy=False):
+        """
+        Agrégation côté serveur (sommes des champs numériques par groupe)
+        :param groupby: ex: ['account_id', 'date:month']
+        :return: liste de groupes (valeurs agrégées, __count, __domain, __range selon la version)
+        """
+        return self.execute_kw(
+            model, 'read_group',
+            [domain, fields, groupby],
+            {'lazy': lazy}
+        )
+
+    def search_count(self, model, domain=None):
+        return self.execute_kw(
+            model, 'search_count',
+            [domain or []]
+        )
+
+    def _search_read_page(self, model, domain, fields, offset, limit):
+        return self.execute_kw(
+            model, 'search_read',
+            [domain],
+            {'fields': fields, 'offset': offset, 'limit': limit, 'order': 'id asc'}
+        )
+
+    def search_read_all(self, model, domain=None, fields=None, page_size=PAGE_SIZE):
+        """
+        Lit tous les enregistrements d'un domaine, sans la limite de 1000 lignes de search_read.
+        Compte d'abord (search_count), puis récupère les pages (offset, triées par id) en parallèle
+        sur les workers XML-RPC ; les pages sont retournées dans l'ordre, au fil de l'eau.
+        """
+        domain = domain or []
+        fields = fields or []
+        total = self.search_count(model, domain)
+        offsets = range(0, total, page_size)
+        pages = _executor.map(lambda offset: self._search_read_page(model, domain, fields, offset, page_size), offsets)
+        for page in pages:
+            for record in page:
+                yield record
+
 if __name__ == "__main__":
     odoo = OdooService()
 
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Cache des réponses des routes SIG (TTL + LRU) avec ETag / If-None-Match
+Le cache se place devant les handlers via CachedRoute (route_class des routers Navision et Odoo) :
+la réponse JSON est stockée déjà sérialisée, un hit ne recalcule rien et un If-None-Match
+correspondant renvoie un 304 sans corps. Les réponses d'erreur ({"error": ...}, renvoyées
+en 200 par plusieurs routes) ne sont jamais mises en cache.
+
+Backends :
+    - mémoire (par défaut) : OrderedDict borné en nombre d'entrées, éviction LRU
+    - redis (RESULT_CACHE_BACKEND=redis) : tout client compatible (get/set/delete/scan_iter),
+      l'éviction étant alors confiée à la politique maxmemory du serveur
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = int(os.getenv("RESULT_CACHE_TTL", "300"))
+MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+# Les exercices clos ne changent plus : leurs réponses peuvent être conservées sans expiration
+# (désactivé par défaut). Un exercice n'est considéré clos qu'à partir de sa date de clôture,
+# RESULT_CACHE_CLOSING_DATE (MM-JJ de l'année suivante), les écritures d'ajustement étant passées avant.
+PIN_CLOSED_YEARS = os.getenv("RESULT_CACHE_PIN_CLOSED_YEARS", "0") == "1"
+CLOSING_DATE = os.getenv("RESULT_CACHE_CLOSING_DATE", "06-30")
+
+
+class MemoryBackend:
+    """
+    Backend en mémoire : TTL par entrée (None = pas d'expiration) et éviction LRU
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entrees = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cle: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return None
+            etag, corps, expiration = entree
+            if expiration is not None and expiration <= time.monotonic():
+                del self._entrees[cle]
+                return None
+            self._entrees.move_to_end(cle)
+            return etag, corps
+
+    def set(self, cle: str, etag: str, corps: bytes, ttl: Optional[int]):
+        expiration = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entrees[cle] = (etag, corps, expiration)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.max_entries:
+                self._entrees.popitem(last=False)
+
+    def delete_prefix(self, prefixe: str):
+        with self._lock:
+            for cle in [c for c in self._entrees if c.startswith(prefixe)]:
+                del self._entrees[cle]
+
+    def __len__(self):
+        return len(self._entrees)
+
+
+class RedisBackend:
+    """
+    Backend Redis (ou tout client exposant get/set/delete/scan_iter, par exemple un substitut local)
+    La valeur stockée est "<etag>\\n<corps JSON>"
+    """
+
+    def __init__(self, client=None, url: Optional[str] = None, namespace: str = "mdmfi:sig:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("RESULT_CACHE_BACKEND=redis nécessite le paquet 'redis'") from e
+            client = redis.Redis.from_url(url or os.getenv("RESULT_CACHE_REDIS_URL", "redis://localhost:6379/0"))
+        self.client = client
+        self.namespace = namespace
+
+    def get(self, cle: str) -> Optional[Tuple[str, bytes]]:
+        valeur = self.client.get(self.namespace + cle)
+        if valeur is None:
+            return None
+        etag, _, corps = valeur.partition(b"\n")
+        return etag.decode("utf-8"), corps
+
+    def set(self, cle: str, etag: str, corps: bytes, ttl: Optional[int]):
+        valeur = etag.encode("utf-8") + b"\n" + corps
+        if ttl is not None:
+            self.client.set(self.namespace + cle, valeur, ex=ttl)
+        else:
+            self.client.set(self.namespace + cle, valeur)
+
+    def delete_prefix(self, prefixe: str):
+        for cle in self.client.scan_iter(match=self.namespace + prefixe + "*"):
+            self.client.delete(cle)
+
+
+class ResultCache:
+    """
+    Cache de réponses sérialisées, indexé par chemin + paramètres de requête
+    """
+
+    def __init__(self, backend=None, default_ttl: int = DEFAULT_TTL, pin_closed_years: bool = PIN_CLOSED_YEARS,
+                 closing_date: str = CLOSING_DATE):
+        self.backend = backend if backend is not None else self._backend_depuis_env()
+        self.default_ttl = default_ttl
+        self.pin_closed_years = pin_closed_years
+        self.closing_date = closing_date
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def _backend_depuis_env():
+        if os.getenv("RESULT_CACHE_BACKEND", "memory").lower() == "redis":
+            return RedisBackend()
+        return MemoryBackend()
+
+    @staticmethod
+    def cle(request: Request) -> str:
+        """
+        Clé de cache : chemin (société incluse) + paramètres triés (periode, trimestre, annee, mois, ...)
+        """
+        params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"{request.url.path}?{params}"
+
+    @staticmethod
+    def etag(corps: bytes) -> str:
+        return '"' + hashlib.sha1(corps).hexdigest() + '"'
+
+    @staticmethod
+    def est_erreur(corps: bytes) -> bool:
+        """
+        Vrai si le corps est un objet JSON portant une clé "error" (erreur renvoyée en 200 par la route)
+        """
+        if b'"error"' not in corps:
+            return False
+        try:
+            payload = json.loads(corps)
+        except ValueError:
+            return False
+        return isinstance(payload, dict) and "error" in payload
+
+    def est_close(self, annee: int, aujourd_hui: Optional[datetime.date] = None) -> bool:
+        """
+        Vrai si l'exercice est clos : sa date de clôture (closing_date de l'année suivante) est passée
+        """
+        mois, jour = (int(x) for x in self.closing_date.split("-"))
+        return (aujourd_hui or datetime.date.today()) >= datetime.date(annee + 1, mois, jour)
+
+    def ttl_pour(self, request: Request) -> Optional[int]:
+        """
+        TTL d'une réponse : sans expiration pour une année close si pin_closed_years, TTL par défaut sinon
+        """
+        annee = request.query_params.get("annee")
+        if self.pin_closed_years and annee and annee.isdigit() and self.est_close(int(annee)):
+            return None
+        return self.default_ttl
+
+    def get(self, cle: str) -> Optional[Tuple[str, bytes]]:
+        try:
+            return self.backend.get(cle)
+        except Exception as e:
+            # Un backend indisponible ne doit pas faire échouer la route
+            logger.warning(f"Cache indisponible en lecture: {e}")
+            return None
+
+    def set(self, cle: str, etag: str, corps: bytes, ttl: Optional[int]):
+        try:
+            self.backend.set(cle, etag, corps, ttl)
+        except Exception as e:
+            logger.warning(f"Cache indisponible en écriture: {e}")
+
+    def invalider(self, prefixe: str = ""):
+        """
+        Supprime les réponses dont la clé commence par prefixe (par exemple "/rsp-neg/")
+        """
+        self.backend.delete_prefix(prefixe)
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "entrees": len(self.backend) if hasattr(self.backend, "__len__") else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "default_ttl": self.default_ttl,
+            "pin_closed_years": self.pin_closed_years,
+            "closing_date": self.closing_date,
+        }
+
+
+result_cache = ResultCache()
+
+
+# Une entité d'un en-tête If-None-Match : "*" ou un ETag, faible (W/"...") ou fort
+_ENTITE_ETAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+def etag_correspond(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Vrai si l'en-tête If-None-Match désigne l'ETag (RFC 9110 : liste d'ETags séparés
+    par des virgules, comparaison faible, "*" correspond à toute représentation)
+    """
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for entite in _ENTITE_ETAG.findall(if_none_match):
+        if entite == "*" or (entite[2:] if entite.startswith("W/") else entite) == opaque:
+            return True
+    return False
+
+
+def _reponse_cache(request: Request, etag: str, corps: bytes, statut_cache: str) -> Response:
+    headers = {"ETag": etag, "X-Cache": statut_cache}
+    if etag_correspond(request.headers.get("if-none-match"), etag):
+        result_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=corps, media_type="application/json", headers=headers)
+
+
+class CachedRoute(APIRoute):
+    """
+    Route FastAPI dont les réponses GET 200 passent par result_cache
+    Les routes de diagnostic (debug, stats) ne sont pas mises en cache
+    """
+
+    chemins_exclus = ("/debug/", "/stats/")
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        handler = super().get_route_handler()
+        if "GET" not in self.methods or any(c in self.path for c in self.chemins_exclus):
+            return handler
+
+        async def cached_handler(request: Request) -> Response:
+            cle = ResultCache.cle(request)
+            entree = result_cache.get(cle)
+            if entree is not None:
+                result_cache.hits += 1
+                return _reponse_cache(request, entree[0], entree[1], "HIT")
+
+            result_cache.misses += 1
+            response = await handler(request)
+            corps = getattr(response, "body", None)
+            if response.status_code != 200 or corps is None or ResultCache.est_erreur(corps):
+                return response
+            etag = ResultCache.etag(corps)
+            result_cache.set(cle, etag, corps, result_cache.ttl_pour(request))
+            return _reponse_cache(request, etag, corps, "MISS")
+
+        return cached_handler